@@ -5,10 +5,13 @@ from flask import Flask, session, request, redirect, render_template
 from dotenv import load_dotenv
 from flask_wtf import CSRFProtect
 import os
+import time
+
+_BOOT_STARTED = time.perf_counter()
 
 load_dotenv()
 
-# Run pending database migrations
+# Run pending database migrations (one ledger lookup when already current)
 try:
     from app.services.migrations import run_on_startup
     run_on_startup()
@@ -32,6 +35,15 @@ def create_app():
     # per-file 5/10 MB messages live in the notices route.
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
     csrf = CSRFProtect(app)
+
+    # Pooled SQLite connections: per-thread by default, optionally bound
+    # to the request via DB_REQUEST_SCOPED=1.
+    from app.services.db import init_app as init_db_pool
+    init_db_pool(app)
+
+    # Background job workers (push sends, duty-clash handling).
+    from app.services.jobs import init_app as init_jobs
+    init_jobs(app)
     
     from app.routes.attendance import attendance_bp
     from app.routes.admin import admin_bp
@@ -203,29 +215,27 @@ def create_app():
         #      re-write them onto the session EVERY request. This is why a flag
         #      seeded AFTER login (e.g. a new can_post_notice) is live without a
         #      re-auth -- the session is never a stale login-time snapshot.
+        # The read goes through auth_cache, which is invalidated by every
+        # user_session write (in-app directly, elsewhere via data_version),
+        # so both guarantees hold without a SELECT per HTMX poll.
         if request.path.startswith('/static') or request.path.startswith('/apple-touch-icon') or request.path in ['/gate', '/login-code']:
             return
         staff_id = session.get('staff_id')
         if not staff_id:
             return
-        from app.services.db import get_connection
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT can_resolve, can_post_notice, can_post_schedule, can_share_learner_notice "
-                "FROM user_session WHERE staff_id = ? AND tenant_id = ? "
-                "AND is_active = 1 LIMIT 1",
-                (staff_id, TENANT_ID)
-            )
-            row = cursor.fetchone()
-        if row is None:
+        from app.services.auth_cache import get_capabilities
+        flags = get_capabilities(staff_id)
+        if flags is None:
             session.clear()
             return redirect('/gate')
-        # Refresh capability flags from the DB on every request (always correct).
-        session['can_resolve'] = bool(row['can_resolve'])
-        session['can_post_notice'] = bool(row['can_post_notice'])
-        session['can_post_schedule'] = bool(row['can_post_schedule'])
-        session['can_share_learner_notice'] = bool(row['can_share_learner_notice'])
+        # Refresh capability flags on every request (always correct).
+        session['can_resolve'] = flags['can_resolve']
+        session['can_post_notice'] = flags['can_post_notice']
+        session['can_post_schedule'] = flags['can_post_schedule']
+        session['can_share_learner_notice'] = flags['can_share_learner_notice']
+    
+    from app.services.events import SSE_ENABLED
+    app.jinja_env.globals['sse_enabled'] = SSE_ENABLED
     
     @app.context_processor
     def inject_user():
@@ -358,5 +368,9 @@ def create_app():
 
     csrf.exempt(password_gate)   # pre-auth: shared-secret gate, no session to forge
     csrf.exempt(login_code)      # pre-auth: magic-code login, runs before user session
+
+    from app.services.db import MIGRATION_STATUS
+    print(f"App boot: {(time.perf_counter() - _BOOT_STARTED) * 1000:.0f} ms "
+          f"(migrations {MIGRATION_STATUS['state']}, {MIGRATION_STATUS['ms']} ms) [pid {os.getpid()}]")
     return app
 
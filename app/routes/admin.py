@@ -273,6 +273,9 @@ def override_status(entry_id):
                     WHERE id = ?
                 ''', (new_status, entry_id))
             conn.commit()
+        
+        from app.services.attendance_rollup import refresh_for_entry
+        refresh_for_entry(entry_id)
     
     if return_to == 'absentees':
         return redirect(url_for('admin.absentees'))
@@ -365,6 +368,63 @@ def db_stats():
     return jsonify(stats)
 
 
+@admin_bp.route('/auth-cache')
+def auth_cache_stats():
+    """Hit rate of the per-process user_session capability cache."""
+    from app.services.auth_cache import stats
+    return jsonify(stats())
+
+
+@admin_bp.route('/extract-cache')
+def extract_cache_stats():
+    """Hit rate and size of the schedule extraction cache."""
+    from app.services.extract_cache import stats
+    return jsonify(stats())
+
+
+@admin_bp.route('/jobs')
+def jobs_queue():
+    """Background job queue: depth, latency and recent failures."""
+    from markupsafe import escape
+    from app.services.jobs import queue_stats
+    stats = queue_stats()
+    if request.args.get('format') == 'json':
+        return jsonify(stats)
+
+    depth = stats['depth']
+    kind_rows = ''
+    for kind, counts in sorted(stats['by_kind'].items()):
+        kind_rows += (f"<tr><td>{escape(kind)}</td><td>{counts.get('pending', 0)}</td>"
+                      f"<td>{counts.get('running', 0)}</td><td>{counts.get('done', 0)}</td>"
+                      f"<td>{counts.get('dead', 0)}</td></tr>")
+    failure_rows = ''
+    for job in stats['failures']:
+        failure_rows += (f"<tr><td>{escape(job['kind'])}</td><td>{escape(job['status'])}</td>"
+                         f"<td>{job['attempts']}/{job['max_attempts']}</td>"
+                         f"<td>{escape(job['run_after'][:19])}</td><td>{escape(job['last_error'])}</td></tr>")
+
+    return f'''
+    <html><head><title>Job Queue</title><meta http-equiv="refresh" content="10">
+    <style>body {{ font-family: -apple-system, sans-serif; padding: 2rem; }}
+    table {{ border-collapse: collapse; margin-bottom: 1.5rem; }} td, th {{ padding: 6px 14px; border: 1px solid #ddd; text-align: left; }}</style></head>
+    <body>
+    <h1>Job Queue</h1>
+    <p><strong>Pending:</strong> {depth.get('pending', 0)} &nbsp; <strong>Running:</strong> {depth.get('running', 0)}
+       &nbsp; <strong>Done:</strong> {depth.get('done', 0)} &nbsp; <strong>Dead:</strong> {depth.get('dead', 0)}
+       &nbsp; <strong>Workers (this process):</strong> {stats['workers']}</p>
+    <p><strong>Oldest due job waiting:</strong> {stats['oldest_due_secs']}s</p>
+    <p><strong>Queue wait</strong> p50 {stats['wait_ms']['p50']}ms / p95 {stats['wait_ms']['p95']}ms
+       &nbsp; <strong>Run time</strong> p50 {stats['run_ms']['p50']}ms / p95 {stats['run_ms']['p95']}ms
+       (last {stats['sample']} jobs)</p>
+    <p><strong>Retention:</strong> done {stats['retention_days']['done']} days, dead {stats['retention_days']['dead']} days</p>
+    <table><tr><th>Kind</th><th>Pending</th><th>Running</th><th>Done</th><th>Dead</th></tr>{kind_rows}</table>
+    <h3>Recent failures</h3>
+    <table><tr><th>Kind</th><th>Status</th><th>Attempts</th><th>Next run</th><th>Error</th></tr>{failure_rows}</table>
+    <p><a href="/admin/jobs?format=json">JSON</a> | <a href="/admin/">Back</a></p>
+    </body></html>
+    '''
+
+
 @admin_bp.route('/seed-emergency', methods=['GET', 'POST'])
 def seed_emergency():
     if request.method == 'GET':
@@ -2,7 +2,7 @@
 Attendance routes - Roll call functionality
 """
 
-from flask import Blueprint, render_template, request, session, redirect, url_for
+from flask import Blueprint, render_template, request, session, redirect, url_for, jsonify, Response
 from datetime import date, datetime
 from app.services.db import (
     get_mentor_groups_sqlite,
@@ -12,15 +12,15 @@ from app.services.db import (
     mark_learner_sqlite,
     get_pending_marks_sqlite,
     get_pending_stats_sqlite,
-    clear_pending_attendance_sqlite,
-    create_attendance,
-    create_attendance_entry,
-    update_learner_absent_tracking,
     get_attendance_for_today,
     get_attendance_entries,
     update_attendance_entry,
-    update_attendance_submitted
+    submit_roll_call,
+    get_roll_call_version,
+    get_roll_call_changes
 )
+from app.services.attendance_rollup import refresh_attendance
+from app.services import events
 
 attendance_bp = Blueprint('attendance', __name__, url_prefix='/attendance')
 
@@ -57,6 +57,7 @@ def roll_call(mentor_group_id):
     
     learners = get_learners_by_mentor_group_sqlite(mentor_group_id)
     today_str = date.today().isoformat()
+    roll_call_version = get_roll_call_version(mentor_group_id, today_str)
     
     existing_attendance = get_attendance_for_today(mentor_group_id, today_str)
     already_submitted = existing_attendance is not None
@@ -91,6 +92,7 @@ def roll_call(mentor_group_id):
                          stats=stats,
                          already_submitted=already_submitted,
                          submitted_at=submitted_at,
+                         roll_call_version=roll_call_version,
                          nav_header=True,
                          nav_title=group_name,
                          nav_back_url='/attendance/',
@@ -106,12 +108,63 @@ def mark_learner(learner_id):
     
     if existing_attendance_id:
         update_attendance_entry(existing_attendance_id, learner_id, status)
+        refresh_attendance([existing_attendance_id])
     elif mentor_group_id:
         mark_learner_sqlite(mentor_group_id, learner_id, status)
     
+    if mentor_group_id:
+        events.publish('roll_call', {'group': mentor_group_id})
+    
     return '', 204
 
 
+@attendance_bp.route('/changes')
+def changes():
+    """
+    Roll-call delta for the group in session. ?since=<version> from the page
+    (or the previous response): 204 if nothing changed, else JSON with the
+    new version and only the learners whose mark changed. `submitted` tells
+    a pending-mode page that another device has submitted the register.
+    """
+    mentor_group_id = session.get('current_mentor_group_id')
+    existing_attendance_id = session.get('existing_attendance_id')
+    
+    if not mentor_group_id:
+        return '', 204
+    
+    today_str = date.today().isoformat()
+    since = request.args.get('since', 0, type=int)
+    version = get_roll_call_version(mentor_group_id, today_str)
+    if version == since:
+        return '', 204
+    
+    # A counter behind the client's means a new day / reset register:
+    # send everything.
+    if version < since:
+        since = 0
+    
+    marks = get_roll_call_changes(mentor_group_id, today_str, since,
+                                  attendance_id=existing_attendance_id)
+    submitted = bool(existing_attendance_id) or \
+        get_attendance_for_today(mentor_group_id, today_str) is not None
+    return jsonify({'version': version, 'marks': marks, 'submitted': submitted})
+
+
+@attendance_bp.route('/stream')
+def stream():
+    """
+    SSE - a 'marks' event whenever any register is marked (any process).
+    Pages fetch /attendance/changes on events for their own group and only
+    fall back to polling while this stream is down. 204 (clients stop
+    reconnecting) unless SSE_ENABLED.
+    """
+    if not events.SSE_ENABLED:
+        return '', 204
+    return Response(events.stream('roll_call', 'marks', {'kind': 'state'}),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @attendance_bp.route('/stats')
 def get_stats():
     mentor_group_id = session.get('current_mentor_group_id')
@@ -144,51 +197,21 @@ def submit_attendance_route():
     if not mentor_group_id:
         return redirect(url_for('attendance.index'))
     
-    today = date.today().isoformat()
-    
-    if existing_attendance_id:
-        update_attendance_submitted(existing_attendance_id)
-        marks = get_attendance_entries(existing_attendance_id)
-        attendance_id = existing_attendance_id
-    else:
-        marks = get_pending_marks_sqlite(mentor_group_id)
-        
-        if not marks:
-            return redirect(url_for('attendance.roll_call', mentor_group_id=mentor_group_id))
-        
-        attendance_id = create_attendance(
-            tenant_id=TENANT_ID,
-            attendance_date=today,
-            mentor_group_id=mentor_group_id,
-            submitted_by_id=None,
-            status='Submitted'
-        )
-        
-        for learner_id, status in marks.items():
-            create_attendance_entry(
-                attendance_id=attendance_id,
-                learner_id=learner_id,
-                status=status
-            )
-        
-        clear_pending_attendance_sqlite(mentor_group_id)
-    
-    for learner_id, status in marks.items():
-        if status == 'Absent':
-            update_learner_absent_tracking(learner_id, increment=True)
-        elif status in ('Present', 'Late'):
-            update_learner_absent_tracking(learner_id, increment=False)
+    result = submit_roll_call(mentor_group_id, date.today().isoformat(),
+                              existing_attendance_id=existing_attendance_id,
+                              tenant_id=TENANT_ID)
+    if result is None:
+        return redirect(url_for('attendance.roll_call', mentor_group_id=mentor_group_id))
+    events.publish('roll_call', {'group': mentor_group_id})
     
     session.pop('current_mentor_group_id', None)
     session.pop('existing_attendance_id', None)
     
     group = get_mentor_group_by_id_sqlite(mentor_group_id)
-    is_update = existing_attendance_id is not None
-    
     return render_template('attendance/success.html', 
                           group_name=group['group_name'] if group else 'Unknown',
-                          count=len(marks),
-                          is_update=is_update,
+                          count=result['count'],
+                          is_update=result['is_update'],
                           nav_header=True,
                           nav_title='Submitted',
                           nav_back_url='/',
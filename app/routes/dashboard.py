@@ -302,30 +302,28 @@ def index():
         ''', (TENANT_ID, today_str, TENANT_ID))
         pending_classes = [row['group_name'] for row in cursor.fetchall()]
         
+        # Attendance figures read the rollups (attendance_rollup.py), not
+        # attendance_entry - O(days) / O(learners) instead of O(entries).
         cursor.execute('''
-            SELECT COUNT(*) FROM attendance_entry ae
-            JOIN attendance a ON ae.attendance_id = a.id
-            WHERE a.date = ? AND a.tenant_id = ? AND ae.status = 'Absent'
-        ''', (today_str, TENANT_ID))
-        absent_learners = cursor.fetchone()[0]
+            SELECT COALESCE(SUM(absent), 0) AS absent, COALESCE(SUM(total), 0) AS total
+            FROM attendance_daily_rollup
+            WHERE tenant_id = ? AND date = ?
+        ''', (TENANT_ID, today_str))
+        row = cursor.fetchone()
+        absent_learners = row['absent']
+        captured_today = row['total']
         
         cursor.execute('SELECT COUNT(*) FROM learner WHERE tenant_id = ? AND COALESCE(is_active, 1) = 1', (TENANT_ID,))
         total_enrolled = cursor.fetchone()[0]
         
-        cursor.execute('''
-            SELECT COUNT(*) FROM attendance_entry ae JOIN attendance a ON ae.attendance_id = a.id
-            WHERE a.date = ? AND a.tenant_id = ?
-        ''', (today_str, TENANT_ID))
-        captured_today = cursor.fetchone()[0] or 0
         today_pct = ((captured_today - absent_learners) / captured_today * 100) if captured_today else 0
         
         cursor.execute('''
-            SELECT g.grade_number, COUNT(*) AS absent FROM attendance_entry ae
-            JOIN attendance a ON ae.attendance_id = a.id
-            JOIN learner l ON l.id = ae.learner_id
-            JOIN grade g ON g.id = l.grade_id
-            WHERE a.date = ? AND a.tenant_id = ? AND ae.status = 'Absent'
-            GROUP BY g.grade_number ORDER BY g.grade_number
+            SELECT g.grade_number, SUM(r.absent) AS absent FROM attendance_daily_rollup r
+            JOIN grade g ON g.id = r.grade_id
+            WHERE r.date = ? AND r.tenant_id = ?
+            GROUP BY g.grade_number HAVING SUM(r.absent) > 0
+            ORDER BY g.grade_number
         ''', (today_str, TENANT_ID))
         grade_breakdown_today = [(r['grade_number'], r['absent']) for r in cursor.fetchall()]
         
@@ -386,32 +384,30 @@ def index():
         
         cursor.execute('''
             SELECT 
-              SUM(CASE WHEN ae.status='Present' THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(*),0) AS ytd_pct,
-              COUNT(DISTINCT a.date) AS days_counted
-            FROM attendance_entry ae JOIN attendance a ON a.id = ae.attendance_id
-            WHERE a.tenant_id = ?
+              SUM(present) * 100.0 / NULLIF(SUM(total), 0) AS ytd_pct,
+              COUNT(DISTINCT date) AS days_counted
+            FROM attendance_daily_rollup
+            WHERE tenant_id = ?
         ''', (TENANT_ID,))
         row = cursor.fetchone()
         ytd_pct = row['ytd_pct'] or 0
         days_counted = row['days_counted'] or 0
         
         cursor.execute('''
-            SELECT a.date,
-              SUM(CASE WHEN ae.status='Present' THEN 1 ELSE 0 END) * 100.0 / COUNT(*) AS pct
-            FROM attendance a JOIN attendance_entry ae ON ae.attendance_id = a.id
-            WHERE a.tenant_id = ?
-            GROUP BY a.date ORDER BY a.date
+            SELECT date,
+              SUM(present) * 100.0 / SUM(total) AS pct
+            FROM attendance_daily_rollup
+            WHERE tenant_id = ?
+            GROUP BY date ORDER BY date
         ''', (TENANT_ID,))
         daily_attendance = [(r['date'], r['pct']) for r in cursor.fetchall()]
         
         cursor.execute('''
             SELECT g.grade_number,
-              SUM(CASE WHEN ae.status='Present' THEN 1 ELSE 0 END) * 100.0 / COUNT(*) AS pct
-            FROM attendance a
-            JOIN attendance_entry ae ON ae.attendance_id = a.id
-            JOIN learner l ON l.id = ae.learner_id
-            JOIN grade g ON g.id = l.grade_id
-            WHERE a.tenant_id = ?
+              SUM(r.present) * 100.0 / SUM(r.total) AS pct
+            FROM attendance_daily_rollup r
+            JOIN grade g ON g.id = r.grade_id
+            WHERE r.tenant_id = ?
             GROUP BY g.grade_number ORDER BY g.grade_number
         ''', (TENANT_ID,))
         grade_data = [(r['grade_number'], r['pct']) for r in cursor.fetchall()]
@@ -419,15 +415,13 @@ def index():
         cursor.execute('''
             SELECT 
               l.id, l.first_name, l.surname, mg.group_name, g.grade_number,
-              SUM(CASE WHEN ae.status='Absent' THEN 1 ELSE 0 END) AS absent_count
-            FROM learner l
-            JOIN attendance_entry ae ON ae.learner_id = l.id
-            JOIN attendance a ON a.id = ae.attendance_id
+              r.absent AS absent_count
+            FROM attendance_learner_rollup r
+            JOIN learner l ON l.id = r.learner_id
             LEFT JOIN mentor_group mg ON mg.id = l.mentor_group_id
             LEFT JOIN grade g ON g.id = l.grade_id
-            WHERE l.tenant_id = ? AND a.tenant_id = ? AND COALESCE(l.is_active, 1) = 1
-            GROUP BY l.id
-            HAVING SUM(CASE WHEN ae.status='Absent' THEN 1 ELSE 0 END) >= 15
+            WHERE l.tenant_id = ? AND r.tenant_id = ? AND COALESCE(l.is_active, 1) = 1
+              AND r.absent >= 15
             ORDER BY absent_count DESC
         ''', (TENANT_ID, TENANT_ID))
         chronic_all = [dict(r) for r in cursor.fetchall()]
@@ -793,15 +787,13 @@ def chronic_absentees_list():
         cursor.execute('''
             SELECT 
               l.id, l.first_name, l.surname, mg.group_name, g.grade_number,
-              SUM(CASE WHEN ae.status='Absent' THEN 1 ELSE 0 END) AS absent_count
-            FROM learner l
-            JOIN attendance_entry ae ON ae.learner_id = l.id
-            JOIN attendance a ON a.id = ae.attendance_id
+              r.absent AS absent_count
+            FROM attendance_learner_rollup r
+            JOIN learner l ON l.id = r.learner_id
             LEFT JOIN mentor_group mg ON mg.id = l.mentor_group_id
             LEFT JOIN grade g ON g.id = l.grade_id
-            WHERE l.tenant_id = ? AND a.tenant_id = ? AND COALESCE(l.is_active, 1) = 1
-            GROUP BY l.id
-            HAVING SUM(CASE WHEN ae.status='Absent' THEN 1 ELSE 0 END) >= 15
+            WHERE l.tenant_id = ? AND r.tenant_id = ? AND COALESCE(l.is_active, 1) = 1
+              AND r.absent >= 15
             ORDER BY absent_count DESC
         ''', (TENANT_ID, TENANT_ID))
         chronic = [dict(r) for r in cursor.fetchall()]
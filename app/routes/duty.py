@@ -6,7 +6,7 @@ Combines: teaching periods, terrain duty, homework duty, sub assignments, sport
 from flask import Blueprint, render_template, request, redirect, session
 from datetime import date, datetime, timedelta
 from app.services.db import get_connection, sast_now
-from app.services.substitute_engine import get_cycle_day
+from app.services.substitute_engine import resolve_day
 from app.services.nav import get_nav_header, get_nav_styles
 
 duty_bp = Blueprint('duty', __name__, url_prefix='/duty')
@@ -111,35 +111,11 @@ def my_day():
             tab = school_days[0]['tab_id']
     
     target_date_str = target_date.isoformat()
-    weekday = target_date.weekday()
     
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT cycle_day, day_type, bell_schedule, day_name
-            FROM school_calendar
-            WHERE tenant_id = ? AND date = ?
-        """, (TENANT_ID, target_date_str))
-        cal_row = cursor.fetchone()
-        
-        if cal_row:
-            cycle_day = cal_row['cycle_day']
-            day_type = cal_row['day_type']
-            bell_schedule = cal_row['bell_schedule']
-            day_name = cal_row['day_name']
-        else:
-            cycle_day = get_cycle_day()
-            day_type = 'academic' if weekday < 5 else 'weekend'
-            if weekday in [0, 2]:
-                bell_schedule = 'type_a'
-            elif weekday in [1, 3]:
-                bell_schedule = 'type_b'
-            elif weekday == 4:
-                bell_schedule = 'type_c'
-            else:
-                bell_schedule = 'none'
-            day_name = f"D{cycle_day}" if cycle_day else None
+        cycle_day, day_type, bell_schedule, day_name = resolve_day(target_date)
         
         cursor.execute("""
             SELECT * FROM bell_schedule
@@ -1192,4 +1168,8 @@ def toggle_access():
         )
         conn.commit()
 
+    # Revocation must bite on the target's very next request.
+    from app.services.auth_cache import invalidate
+    invalidate(target_staff_id)
+
     return redirect(f'/duty/my-day?staff={target_staff_id}&from=ops')
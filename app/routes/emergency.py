@@ -2,9 +2,10 @@
 Emergency Alert routes - Trigger, respond, resolve
 """
 
-from flask import Blueprint, render_template, request, session, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, session, redirect, url_for, jsonify, Response
 from datetime import datetime, date, time
 from app.services.db import get_connection, generate_id, now_iso
+from app.services import events, timetable_index
 from app.services.nav import get_nav_header, get_nav_styles, get_back_url
 
 emergency_bp = Blueprint('emergency', __name__, url_prefix='/emergency')
@@ -137,18 +138,12 @@ def get_smart_location(staff_id):
             mentor_sub = cursor.fetchone()
             
             # Check timetable for this period
-            cursor.execute("""
-                SELECT t.*, v.venue_code, v.venue_name, v.id as venue_uuid
-                FROM timetable_slot t
-                LEFT JOIN venue v ON t.venue_id = v.id
-                WHERE t.staff_id = ? AND t.cycle_day = ?
-                  AND t.period_id IN (SELECT id FROM period WHERE tenant_id = ? AND period_number = ?)
-            """, (staff_id, cycle_day, TENANT_ID, period_num))
-            teaching = cursor.fetchone()
-            if teaching and teaching['venue_uuid']:
+            teaching = timetable_index.get_index(conn).teaching_venue(staff_id, cycle_day, period_num)
+            if teaching:
+                venue_id, venue_code, venue_name = teaching
                 return {
-                    'venue_id': teaching['venue_uuid'],
-                    'venue_name': teaching['venue_code'] or teaching['venue_name'],
+                    'venue_id': venue_id,
+                    'venue_name': venue_code or venue_name,
                     'context': f'Teaching — Period {period_num}'
                 }
             
@@ -186,18 +181,12 @@ def _get_home_room(cursor_or_none, staff_id, context=None):
     """Get teacher's home room as fallback location."""
     if cursor_or_none is None:
         return None
-    cursor = cursor_or_none
-    cursor.execute("""
-        SELECT v.id as venue_id, v.venue_code, v.venue_name
-        FROM staff_venue sv
-        JOIN venue v ON sv.venue_id = v.id
-        WHERE sv.staff_id = ? AND sv.tenant_id = ?
-    """, (staff_id, TENANT_ID))
-    room = cursor.fetchone()
+    room = timetable_index.get_index(cursor_or_none.connection).home_room(staff_id)
     if room:
+        venue_id, venue_code, venue_name = room
         return {
-            'venue_id': room['venue_id'],
-            'venue_name': room['venue_code'] or room['venue_name'],
+            'venue_id': venue_id,
+            'venue_name': venue_code or venue_name,
             'context': context or 'Home room'
         }
     return None
@@ -268,6 +257,14 @@ def has_responded(alert_id, staff_id):
         return cursor.fetchone() is not None
 
 
+def publish_alert_change(kind, alert_id):
+    """Tell open /emergency/stream clients to refresh (after the commit)."""
+    try:
+        events.publish('emergency', {'kind': kind, 'alert_id': alert_id})
+    except Exception as e:
+        print(f"Emergency publish error: {e}")
+
+
 def can_user_resolve(user, alert):
     """Check if user can resolve this alert - any logged in staff member."""
     if not user.get('staff_id') or not alert:
@@ -424,6 +421,7 @@ def send_default():
         conn.commit()
     
     session.pop('pending_alert_type', None)
+    publish_alert_change('triggered', alert_id)
     
     sent_n = 0
     try:
@@ -511,6 +509,7 @@ def send_alert():
         conn.commit()
     
     session.pop('pending_alert_type', None)
+    publish_alert_change('triggered', alert_id)
     
     sent_n = 0
     try:
@@ -543,6 +542,7 @@ def respond():
         """, (response_id, active_alert['id'], user['staff_id'], now_iso()))
         conn.commit()
     
+    publish_alert_change('responded', active_alert['id'])
     return redirect(url_for('emergency.index'))
 
 
@@ -582,6 +582,8 @@ def resolve():
         """, (now_iso(), user['staff_id'], resolution_type, resolution_notes, active_alert['id']))
         conn.commit()
     
+    publish_alert_change('resolved', active_alert['id'])
+    
     try:
         from app.routes.push import send_all_clear_push
         send_all_clear_push(active_alert['alert_type'], active_alert['location_display'], user['display_name'])
@@ -644,6 +646,23 @@ def banner():
                          user=user)
 
 
+@emergency_bp.route('/stream')
+def stream():
+    """
+    SSE - one 'alert' event whenever an alert is triggered, responded to or
+    resolved (any process). Clients refetch their partials on each event;
+    the polling triggers only run while this stream is down. 204 (clients
+    stop reconnecting) unless SSE_ENABLED.
+    """
+    if not events.SSE_ENABLED:
+        return '', 204
+    active_alert = get_active_alert()
+    initial = {'kind': 'state', 'alert_id': active_alert['id'] if active_alert else None}
+    return Response(events.stream('emergency', 'alert', initial),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @emergency_bp.route('/responders/<alert_id>')
 def responders_partial(alert_id):
     """HTMX endpoint - returns updated responder list."""
@@ -7,18 +7,20 @@ Provides:
   POST /notices/new     - validate + store image (+ optional PDF), INSERT notice row
 
 Server-side permission: every mutating path checks session['can_post_notice'].
-Files are written to the Render persistent disk under /var/data/notice_files/.
+Files are written to the Render persistent disk under /var/data/notice_files/,
+named by content hash and shared between notices (app/services/upload_store).
 Tenant-scoped from day one (no S-03 residue debt for this new table).
 ASCII-only.
 """
 
 from flask import (Blueprint, render_template, request, redirect,
-                   session, send_file, abort)
+                   session, abort)
 from markupsafe import escape
 from datetime import datetime, timezone
 import os
 import uuid
 from app.services.db import get_connection
+from app.services import file_serving, image_derivatives, upload_store
 from app.routes.push import send_notice_posted_push
 
 notices_bp = Blueprint('notices', __name__, url_prefix='/notices')
@@ -89,6 +91,11 @@ def _sniff_image(head):
     return None
 
 
+def _sniff_pdf(head):
+    """'pdf' if head bytes carry the PDF signature, else None."""
+    return "pdf" if head[:4] == PDF_MAGIC else None
+
+
 def _render_form(error=None, form=None):
     """Re-render the New Notice form, preserving entered text on error.
     Upload size limits are derived from the byte constants (single source of
@@ -230,9 +237,21 @@ def serve_file(notice_id, kind):
     abs_path = os.path.join(base_dir, bare)
     if not os.path.isfile(abs_path):
         abort(404)
+
+    # ?size=thumb|medium on an image: a resized copy (WebP when accepted),
+    # falling back to the original if one cannot be made.
+    size = request.args.get('size')
+    if kind == 'image' and size:
+        derived = image_derivatives.path_for(
+            base_dir, bare, size,
+            image_derivatives.accepts_webp(request.headers.get('Accept')))
+        if derived is not None:
+            resp = file_serving.send(derived[0], derived[1])
+            resp.vary.add('Accept')
+            return resp
     ext = bare.rsplit('.', 1)[-1].lower() if '.' in bare else ''
     mimetype = _MIME.get(ext, 'application/octet-stream')
-    return send_file(abs_path, mimetype=mimetype, conditional=True)
+    return file_serving.send(abs_path, mimetype)
 
 
 @notices_bp.route('/<notice_id>/delete', methods=['POST'])
@@ -311,58 +330,48 @@ def new_notice():
 
     # Optional image (Phase C 5.1: image is no longer required).
     # Only read/validate when one is actually uploaded; image_path stays NULL
-    # otherwise (schema_version 14 made notice.image_path nullable).
+    # otherwise (schema_version 14 made notice.image_path nullable). Files are
+    # streamed to a temp file (upload_store): type from the first bytes, size
+    # cap enforced as they arrive, never held whole in memory.
     image = request.files.get('image')
-    img_bytes = None
-    canon_ext = None
+    img_staged = None
     if image and image.filename:
-        img_bytes = image.read()
-        if len(img_bytes) == 0:
+        img_staged, err = upload_store.stage(
+            image.stream, _sniff_image, IMAGE_MAX_BYTES, NOTICE_ROOT)
+        if err == 'empty':
             return _render_form("The image file is empty.", form)
-        if len(img_bytes) > IMAGE_MAX_BYTES:
+        if err == 'too_large':
             return _render_form("Image is too large (max 5 MB).", form)
-        canon_ext = _sniff_image(img_bytes[:16])
-        if canon_ext is None:
+        if err:
             return _render_form("Image must be a JPG, PNG, or WEBP file.", form)
 
     # Optional PDF
     doc = request.files.get('attachment')
-    doc_bytes = None
+    doc_staged = None
     if doc and doc.filename:
-        doc_bytes = doc.read()
-        if len(doc_bytes) > PDF_MAX_BYTES:
-            return _render_form("PDF is too large (max 10 MB).", form)
-        if not doc_bytes[:4] == PDF_MAGIC:
+        doc_staged, err = upload_store.stage(
+            doc.stream, _sniff_pdf, PDF_MAX_BYTES, NOTICE_ROOT)
+        if err:
+            upload_store.discard(img_staged)
+            if err == 'too_large':
+                return _render_form("PDF is too large (max 10 MB).", form)
             return _render_form("Attachment must be a PDF file.", form)
 
     # Combined validity guard (Phase C 5.1): a notice needs title + category
     # (checked above) PLUS at least one of {body, image, PDF}. Title+category
     # alone is rejected. This must run AFTER both file inputs are resolved.
-    if not form['body'] and img_bytes is None and doc_bytes is None:
+    if not form['body'] and img_staged is None and doc_staged is None:
         return _render_form(
             "Add at least one of: a body message, an image, or a PDF.", form)
 
-    # ---- Write files (UUID names, never trust uploaded filename) ----
+    # ---- Store files (content-addressed, never trust uploaded filename) ----
     # Spec 3.3: store the RELATIVE filename in the DB, not the absolute path.
     # Phase C's serve route joins the stored filename back onto IMG_DIR / DOC_DIR.
-    # This keeps the DB decoupled from the mount location.
+    # This keeps the DB decoupled from the mount location. A poster or PDF
+    # posted again shares the file already on disk.
     image_path = None
-    if img_bytes is not None:
-        os.makedirs(IMG_DIR, exist_ok=True)
-        img_name = "%s.%s" % (uuid.uuid4().hex, canon_ext)
-        with open(os.path.join(IMG_DIR, img_name), 'wb') as f:
-            f.write(img_bytes)
-        image_path = img_name  # store bare filename
-
     attachment_path = None
     attachment_type = None
-    if doc_bytes is not None:
-        os.makedirs(DOC_DIR, exist_ok=True)
-        doc_name = "%s.pdf" % uuid.uuid4().hex
-        with open(os.path.join(DOC_DIR, doc_name), 'wb') as f:
-            f.write(doc_bytes)
-        attachment_path = doc_name  # store bare filename
-        attachment_type = 'pdf'
 
     # ---- INSERT (tenant-scoped) ----
     # NOTE: the 'notify' form toggle is intentionally NOT acted on in Phase B.
@@ -375,18 +384,43 @@ def new_notice():
     posted_at = datetime.now(timezone.utc).isoformat()
     body_val = form['body'] if form['body'] else None
 
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO notice "
-            "(id, tenant_id, title, body, category, image_path, "
-            " attachment_path, attachment_type, posted_by_id, author_desk, "
-            " is_pinned, notify_sent, posted_at, is_active, linked_source_id) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, 1, ?)",
-            (notice_id, TENANT_ID, form['title'], body_val, form['category'],
-             image_path, attachment_path, attachment_type, posted_by_id,
-             author_desk, is_pinned, posted_at, linked_source_id))
-        conn.commit()
+    try:
+        if img_staged is not None:
+            image_path = upload_store.store(img_staged, 'notice_img', IMG_DIR)
+        if doc_staged is not None:
+            attachment_path = upload_store.store(doc_staged, 'notice_doc', DOC_DIR)
+            attachment_type = 'pdf'
+
+        with get_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(
+                    "INSERT INTO notice "
+                    "(id, tenant_id, title, body, category, image_path, "
+                    " attachment_path, attachment_type, posted_by_id, author_desk, "
+                    " is_pinned, notify_sent, posted_at, is_active, linked_source_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, 1, ?)",
+                    (notice_id, TENANT_ID, form['title'], body_val, form['category'],
+                     image_path, attachment_path, attachment_type, posted_by_id,
+                     author_desk, is_pinned, posted_at, linked_source_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception:
+        # Give the file references back (and drop a staged PDF never stored)
+        # so nothing unreferenced is left, whichever step failed.
+        upload_store.discard(doc_staged)
+        if image_path:
+            upload_store.release('notice_img', IMG_DIR, image_path)
+        if attachment_path:
+            upload_store.release('notice_doc', DOC_DIR, attachment_path)
+        raise
+
+    # Resized copies for the board, made off-request (serve_file would
+    # otherwise make them on the first view).
+    if image_path:
+        image_derivatives.queue_warm(IMG_DIR, image_path)
 
     # Phase E: if the author ticked "notify staff", broadcast to every
     # registered device in the tenant. The notice is already committed;
@@ -45,15 +45,11 @@ def api_stats():
         """, (TENANT_ID, today_str))
         submitted_count = cursor.fetchone()[0]
         
-        # Get today's attendance entries stats
+        # Today's counts from the daily rollup (attendance_rollup.py)
         cursor.execute("""
-            SELECT 
-                SUM(CASE WHEN ae.status = 'Present' THEN 1 ELSE 0 END) as present,
-                SUM(CASE WHEN ae.status = 'Absent' THEN 1 ELSE 0 END) as absent,
-                SUM(CASE WHEN ae.status = 'Late' THEN 1 ELSE 0 END) as late
-            FROM attendance_entry ae
-            JOIN attendance a ON ae.attendance_id = a.id
-            WHERE a.tenant_id = ? AND a.date = ?
+            SELECT SUM(present) as present, SUM(absent) as absent, SUM(late) as late
+            FROM attendance_daily_rollup
+            WHERE tenant_id = ? AND date = ?
         """, (TENANT_ID, today_str))
         
         row = cursor.fetchone()
@@ -120,28 +116,27 @@ def api_weekly_trend():
     school_days.reverse()  # Oldest to newest
     
     trend_data = []
+    day_strs = [day.isoformat() for day in school_days]
     
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        for day in school_days:
-            day_str = day.isoformat()
+        # All five days from the daily rollup in one query
+        cursor.execute("""
+            SELECT date, SUM(present) as present, SUM(absent) as absent, SUM(late) as late
+            FROM attendance_daily_rollup
+            WHERE tenant_id = ? AND date IN ({})
+            GROUP BY date
+        """.format(",".join("?" * len(day_strs))), (TENANT_ID, *day_strs))
+        by_date = {row['date']: row for row in cursor.fetchall()}
+        
+        for day, day_str in zip(school_days, day_strs):
             day_label = day.strftime('%a')  # Mon, Tue, etc.
             
-            cursor.execute("""
-                SELECT 
-                    SUM(CASE WHEN ae.status = 'Present' THEN 1 ELSE 0 END) as present,
-                    SUM(CASE WHEN ae.status = 'Absent' THEN 1 ELSE 0 END) as absent,
-                    SUM(CASE WHEN ae.status = 'Late' THEN 1 ELSE 0 END) as late
-                FROM attendance_entry ae
-                JOIN attendance a ON ae.attendance_id = a.id
-                WHERE a.tenant_id = ? AND a.date = ?
-            """, (TENANT_ID, day_str))
-            
-            row = cursor.fetchone()
-            present = row['present'] or 0
-            absent = row['absent'] or 0
-            late = row['late'] or 0
+            row = by_date.get(day_str)
+            present = (row['present'] or 0) if row else 0
+            absent = (row['absent'] or 0) if row else 0
+            late = (row['late'] or 0) if row else 0
             
             total = present + absent + late
             rate = round((present / total) * 100, 1) if total > 0 else 0
@@ -170,14 +165,13 @@ def api_grade_comparison():
             SELECT 
                 g.grade_name,
                 g.grade_number,
-                COUNT(CASE WHEN ae.status = 'Present' THEN 1 END) as present,
-                COUNT(CASE WHEN ae.status = 'Absent' THEN 1 END) as absent,
-                COUNT(CASE WHEN ae.status = 'Late' THEN 1 END) as late
-            FROM attendance_entry ae
-            JOIN attendance a ON ae.attendance_id = a.id
-            JOIN mentor_group mg ON a.mentor_group_id = mg.id
+                SUM(r.present) as present,
+                SUM(r.absent) as absent,
+                SUM(r.late) as late
+            FROM attendance_daily_rollup r
+            JOIN mentor_group mg ON r.mentor_group_id = mg.id
             JOIN grade g ON mg.grade_id = g.id
-            WHERE a.tenant_id = ? AND a.date = ?
+            WHERE r.tenant_id = ? AND r.date = ?
             GROUP BY g.id
             ORDER BY g.grade_number
         """, (TENANT_ID, today_str))
@@ -4,10 +4,14 @@ Uses service account authentication (modern approach)
 """
 from flask import Blueprint, request, jsonify, session
 from app.services.db import get_connection, generate_id, now_iso
+from app.services.jobs import percentile
 import os
 import json
 import time
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
 push_bp = Blueprint('push', __name__, url_prefix='/push')
@@ -17,12 +21,80 @@ TENANT_ID = "MARAGON"
 # Firebase project ID
 FIREBASE_PROJECT_ID = "schoolops-d8bdd"
 
+FCM_SEND_URL = f"https://fcm.googleapis.com/v1/projects/{FIREBASE_PROJECT_ID}/messages:send"
+
 # Cache for access token
 _token_cache = {
     'token': None,
     'expires_at': 0
 }
 
+# Fan-out sizing. Each worker holds one keep-alive connection to FCM, so
+# pool size == max in-flight sends. Emergency alerts use their own lane so
+# a notice broadcast in progress never queues ahead of them.
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', '8'))
+PUSH_PRIORITY_WORKERS = int(os.environ.get('PUSH_PRIORITY_WORKERS', '16'))
+PUSH_TIMEOUT = 10
+
+_http = None
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Per-thread outcome tally. The job queue uses it to tell "nothing delivered
+# because FCM/OAuth failed" (retry later) from "no devices registered".
+_tally = threading.local()
+
+
+@contextmanager
+def track_push_outcomes():
+    """Count send outcomes ('ok' / 'invalid' / 'error') made on this thread."""
+    counts = {'ok': 0, 'invalid': 0, 'error': 0}
+    outer = getattr(_tally, 'counts', None)
+    _tally.counts = counts
+    try:
+        yield counts
+    finally:
+        _tally.counts = outer
+        if outer is not None:
+            for outcome, n in counts.items():
+                outer[outcome] += n
+
+
+def _note_outcome(outcome, n=1):
+    counts = getattr(_tally, 'counts', None)
+    if counts is not None:
+        counts[outcome] += n
+
+
+def _get_http():
+    """Shared keep-alive session (TLS + HTTP connection reuse across sends)."""
+    global _http
+    if _http is None:
+        with _pools_lock:
+            if _http is None:
+                session_ = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=PUSH_WORKERS + PUSH_PRIORITY_WORKERS)
+                session_.mount('https://', adapter)
+                _http = session_
+    return _http
+
+
+def _get_pool(priority):
+    """Bounded send pool for a lane, created lazily (after gunicorn fork)."""
+    lane = 'priority' if priority else 'normal'
+    pool = _pools.get(lane)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(lane)
+            if pool is None:
+                pool = ThreadPoolExecutor(
+                    max_workers=PUSH_PRIORITY_WORKERS if priority else PUSH_WORKERS,
+                    thread_name_prefix=f'push-{lane}')
+                _pools[lane] = pool
+    return pool
+
 
 def get_service_account_info():
     """Get service account info from environment variable"""
@@ -71,7 +143,7 @@ def get_access_token():
     
     # Exchange JWT for access token
     try:
-        response = requests.post(
+        response = _get_http().post(
             'https://oauth2.googleapis.com/token',
             data={
                 'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
@@ -83,6 +155,7 @@ def get_access_token():
         # Never hang or crash the request cycle on token failure -
         # degrade to "pushes skipped" for this call.
         print(f"ERROR getting access token (network): {e}")
+        _note_outcome('error')
         return None
     
     if response.status_code == 200:
@@ -92,25 +165,11 @@ def get_access_token():
         return data['access_token']
     else:
         print(f"ERROR getting access token: {response.status_code} {response.text}")
+        _note_outcome('error')
         return None
 
 
-def send_push_notification(token, title, body, data=None, badge_url=None):
-    """
-    Send push notification to a single device using FCM V1 API
-    """
-    access_token = get_access_token()
-    if not access_token:
-        print("WARNING: No Firebase access token available - push disabled")
-        return False
-    
-    url = f"https://fcm.googleapis.com/v1/projects/{FIREBASE_PROJECT_ID}/messages:send"
-    
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
-    
+def _build_message(token, title, body, data=None, badge_url=None, priority=False):
     # Build message payload - DATA ONLY (no 'notification' key)
     # This prevents Firebase SDK from intercepting and suppressing display.
     # Both foreground (onMessage) and background (onBackgroundMessage) handle display.
@@ -123,28 +182,145 @@ def send_push_notification(token, title, body, data=None, badge_url=None):
         msg_data.update({k: str(v) for k, v in data.items()})
     
     message = {
-        'message': {
-            'token': token,
-            'data': msg_data
-        }
+        'token': token,
+        'data': msg_data
     }
+    if priority:
+        # Ask every transport to deliver now rather than batch for battery.
+        message['android'] = {'priority': 'high'}
+        message['apns'] = {'headers': {'apns-priority': '10'}}
+        message['webpush'] = {'headers': {'Urgency': 'high'}}
+    return {'message': message}
+
+
+def _send_fcm(access_token, token, title, body, data=None, badge_url=None, priority=False):
+    """
+    One FCM V1 send over the shared session.
+    Returns (outcome, seconds) - outcome is 'ok', 'invalid' (token is dead,
+    safe to delete) or 'error' (transient: timeout, 5xx, quota).
+    """
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    message = _build_message(token, title, body, data, badge_url, priority)
     
+    started = time.monotonic()
     try:
-        response = requests.post(url, headers=headers, json=message, timeout=10)
-        
-        if response.status_code == 200:
-            print(f"PUSH OK: {title[:40]} -> token {token[:20]}...")
-            return True
-        elif response.status_code == 404 or 'NOT_FOUND' in response.text:
-            print(f"Invalid token (will be cleaned): {token[:20]}...")
-            return False
-        else:
-            print(f"FCM error: {response.status_code} {response.text}")
-            return False
-            
+        response = _get_http().post(FCM_SEND_URL, headers=headers, json=message,
+                                    timeout=PUSH_TIMEOUT)
     except requests.exceptions.RequestException as e:
         print(f"FCM request failed: {e}")
+        return 'error', time.monotonic() - started
+    elapsed = time.monotonic() - started
+    
+    if response.status_code == 200:
+        print(f"PUSH OK: {title[:40]} -> token {token[:20]}...")
+        return 'ok', elapsed
+    elif (response.status_code == 404 or 'NOT_FOUND' in response.text
+            or 'UNREGISTERED' in response.text):
+        print(f"Invalid token (will be cleaned): {token[:20]}...")
+        return 'invalid', elapsed
+    else:
+        print(f"FCM error: {response.status_code} {response.text}")
+        return 'error', elapsed
+
+
+def send_push_notification(token, title, body, data=None, badge_url=None):
+    """
+    Send push notification to a single device using FCM V1 API
+    """
+    access_token = get_access_token()
+    if not access_token:
+        print("WARNING: No Firebase access token available - push disabled")
         return False
+    
+    outcome, _ = _send_fcm(access_token, token, title, body, data, badge_url)
+    _note_outcome(outcome)
+    return outcome == 'ok'
+
+
+def fan_out_push(token_rows, title, body, data=None, priority=False, label='Push'):
+    """
+    Send one message to many devices concurrently.
+    
+    token_rows: push_token rows with 'id' and 'token'.
+    priority:   True = emergency lane (own worker pool + high-priority
+                delivery hints); False = shared normal lane.
+    
+    Sends run on a bounded thread pool over one keep-alive session. When
+    they are done, last_used_at for every delivered token and the DELETE of
+    every token FCM reports as dead are written in ONE transaction.
+    Transient failures (timeouts, 5xx, 429) keep their token.
+    
+    Returns a stats dict: sent, failed, invalid, total, latency_ms
+    (p50/p95/max per send) and wall_ms.
+    """
+    stats = {'sent': 0, 'failed': 0, 'invalid': 0, 'total': len(token_rows),
+             'latency_ms': {'p50': 0, 'p95': 0, 'max': 0}, 'wall_ms': 0}
+    if not token_rows:
+        return stats
+    
+    access_token = get_access_token()
+    if not access_token:
+        print("WARNING: No Firebase access token available - push disabled")
+        stats['failed'] = len(token_rows)
+        return stats
+    
+    started = time.monotonic()
+    pool = _get_pool(priority)
+    futures = [
+        (row['id'], pool.submit(_send_fcm, access_token, row['token'],
+                                title, body, data, None, priority))
+        for row in token_rows
+    ]
+    
+    delivered = []
+    invalid = []
+    latencies = []
+    for token_id, future in futures:
+        outcome, elapsed = future.result()
+        latencies.append(elapsed)
+        if outcome == 'ok':
+            delivered.append(token_id)
+        elif outcome == 'invalid':
+            invalid.append(token_id)
+    wall = time.monotonic() - started
+    _note_outcome('ok', len(delivered))
+    _note_outcome('invalid', len(invalid))
+    _note_outcome('error', len(token_rows) - len(delivered) - len(invalid))
+    
+    if delivered or invalid:
+        used_at = now_iso()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE push_token SET last_used_at = ? WHERE id = ? AND tenant_id = ?",
+                [(used_at, token_id, TENANT_ID) for token_id in delivered])
+            cursor.executemany(
+                "DELETE FROM push_token WHERE id = ? AND tenant_id = ?",
+                [(token_id, TENANT_ID) for token_id in invalid])
+            conn.commit()
+        if invalid:
+            print(f"Cleaned {len(invalid)} invalid tokens")
+    
+    latencies.sort()
+    stats.update({
+        'sent': len(delivered),
+        'invalid': len(invalid),
+        'failed': len(token_rows) - len(delivered),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000),
+            'p95': round(percentile(latencies, 95) * 1000),
+            'max': round(latencies[-1] * 1000),
+        },
+        'wall_ms': round(wall * 1000),
+    })
+    print(f"{label} sent to {stats['sent']}/{stats['total']} devices "
+          f"({'priority' if priority else 'normal'} lane) - "
+          f"p50 {stats['latency_ms']['p50']}ms, p95 {stats['latency_ms']['p95']}ms, "
+          f"max {stats['latency_ms']['max']}ms, wall {stats['wall_ms']}ms")
+    return stats
 
 
 def send_emergency_alert_push(alert_type, location, triggered_by):
@@ -178,32 +354,10 @@ def send_emergency_alert_push(alert_type, location, triggered_by):
     title = f"{type_emoji} EMERGENCY: {alert_type}"
     body = f"Location: {location}\nTriggered by: {triggered_by}"
     
-    success_count = 0
-    invalid_tokens = []
-    
-    for token_row in tokens:
-        token_id, token = token_row['id'], token_row['token']
-        if send_push_notification(token, title, body, data={'type': 'emergency', 'alert_type': alert_type}):
-            success_count += 1
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE push_token SET last_used_at = ? WHERE id = ?
-                ''', (now_iso(), token_id))
-                conn.commit()
-        else:
-            invalid_tokens.append(token_id)
-    
-    if invalid_tokens:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            for token_id in invalid_tokens:
-                cursor.execute('DELETE FROM push_token WHERE id = ?', (token_id,))
-            conn.commit()
-        print(f"Cleaned {len(invalid_tokens)} invalid tokens")
-    
-    print(f"Push sent to {success_count}/{len(tokens)} devices")
-    return success_count
+    stats = fan_out_push(tokens, title, body,
+                         data={'type': 'emergency', 'alert_type': alert_type},
+                         priority=True, label='Emergency push')
+    return stats['sent']
 
 
 def send_all_clear_push(alert_type, location, resolved_by):
@@ -230,14 +384,10 @@ def send_all_clear_push(alert_type, location, resolved_by):
     title = "✅ ALL CLEAR"
     body = f"{alert_type} emergency at {location} has been resolved by {resolved_by}"
     
-    success_count = 0
-    for token_row in tokens:
-        token_id, token = token_row['id'], token_row['token']
-        if send_push_notification(token, title, body, data={'type': 'resolved', 'alert_type': alert_type}):
-            success_count += 1
-    
-    print(f"All Clear push sent to {success_count}/{len(tokens)} devices")
-    return success_count
+    stats = fan_out_push(tokens, title, body,
+                         data={'type': 'resolved', 'alert_type': alert_type},
+                         priority=True, label='All Clear push')
+    return stats['sent']
 
 
 @push_bp.route('/register', methods=['POST'])
@@ -804,35 +954,7 @@ def send_notice_posted_push(category, title, author_desk):
     push_title = f"\U0001F4E2 {category}: {title}"
     push_body = f"Posted by {author_desk}"
 
-    success_count = 0
-    invalid_tokens = []
-    for token_row in tokens:
-        token_id, token = token_row['id'], token_row['token']
-        if send_push_notification(
-            token, push_title, push_body,
-            data={'type': 'notice', 'link': '/notices/?from=push'}
-        ):
-            success_count += 1
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE push_token SET last_used_at = ? "
-                    "WHERE id = ? AND tenant_id = ?",
-                    (now_iso(), token_id, TENANT_ID),
-                )
-                conn.commit()
-        else:
-            invalid_tokens.append(token_id)
-
-    if invalid_tokens:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            for token_id in invalid_tokens:
-                cursor.execute(
-                    'DELETE FROM push_token WHERE id = ? AND tenant_id = ?',
-                    (token_id, TENANT_ID))
-            conn.commit()
-        print(f"Cleaned {len(invalid_tokens)} invalid tokens")
-
-    print(f"Notice push sent to {success_count}/{len(tokens)} devices")
-    return success_count
+    stats = fan_out_push(tokens, push_title, push_body,
+                         data={'type': 'notice', 'link': '/notices/?from=push'},
+                         label='Notice push')
+    return stats['sent']
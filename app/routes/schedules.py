@@ -8,6 +8,8 @@ This file (B-2) provides:
   GET  /schedules/upload      - render the Upload Schedule form (author-only)
   POST /schedules/upload      - validate + store the original file, INSERT a
                                schedule_source row as 'draft', redirect to review
+  GET  /schedules/extract-status/<id>
+                             - background extraction status, polled by review
 
 The review screen, publish action, and the shared gate-protected file-serve
 route are added in B-3 (this file is extended, not rewritten).
@@ -16,16 +18,19 @@ Server-side permission: every mutating path checks session['can_post_schedule']
 (B-07/B-13 lesson - hiding the button is not security). Files are written to the
 Render persistent disk under /var/data/schedule_files/, mirroring the Notice
 Board pattern (E-04) so the two converge on one file-serve route in B-3 / when
-Notice Board un-parks. Tenant-scoped from day one. ASCII-only.
+Notice Board un-parks. Both store uploads through app/services/upload_store
+(streamed, content-addressed, reference-counted). Tenant-scoped from day one. ASCII-only.
 """
 
-from flask import Blueprint, render_template, request, redirect, session, send_file, abort
+from flask import Blueprint, render_template, request, redirect, session, abort, jsonify
 from datetime import datetime, timezone, date
+import hashlib
 import os
 import re
 import uuid
 from app.services.db import get_connection
-from app.services.extract import extract_rows
+from app.services import extract_cache, file_serving, image_derivatives, upload_store
+from app.services.extract import extract_page_ranges
 from app.services.nav import get_nav_header, get_nav_styles
 
 schedules_bp = Blueprint('schedules', __name__, url_prefix='/schedules')
@@ -49,6 +54,9 @@ WEBP_RIFF = b"RIFF"
 WEBP_TAG = b"WEBP"
 PDF_MAGIC = b"%PDF"
 
+# Programmes whose uploads get background vision extraction (extract.py).
+EXTRACT_SLUGS = {'assessment-timetable'}
+
 
 def _can_post():
     """Server-side author guard. True only if the session flag is set."""
@@ -67,6 +75,13 @@ def _sniff_image(head):
     return None
 
 
+def _sniff_upload(head):
+    """Canonical ext for a schedule upload: 'pdf' or an image ext, else None."""
+    if head[:4] == PDF_MAGIC:
+        return "pdf"
+    return _sniff_image(head)
+
+
 def _load_programmes():
     """The seeded programme list for the dropdown (active only, sorted)."""
     with get_connection() as conn:
@@ -276,46 +291,35 @@ def upload():
         return _render_upload("Please choose a valid programme.", form)
 
     # File: required for a schedule source (the original artifact IS the point).
-    # An image OR a PDF. Mirrors Notice Board validation exactly.
+    # An image OR a PDF. Mirrors Notice Board validation exactly. Streamed to
+    # a temp file: type from the first bytes, size cap enforced as it arrives.
     upload_file = request.files.get('file')
     if not upload_file or not upload_file.filename:
         return _render_upload("Please attach the schedule file (image or PDF).", form)
 
-    raw = upload_file.read()
-    if len(raw) == 0:
+    staged, err = upload_store.stage(
+        upload_file.stream, _sniff_upload,
+        {'pdf': PDF_MAX_BYTES, 'png': IMAGE_MAX_BYTES, 'jpg': IMAGE_MAX_BYTES,
+         'webp': IMAGE_MAX_BYTES},
+        SCHEDULE_ROOT)
+    if err == 'empty':
         return _render_upload("The uploaded file is empty.", form)
-
-    file_kind = None       # 'image' | 'pdf'
-    canon_ext = None
-    if raw[:4] == PDF_MAGIC:
-        if len(raw) > PDF_MAX_BYTES:
+    if err == 'unsupported':
+        return _render_upload("File must be a PDF, or a JPG/PNG/WEBP image.", form)
+    if err == 'too_large':
+        if staged['ext'] == 'pdf':
             return _render_upload("PDF is too large (max 10 MB).", form)
-        file_kind = 'pdf'
-        canon_ext = 'pdf'
-    else:
-        canon_ext = _sniff_image(raw[:16])
-        if canon_ext is None:
-            return _render_upload(
-                "File must be a PDF, or a JPG/PNG/WEBP image.", form)
-        if len(raw) > IMAGE_MAX_BYTES:
-            return _render_upload("Image is too large (max 5 MB).", form)
-        file_kind = 'image'
-
-    # ---- Write the original file (UUID name, never trust uploaded name) ----
+        return _render_upload("Image is too large (max 5 MB).", form)
+    file_kind = 'pdf' if staged['ext'] == 'pdf' else 'image'
+
+    # ---- Store the original (content-addressed, never the uploaded name) ----
     # Store the BARE filename in file_path; B-3's serve route joins it back onto
-    # IMG_DIR / DOC_DIR. Keeps the DB decoupled from the mount location.
-    # abs_path is retained so the file can be removed if the INSERT below fails
-    # (no orphaned file left on disk).
-    if file_kind == 'image':
-        os.makedirs(IMG_DIR, exist_ok=True)
-        fname = "%s.%s" % (uuid.uuid4().hex, canon_ext)
-        abs_path = os.path.join(IMG_DIR, fname)
-    else:
-        os.makedirs(DOC_DIR, exist_ok=True)
-        fname = "%s.pdf" % uuid.uuid4().hex
-        abs_path = os.path.join(DOC_DIR, fname)
-    with open(abs_path, 'wb') as f:
-        f.write(raw)
+    # IMG_DIR / DOC_DIR. Keeps the DB decoupled from the mount location. The
+    # same bytes uploaded again share one file; the reference is given back
+    # if the INSERT below fails (no orphaned file left on disk).
+    area = 'schedule_img' if file_kind == 'image' else 'schedule_doc'
+    base_dir = IMG_DIR if file_kind == 'image' else DOC_DIR
+    fname = upload_store.store(staged, area, base_dir)
 
     # ---- INSERT schedule_source as draft (tenant-scoped) ----
     source_id = str(uuid.uuid4())
@@ -337,52 +341,29 @@ def upload():
                  term_label, fname, file_kind, uploaded_by_id, posted_at, notes))
             conn.commit()
         except Exception:
-            # INSERT failed: remove the file just written so no orphan is left
-            # on disk (the file is only ever served via a DB row, so an
-            # unreferenced file would otherwise sit forever). Re-raise after.
-            try:
-                os.remove(abs_path)
-            except OSError:
-                pass
+            # INSERT failed: give the file reference back so no unreferenced
+            # file is left on disk (the file is only ever served via a DB
+            # row). Re-raise after.
+            conn.rollback()
+            upload_store.release(area, base_dir, fname)
             raise
 
+    if file_kind == 'image':
+        image_derivatives.queue_warm(IMG_DIR, fname)
+
     # ---- E-05 Phase 2: in-app vision extraction (Assessment Timetable) ----
     # The draft + file are now safely persisted. Extraction is a pure
-    # ENHANCEMENT layered on top: on ANY failure we do nothing extra and the
-    # author lands on the review screen with the empty paste box (the B-3
-    # path stays as the permanent safety net). The returned TSV is NOT
-    # trusted - it runs through the SAME _parse_rows a human paste does, so a
-    # model misread is rejected identically to a bad hand-paste (Model B:
-    # never auto-publish; these rows land as an unpublished draft for review).
+    # ENHANCEMENT layered on top and runs as a background job (run_extraction
+    # below) so this worker is not pinned for the model call: the author
+    # lands on the review screen at once and it fills in when the job is done.
     prog_slug = next(
         (p['slug'] for p in _load_programmes()
          if p['id'] == form['programme_id']), None)
-    if prog_slug == 'assessment-timetable':
-        tsv, _err = extract_rows(raw, file_kind, prog_slug)
-        if tsv:
-            rows, parse_err = _parse_rows(tsv)
-            if not parse_err and rows:
-                try:
-                    with get_connection() as conn:
-                        cur = conn.cursor()
-                        for r in rows:
-                            cur.execute(
-                                "INSERT INTO schedule_item "
-                                "(id, tenant_id, source_id, programme_id, "
-                                " item_date, end_date, start_time, end_time, "
-                                " grade, session, venue, label, sub_label, "
-                                " sort_hint, is_active) "
-                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
-                                (str(uuid.uuid4()), TENANT_ID, source_id,
-                                 form['programme_id'], r['item_date'],
-                                 r['end_date'], r['start_time'], r['end_time'],
-                                 r['grade'], r['session'], r['venue'],
-                                 r['label'], r['sub_label'], r['sort_hint']))
-                        conn.commit()
-                except Exception:
-                    # Extraction is best-effort: a DB hiccup here must not
-                    # break the upload. Swallow and fall back to empty paste.
-                    pass
+    if prog_slug in EXTRACT_SLUGS:
+        # Same bytes seen before under this prompt + model: fill rows now.
+        if not _extract_from_cache(source_id, form['programme_id'], prog_slug,
+                                   staged['sha256']):
+            _queue_extraction(source_id)
 
     # B-3 switches this redirect to the review screen (see below).
     return redirect('/schedules/review/' + source_id)
@@ -422,7 +403,8 @@ def _load_source(source_id):
         cur.execute(
             "SELECT s.id, s.tenant_id, s.programme_id, s.title, s.term_label, "
             "       s.file_path, s.file_type, s.status, s.posted_at, "
-            "       s.published_at, s.notes, p.name AS programme_name "
+            "       s.published_at, s.notes, s.extract_status, s.extract_error, "
+            "       p.name AS programme_name "
             "FROM schedule_source s JOIN programme p ON s.programme_id = p.id "
             "WHERE s.id = ? AND s.tenant_id = ? AND s.is_active = 1",
             (source_id, TENANT_ID))
@@ -516,6 +498,20 @@ def _parse_rows(raw_text):
     return rows, None
 
 
+def _insert_items(cur, source_id, programme_id, rows):
+    """INSERT parsed rows as active items of a source (caller commits)."""
+    cur.executemany(
+        "INSERT INTO schedule_item "
+        "(id, tenant_id, source_id, programme_id, item_date, end_date, "
+        " start_time, end_time, grade, session, venue, label, "
+        " sub_label, sort_hint, is_active) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+        [(str(uuid.uuid4()), TENANT_ID, source_id, programme_id,
+          r['item_date'], r['end_date'], r['start_time'], r['end_time'],
+          r['grade'], r['session'], r['venue'], r['label'],
+          r['sub_label'], r['sort_hint']) for r in rows])
+
+
 def _render_review(source, error=None, notice=None):
     """Render the review screen for a source (always re-fetch items fresh)."""
     return render_template(
@@ -575,17 +571,15 @@ def save_items(source_id):
                 "UPDATE schedule_item SET is_active = 0 "
                 "WHERE source_id = ? AND tenant_id = ? AND is_active = 1",
                 (source_id, TENANT_ID))
-            for r in rows:
-                cur.execute(
-                    "INSERT INTO schedule_item "
-                    "(id, tenant_id, source_id, programme_id, item_date, end_date, "
-                    " start_time, end_time, grade, session, venue, label, "
-                    " sub_label, sort_hint, is_active) "
-                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
-                    (str(uuid.uuid4()), TENANT_ID, source_id, pid,
-                     r['item_date'], r['end_date'], r['start_time'], r['end_time'],
-                     r['grade'], r['session'], r['venue'], r['label'],
-                     r['sub_label'], r['sort_hint']))
+            # A hand-paste wins over an extraction still in flight: the job
+            # sees the status change and discards its rows.
+            cur.execute(
+                "UPDATE schedule_source SET extract_status = 'failed', "
+                " extract_error = 'superseded_by_paste', extract_finished_at = ? "
+                "WHERE id = ? AND tenant_id = ? "
+                "AND extract_status IN ('queued', 'running')",
+                (datetime.now(timezone.utc).isoformat(), source_id, TENANT_ID))
+            _insert_items(cur, source_id, pid, rows)
             conn.commit()
         except Exception:
             conn.rollback()
@@ -622,6 +616,183 @@ def publish(source_id):
     return redirect('/schedules/')
 
 
+# ===========================================================================
+# E-05 Phase 2: background vision extraction.
+# upload() marks the source 'queued' and enqueues a 'schedule.extract' job
+# (app/services/jobs.py); a job worker runs run_extraction. Same contract as
+# the old inline path: fail closed, the model's TSV goes through the SAME
+# _parse_rows a human paste does, rows land as an unpublished draft (Model B).
+#   extract_status  queued -> running -> done | failed   (migration 033)
+# The review screen polls extract_status and reloads when it settles.
+# ===========================================================================
+
+def _extract_from_cache(source_id, programme_id, prog_slug, sha256):
+    """Settle a fresh draft from extract_cache without queueing a job.
+    Returns False (caller queues as usual) on a miss or an unusable entry."""
+    tsv = extract_cache.lookup(sha256, prog_slug)
+    if not tsv:
+        return False
+    rows, parse_err = _parse_rows(tsv)
+    if parse_err or not rows:
+        return False
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE schedule_source SET extract_status = 'done', "
+                " extract_error = NULL, extract_started_at = ?, "
+                " extract_finished_at = ? "
+                "WHERE id = ? AND tenant_id = ?",
+                (now, now, source_id, TENANT_ID))
+            _insert_items(cur, source_id, programme_id, rows)
+            conn.commit()
+    except Exception as e:
+        print("Schedule extraction cache apply error (%s): %s" % (source_id, e))
+        return False
+    return True
+
+
+def _queue_extraction(source_id):
+    """Mark a fresh draft for extraction and enqueue the job. Best-effort: on
+    any failure the author simply gets the empty paste box."""
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE schedule_source SET extract_status = 'queued', "
+                " extract_error = NULL, extract_started_at = NULL, "
+                " extract_finished_at = NULL "
+                "WHERE id = ? AND tenant_id = ?",
+                (source_id, TENANT_ID))
+            conn.commit()
+        from app.services.jobs import enqueue
+        enqueue('schedule.extract', source_id)
+    except Exception as e:
+        print("Schedule extraction enqueue error: %s" % e)
+        _finish_extraction(source_id, 'failed', 'enqueue_failed')
+
+
+def _finish_extraction(source_id, status, error=None, rows=None, programme_id=None):
+    """Settle a running/queued extraction. rows (done only) are inserted in the
+    same transaction, and only if the source is still waiting on this job and
+    has no items yet - a hand-paste in the meantime wins."""
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            if rows:
+                cur.execute(
+                    "SELECT COUNT(*) FROM schedule_item "
+                    "WHERE source_id = ? AND tenant_id = ? AND is_active = 1",
+                    (source_id, TENANT_ID))
+                if cur.fetchone()[0]:
+                    status, error, rows = 'failed', 'items_already_present', None
+            cur.execute(
+                "UPDATE schedule_source SET extract_status = ?, extract_error = ?, "
+                " extract_finished_at = ? "
+                "WHERE id = ? AND tenant_id = ? "
+                "AND extract_status IN ('queued', 'running')",
+                (status, error, datetime.now(timezone.utc).isoformat(),
+                 source_id, TENANT_ID))
+            if cur.rowcount == 1 and rows:
+                _insert_items(cur, source_id, programme_id, rows)
+            conn.commit()
+    except Exception as e:
+        print("Schedule extraction finish error (%s): %s" % (source_id, e))
+
+
+def run_extraction(source_id):
+    """Job handler for 'schedule.extract': read the stored original, call the
+    model, parse, and store the rows as draft items of the source."""
+    started_at = datetime.now(timezone.utc).isoformat()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE schedule_source SET extract_status = 'running', "
+            " extract_started_at = ? "
+            "WHERE id = ? AND tenant_id = ? AND is_active = 1 "
+            "AND extract_status IN ('queued', 'running')",
+            (started_at, source_id, TENANT_ID))
+        conn.commit()
+        if cur.rowcount != 1:
+            return  # superseded by a paste, deleted, or already settled
+        cur.execute(
+            "SELECT s.file_path, s.file_type, s.programme_id, p.slug "
+            "FROM schedule_source s JOIN programme p ON s.programme_id = p.id "
+            "WHERE s.id = ? AND s.tenant_id = ?",
+            (source_id, TENANT_ID))
+        source = dict(cur.fetchone())
+
+    base_dir = IMG_DIR if source['file_type'] == 'image' else DOC_DIR
+    try:
+        with open(os.path.join(base_dir, source['file_path']), 'rb') as f:
+            raw = f.read()
+    except (OSError, TypeError):
+        _finish_extraction(source_id, 'failed', 'file_missing')
+        return
+
+    parts = extract_page_ranges(raw, source['file_type'], source['slug'])
+    rows, tsv, err = _merge_extractions(parts)
+    if not rows:
+        _finish_extraction(source_id, 'failed', err)
+        return
+    if err is None:
+        extract_cache.store(hashlib.sha256(raw).hexdigest(), source['slug'], tsv)
+    # A partial result is still 'done'; extract_error names the lost pages.
+    _finish_extraction(source_id, 'done', err, rows=rows,
+                       programme_id=source['programme_id'])
+
+
+def _merge_extractions(parts):
+    """Merge per-page-range extractions into one set of rows.
+
+    Each range's TSV goes through _parse_rows on its own, so one misread range
+    is dropped without losing the others. A row repeated across ranges (a date
+    spanning a page break) is kept as often as the range that has it most
+    often. Returns (rows, tsv, error): tsv is the merged rows re-serialised for
+    the cache; error is None only if every range succeeded.
+    """
+    rows, counts, failed = [], {}, []
+    for pages, tsv, err in parts:
+        if tsv and not err:
+            part_rows, err = _parse_rows(tsv)
+            if err:
+                err = 'parse: %s' % err
+        else:
+            part_rows = []
+        if err:
+            failed.append(err if pages is None else 'pages %d-%d: %s' % (pages + (err,)))
+            continue
+        seen = {}
+        for r in part_rows:
+            key = tuple(r[c] for c in ITEM_COLS)
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] > counts.get(key, 0):
+                counts[key] = seen[key]
+                rows.append(r)
+    error = '; '.join(failed) or None
+    if not rows:
+        return [], None, error or 'parse: no rows'
+    merged = "\n".join(
+        "\t".join('' if r[c] is None else str(r[c]) for c in ITEM_COLS)
+        for r in rows)
+    return rows, merged, error
+
+
+@schedules_bp.route('/extract-status/<source_id>')
+def extract_status(source_id):
+    """Polled by the review screen while an extraction is queued/running."""
+    if not session.get('staff_id'):
+        abort(403)
+    if not _can_post():
+        abort(403)
+    source = _load_source(source_id)
+    if source is None:
+        abort(404)
+    return jsonify({'status': source['extract_status'],
+                    'error': source['extract_error']})
+
+
 @schedules_bp.route('/file/<source_id>/<kind>')
 def serve_file(source_id, kind):
     """Stream a source's original file. READ-ONLY: everyone past the gate (this
@@ -650,6 +821,18 @@ def serve_file(source_id, kind):
     if not os.path.isfile(abs_path):
         abort(404)
 
+    # ?size=thumb|medium on an image: a resized copy (WebP when accepted),
+    # falling back to the original if one cannot be made.
+    size = request.args.get('size')
+    if kind == 'image' and size:
+        derived = image_derivatives.path_for(
+            base_dir, bare, size,
+            image_derivatives.accepts_webp(request.headers.get('Accept')))
+        if derived is not None:
+            resp = file_serving.send(derived[0], derived[1])
+            resp.vary.add('Accept')
+            return resp
+
     ext = bare.rsplit('.', 1)[-1].lower() if '.' in bare else ''
     mimetype = _MIME.get(ext, 'application/octet-stream')
-    return send_file(abs_path, mimetype=mimetype, conditional=True)
+    return file_serving.send(abs_path, mimetype)
@@ -11,6 +11,7 @@ from app.services.substitute_engine import (
     get_teacher_schedule, get_current_pointer
 )
 from app.services.nav import get_nav_header, get_nav_styles
+from app.services.substitute_overview import get_overview
 
 substitute_bp = Blueprint('substitute', __name__, url_prefix='/substitute')
 
@@ -61,6 +62,66 @@ def get_back_url_for_user():
     return '/', 'Home'
 
 
+def _enqueue_absence_followups(results, absent_staff_id, duty_range,
+                               reported=None, covered_display=None, log_prefix=''):
+    """
+    Queue the side effects of a processed absence (app/services/jobs.py):
+    duty-clash reassignment, the management push, the absent teacher's
+    book-out push and one push per assigned substitute period.
+
+    duty_range:      (start, end) passed to handle_absent_teacher_duties.
+    reported:        (status, start, end) for the management push; defaults
+                     to the engine's absence_status + date_range.
+    covered_display: date text for the absent teacher's push; defaults to
+                     the engine's date_range.
+    """
+    from app.services.jobs import enqueue
+
+    start_date, end_date = duty_range
+    date_range = results.get('date_range', {})
+    _start = date_range.get('start', start_date)
+    _end = date_range.get('end', end_date)
+    if reported is None:
+        reported = (results.get('absence_status', ''), _start, _end)
+    if covered_display is None:
+        covered_display = _start if (not _end or _end == _start) else f"{_start} - {_end}"
+    covered = results.get('covered_count', 0)
+    total = results.get('total_count', 0)
+
+    try:
+        if absent_staff_id:
+            enqueue('duty.absent_teacher_duties', absent_staff_id, start_date, end_date)
+    except Exception as e:
+        print(f"{log_prefix}duty clash enqueue error: {e}")
+
+    try:
+        staff_name = results.get('sick_teacher', {}).get('name', 'A teacher')
+        enqueue('push.absence_reported', staff_name, *reported, covered, total)
+    except Exception as e:
+        print(f'{log_prefix}absence reported push enqueue error: {e}')
+
+    # E-03 Phase C: notify the absent teacher (book-out)
+    try:
+        if absent_staff_id:
+            enqueue('push.absence_covered', absent_staff_id, covered, total, covered_display)
+    except Exception as e:
+        print(f'{log_prefix}absent teacher push enqueue error: {e}')
+
+    try:
+        for day in results.get('days', []):
+            date_display = day.get('date_display', '')
+            for period in day.get('periods', []):
+                if period.get('substitute_id'):
+                    enqueue('push.substitute_assigned',
+                            period['substitute_id'],
+                            results['sick_teacher']['name'],
+                            period['period_name'],
+                            date_display,
+                            period.get('venue', 'TBC'))
+    except Exception as e:
+        print(f'{log_prefix}sub assigned push enqueue error: {e}')
+
+
 @substitute_bp.route('/')
 def index():
     """Redirect to report form."""
@@ -211,63 +272,12 @@ def report_process(absence_id):
         except Exception as e:
             print(f'pointer_before capture error: {e}')
 
-    # Handle duty clashes - reassign duties where absent teacher was assigned
-    try:
-        from app.services.substitute_engine import handle_absent_teacher_duties
-        duty_clash_results = handle_absent_teacher_duties(duty_staff_id, start_date, end_date)
-        print(f"Duty clash handling: {duty_clash_results}")
-    except Exception as e:
-        print(f"Duty clash handling error: {e}")
-
-    # Send push notification to management
-    try:
-        from app.routes.push import send_absence_reported_push
-        staff_name = results.get('sick_teacher', {}).get('name', 'A teacher')
-        date_range = results.get('date_range', {})
-        send_absence_reported_push(
-            staff_name,
-            results.get('absence_status', ''),
-            date_range.get('start', start_date),
-            date_range.get('end', end_date),
-            results.get('covered_count', 0),
-            results.get('total_count', 0)
-        )
-    except Exception as e:
-        print(f'Absence reported push error: {e}')
-
-    # E-03 Phase C: notify the absent teacher (book-out)
-    try:
-        from app.routes.push import send_absence_covered_push
-        _dr = results.get('date_range', {})
-        _start = _dr.get('start', start_date)
-        _end = _dr.get('end', end_date)
-        _disp = _start if (not _end or _end == _start) else f"{_start} - {_end}"
-        if duty_staff_id:
-            send_absence_covered_push(
-                duty_staff_id,
-                results.get('covered_count', 0),
-                results.get('total_count', 0),
-                _disp
-            )
-    except Exception as e:
-        print(f'Absent teacher push error: {e}')
-
-    # Send push notifications to substitutes
-    try:
-        from app.routes.push import send_substitute_assigned_push
-        for day in results.get('days', []):
-            date_display = day.get('date_display', '')
-            for period in day.get('periods', []):
-                if period.get('substitute_id'):
-                    send_substitute_assigned_push(
-                        period['substitute_id'],
-                        results['sick_teacher']['name'],
-                        period['period_name'],
-                        date_display,
-                        period.get('venue', 'TBC')
-                    )
-    except Exception as e:
-        print(f'Substitute push error: {e}')
+    # Side effects run on the job queue so the result card returns as soon
+    # as the allocation has committed.
+    _enqueue_absence_followups(
+        results, duty_staff_id,
+        duty_range=(start_date, end_date),
+        log_prefix='Report ')
 
     # REAL elapsed time from the engine's own timestamps.
     elapsed_secs = '0.0'
@@ -864,78 +874,19 @@ def substitute_overview_partial():
         filter_start = next_monday; filter_end = next_friday
         filter_dates = [(next_monday + timedelta(days=i)).isoformat() for i in range(5)]
     else:
+        tab = 'today'
         filter_start = day1; filter_end = day1
         filter_dates = [day1.isoformat()]
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        query = """
-            SELECT a.*, s.display_name as teacher_name, s.surname,
-                   mg.group_name as mentor_class
-            FROM absence a
-            JOIN staff s ON a.staff_id = s.id
-            LEFT JOIN mentor_group mg ON mg.mentor_id = s.id
-            WHERE a.tenant_id = ?
-              AND a.absence_date <= ?
-              AND (COALESCE(a.end_date, a.absence_date) >= ? OR a.is_open_ended = 1)
-              AND a.status NOT IN ('Resolved', 'Cancelled')
-        """
-        params = [TENANT_ID, filter_end.isoformat(), filter_start.isoformat()]
-        query += " ORDER BY a.absence_date ASC, a.reported_at ASC"
-        cursor.execute(query, params)
-        absences = [dict(row) for row in cursor.fetchall()]
-
-        for absence in absences:
-            placeholders = ','.join(['?' for _ in filter_dates])
-            cursor.execute(f"""
-                SELECT sr.*, p.period_name, p.period_number,
-                       sub.display_name as substitute_name, sc.cycle_day
-                FROM substitute_request sr
-                LEFT JOIN period p ON sr.period_id = p.id
-                LEFT JOIN staff sub ON sr.substitute_id = sub.id
-                LEFT JOIN school_calendar sc ON sr.request_date = sc.date AND sc.tenant_id = sr.tenant_id
-                WHERE sr.absence_id = ?
-                  AND sr.request_date IN ({placeholders})
-                  AND sr.status IN ('Pending', 'Assigned')
-                ORDER BY sr.request_date, sr.is_mentor_duty DESC, p.sort_order
-            """, (absence['id'], *filter_dates))
-            absence['requests'] = [dict(row) for row in cursor.fetchall()]
-
-            # Get duty coverage for this absent teacher
-            cursor.execute(f"""
-                SELECT dr.duty_date, dr.duty_type, dr.status as duty_status,
-                       dr.replacement_id,
-                       ta.area_name,
-                       rep.display_name as replacement_name
-                FROM duty_roster dr
-                LEFT JOIN terrain_area ta ON dr.terrain_area_id = ta.id
-                LEFT JOIN staff rep ON dr.replacement_id = rep.id
-                WHERE dr.staff_id = ?
-                  AND dr.duty_date IN ({placeholders})
-                  AND dr.tenant_id = ?
-                  AND dr.replacement_id IS NOT NULL
-                ORDER BY dr.duty_date, dr.duty_type
-            """, (absence['staff_id'], *filter_dates, TENANT_ID))
-            absence['duties'] = [dict(row) for row in cursor.fetchall()]
-
-        cursor.execute("SELECT * FROM substitute_config WHERE tenant_id = ?", (TENANT_ID,))
-        row = cursor.fetchone()
-        config = dict(row) if row else {}
-
-        total_absences = len(absences)
-        total_periods = 0; covered_periods = 0; pending_periods = 0
-        for absence in absences:
-            for req in absence.get('requests', []):
-                total_periods += 1
-                if req.get('substitute_id'): covered_periods += 1
-                else: pending_periods += 1
+    # One batched, shared computation per (tab, data version) - see
+    # app/services/substitute_overview.py.
+    overview = get_overview(tab, filter_start, filter_end, filter_dates)
 
     return render_template('substitute/partials/mission_control_content.html',
-                          absences=absences, config=config,
+                          absences=overview['absences'], config=overview['config'],
                           cycle_day=get_cycle_day(),
                           today_iso=today.isoformat(),
-                          stats={'total': total_periods, 'covered': covered_periods,
-                                 'pending': pending_periods, 'absences': total_absences},
+                          stats=overview['stats'],
                           filter_start=filter_start.strftime('%a %d %b'),
                           filter_end=filter_end.strftime('%a %d %b'))
 
@@ -1511,57 +1462,14 @@ def extend_absence():
     # Re-process absence (idempotent - skips existing days, processes new ones)
     results = process_absence(absence_id)
     
-    # Handle duty clashes for extended dates
-    try:
-        from app.services.substitute_engine import handle_absent_teacher_duties
-        handle_absent_teacher_duties(absence['staff_id'], old_end, new_end_date)
-    except Exception as e:
-        print(f"Extend duty clash error: {e}")
-    
-    # Send push to management about extension
-    try:
-        from app.routes.push import send_absence_reported_push
-        teacher_name = results.get('sick_teacher', {}).get('name', 'A teacher')
-        send_absence_reported_push(
-            teacher_name,
-            'Extended',
-            old_end,
-            new_end_date,
-            results.get('covered_count', 0),
-            results.get('total_count', 0)
-        )
-    except Exception as e:
-        print(f'Extend management push error: {e}')
-
-    # E-03 Phase C: notify the absent teacher (extend = book-out)
-    try:
-        from app.routes.push import send_absence_covered_push
-        _disp = old_end if (not new_end_date or new_end_date == old_end) else f"{old_end} - {new_end_date}"
-        send_absence_covered_push(
-            absence['staff_id'],
-            results.get('covered_count', 0),
-            results.get('total_count', 0),
-            _disp
-        )
-    except Exception as e:
-        print(f'Extend absent teacher push error: {e}')
-    
-    # Send push to newly assigned substitutes
-    try:
-        from app.routes.push import send_substitute_assigned_push
-        for day in results.get('days', []):
-            date_display = day.get('date_display', '')
-            for period in day.get('periods', []):
-                if period.get('substitute_id'):
-                    send_substitute_assigned_push(
-                        period['substitute_id'],
-                        results['sick_teacher']['name'],
-                        period['period_name'],
-                        date_display,
-                        period.get('venue', 'TBC')
-                    )
-    except Exception as e:
-        print(f'Extend sub assigned push error: {e}')
+    # Duty clashes + pushes for the extended dates run on the job queue.
+    _disp = old_end if (not new_end_date or new_end_date == old_end) else f"{old_end} - {new_end_date}"
+    _enqueue_absence_followups(
+        results, absence['staff_id'],
+        duty_range=(old_end, new_end_date),
+        reported=('Extended', old_end, new_end_date),
+        covered_display=_disp,
+        log_prefix='Extend ')
     
     # Redirect based on who extended
     if role in ['principal', 'deputy', 'office', 'admin'] and absence['staff_id'] != staff_id:
@@ -1752,63 +1660,11 @@ def mark_absent_process(absence_id):
         except Exception as e:
             print(f'pointer_before capture error: {e}')
 
-    # Handle duty clashes - reassign duties where absent teacher was assigned
-    try:
-        from app.services.substitute_engine import handle_absent_teacher_duties
-        if duty_staff_id:
-            duty_clash_results = handle_absent_teacher_duties(duty_staff_id, start_date, end_date)
-    except Exception as e:
-        print(f"Management mark-absent duty clash error: {e}")
-
-    # Send push to management (other principals/deputies will see it)
-    try:
-        from app.routes.push import send_absence_reported_push
-        staff_name = results.get('sick_teacher', {}).get('name', 'A teacher')
-        date_range = results.get('date_range', {})
-        send_absence_reported_push(
-            staff_name,
-            results.get('absence_status', ''),
-            date_range.get('start', start_date),
-            date_range.get('end', end_date),
-            results.get('covered_count', 0),
-            results.get('total_count', 0)
-        )
-    except Exception as e:
-        print(f'Management absence reported push error: {e}')
-
-    # E-03 Phase C: notify the absent teacher (book-out)
-    try:
-        from app.routes.push import send_absence_covered_push
-        _dr = results.get('date_range', {})
-        _start = _dr.get('start', start_date)
-        _end = _dr.get('end', end_date)
-        _disp = _start if (not _end or _end == _start) else f"{_start} - {_end}"
-        if duty_staff_id:
-            send_absence_covered_push(
-                duty_staff_id,
-                results.get('covered_count', 0),
-                results.get('total_count', 0),
-                _disp
-            )
-    except Exception as e:
-        print(f'Management absent teacher push error: {e}')
-
-    # Send push to each assigned substitute
-    try:
-        from app.routes.push import send_substitute_assigned_push
-        for day in results.get('days', []):
-            date_display = day.get('date_display', '')
-            for period in day.get('periods', []):
-                if period.get('substitute_id'):
-                    send_substitute_assigned_push(
-                        period['substitute_id'],
-                        results['sick_teacher']['name'],
-                        period['period_name'],
-                        date_display,
-                        period.get('venue', 'TBC')
-                    )
-    except Exception as e:
-        print(f'Management sub assigned push error: {e}')
+    # Side effects run on the job queue (see report_process).
+    _enqueue_absence_followups(
+        results, duty_staff_id,
+        duty_range=(start_date, end_date),
+        log_prefix='Management ')
 
     # REAL elapsed time from the engine's own timestamps.
     elapsed_secs = '0.0'
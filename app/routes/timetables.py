@@ -6,7 +6,7 @@ from datetime import date
 from flask import Blueprint, render_template, session, redirect, request
 from app.services.db import get_connection
 from app.services.nav import get_nav_header, get_nav_styles
-from app.services.substitute_engine import get_cycle_day
+from app.services.substitute_engine import resolve_day
 
 timetables_bp = Blueprint('timetables', __name__, url_prefix='/timetables')
 
@@ -15,30 +15,8 @@ TENANT_ID = "MARAGON"
 
 def _resolve_day(cursor, target_date):
     """Return (cycle_day, day_type, bell_schedule, day_name) for a date.
-    Mirrors the canonical resolution used in duty.my_day."""
-    target_date_str = target_date.isoformat()
-    weekday = target_date.weekday()
-    cursor.execute("""
-        SELECT cycle_day, day_type, bell_schedule, day_name
-        FROM school_calendar
-        WHERE tenant_id = ? AND date = ?
-    """, (TENANT_ID, target_date_str))
-    cal_row = cursor.fetchone()
-    if cal_row:
-        return (cal_row['cycle_day'], cal_row['day_type'],
-                cal_row['bell_schedule'], cal_row['day_name'])
-    cycle_day = get_cycle_day(target_date)
-    day_type = 'academic' if weekday < 5 else 'weekend'
-    if weekday in [0, 2]:
-        bell_schedule = 'type_a'
-    elif weekday in [1, 3]:
-        bell_schedule = 'type_b'
-    elif weekday == 4:
-        bell_schedule = 'type_c'
-    else:
-        bell_schedule = 'none'
-    day_name = f"D{cycle_day}" if cycle_day else None
-    return (cycle_day, day_type, bell_schedule, day_name)
+    Same resolver as duty.my_day (cached; cursor kept for call-site compat)."""
+    return resolve_day(target_date)
 
 
 @timetables_bp.route('/')
@@ -0,0 +1,102 @@
+"""
+Migration 021: data_version change counters for cached reference data.
+
+WHY
+---
+The cycle-day resolver (substitute_engine) keeps an in-memory date index
+built from school_calendar + substitute_config. Those tables are written by
+seed scripts, admin routes and one-off scripts in other processes, so an
+in-process "I wrote it, clear the cache" call cannot see every change.
+
+This migration adds a tiny counter table:
+  data_version(name TEXT PRIMARY KEY, version INTEGER, updated_at TEXT)
+and AFTER INSERT/UPDATE/DELETE triggers on each watched table that bump
+its row. A cache stores the version it was built at and re-checks with one
+primary-key lookup - any writer, any process, invalidates it.
+
+watch_tables() is reusable: a later migration that caches another table
+calls it with that table name instead of hand-writing triggers.
+
+Idempotent: guarded by schema_version = 21; CREATE ... IF NOT EXISTS
+throughout. Counter rows are seeded at 0.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+WATCHED_TABLES = ("school_calendar", "substitute_config")
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def watch_tables(cursor, tables):
+    """Create the data_version table (if needed) and a bump trigger per
+    write event on each table."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    for table in tables:
+        cursor.execute(
+            "INSERT OR IGNORE INTO data_version (name, version) VALUES (?, 0)",
+            (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_data_version_{table}_{ev}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_version
+                    SET version = version + 1, updated_at = datetime('now')
+                    WHERE name = '{table}';
+                END
+            """.format(table=table, ev=event.lower(), event=event))
+        print("Watching {} via data_version".format(table))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 021")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 21")
+    if cursor.fetchone():
+        print("Migration 021 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 021: data_version change counters...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        watch_tables(cursor, WATCHED_TABLES)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (21, 'data_version counters + triggers on school_calendar, substitute_config')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 021 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,92 @@
+"""
+Migration 022: job_queue table for background side effects.
+
+WHY
+---
+substitute.report_process ran duty-clash reassignment and every push
+notification inline, after the allocation had already committed. The
+teacher's result card waited on blocking FCM calls it does not need.
+
+Those side effects are now enqueued (app/services/jobs.py) and run by
+worker threads. The queue lives in SQLite rather than memory so a crash or
+redeploy between "allocation committed" and "push sent" loses nothing - a
+pending row is simply picked up by the next worker to start.
+
+  job_queue
+    status       pending | running | done | dead
+    attempts     incremented on every claim
+    run_after    ISO timestamp; retries are rescheduled with backoff
+    created_at / started_at / finished_at  -> queue + run latency
+    last_error   message from the most recent failed attempt
+
+Idempotent: guarded by schema_version = 22; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 022")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 22")
+    if cursor.fetchone():
+        print("Migration 022 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 022: job_queue...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS job_queue (
+                id TEXT PRIMARY KEY,
+                tenant_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 5,
+                run_after TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                last_error TEXT
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_job_queue_claim
+            ON job_queue(status, run_after)
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (22, 'job_queue for background push + duty-clash work')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 022 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
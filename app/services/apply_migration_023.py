@@ -0,0 +1,70 @@
+"""
+Migration 023: data_version counters on the emergency tables.
+
+WHY
+---
+Every open page polled /emergency/banner (or the active-alert partials)
+every 3-6 seconds to notice an event that happens a few times a term.
+/emergency/stream (SSE) replaces that: send/respond/resolve publish to
+in-process subscribers directly, and streams held by OTHER worker
+processes find out by watching these counters (app/services/events.py).
+
+Reuses watch_tables() from migration 021 - same table, same trigger shape.
+
+Idempotent: guarded by schema_version = 23; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+from app.services.apply_migration_021 import watch_tables
+
+
+WATCHED_TABLES = ("emergency_alert", "emergency_response")
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 023")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 23")
+    if cursor.fetchone():
+        print("Migration 023 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 023: emergency data_version counters...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        watch_tables(cursor, WATCHED_TABLES)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (23, 'data_version triggers on emergency_alert, emergency_response')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 023 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,73 @@
+"""
+Migration 024: data_version counter on user_session.
+
+WHY
+---
+enforce_active_session (app/__init__.py) used to SELECT user_session on
+every request - every HTMX poll included. It now reads capability flags
+from a per-process cache (app/services/auth_cache.py). Revocation must
+stay immediate, so the cache is dropped whenever user_session changes:
+  - writes made through the app call auth_cache.invalidate() directly;
+  - writes from anywhere else (another worker, a flag-seeding migration,
+    a seed script, sqlite3 by hand) bump this counter, which the cache
+    re-checks at most once a second.
+
+Reuses watch_tables() from migration 021.
+
+Idempotent: guarded by schema_version = 24; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+from app.services.apply_migration_021 import watch_tables
+
+
+WATCHED_TABLES = ("user_session",)
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 024")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 24")
+    if cursor.fetchone():
+        print("Migration 024 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 024: user_session data_version counter...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        watch_tables(cursor, WATCHED_TABLES)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (24, 'data_version triggers on user_session (auth cache)')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 024 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,109 @@
+"""
+Migration 025: attendance rollup tables.
+
+WHY
+---
+dashboard.index computed YTD %, per-day %, per-grade % and the chronic
+absentee list by scanning every attendance_entry ever recorded, on every
+page load (~625 learners x ~200 days by year end). These tables hold the
+same numbers pre-aggregated; app/services/attendance_rollup.py keeps them
+current from the attendance write paths.
+
+  attendance_daily_rollup   one row per (tenant, date, mentor group, learner grade)
+  attendance_learner_rollup one row per (tenant, learner)
+
+grade_id is '' rather than NULL for learners without a grade so it can sit
+in the primary key.
+
+Backfilled here with a full rebuild. Idempotent: guarded by
+schema_version = 25; CREATE ... IF NOT EXISTS; the rebuild replaces rows.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 025")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 25")
+    if cursor.fetchone():
+        print("Migration 025 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 025: attendance rollup tables...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_daily_rollup (
+                tenant_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                mentor_group_id TEXT NOT NULL,
+                grade_id TEXT NOT NULL DEFAULT '',
+                present INTEGER NOT NULL DEFAULT 0,
+                absent INTEGER NOT NULL DEFAULT 0,
+                late INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT,
+                PRIMARY KEY (tenant_id, date, mentor_group_id, grade_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_learner_rollup (
+                tenant_id TEXT NOT NULL,
+                learner_id TEXT NOT NULL,
+                present INTEGER NOT NULL DEFAULT 0,
+                absent INTEGER NOT NULL DEFAULT 0,
+                late INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                first_date TEXT,
+                last_date TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (tenant_id, learner_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_learner_rollup_absent
+            ON attendance_learner_rollup(tenant_id, absent)
+        """)
+
+        from app.services.attendance_rollup import rebuild
+        cursor.execute("SELECT DISTINCT tenant_id FROM attendance")
+        for row in cursor.fetchall():
+            daily, learners = rebuild(row['tenant_id'], cursor)
+            print("Backfilled {}: {} daily rows, {} learner rows".format(
+                row['tenant_id'], daily, learners))
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (25, 'attendance_daily_rollup + attendance_learner_rollup')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 025 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,159 @@
+"""
+Migration 026: per-group roll-call change counter.
+
+WHY
+---
+The roll-call page used to re-render the whole learner list every 3 seconds
+on every open device, changed or not. It now asks "anything since version
+N?" and gets either an empty 204 or just the learners whose mark changed
+(attendance.changes).
+
+This migration adds:
+  roll_call_version(mentor_group_id, date, version)
+      one counter per register, bumped by triggers on every mark written
+      to pending_attendance or attendance_entry (and on pending deletes,
+      which is how a submit shows up);
+  pending_attendance.mark_version / attendance_entry.mark_version
+      the counter value at the row's last status change, so a delta is
+      "WHERE mark_version > ?".
+
+roll_call_version is itself watched via data_version (watch_tables from
+migration 021), so the SSE watcher in app/services/events.py can tell open
+roll-call streams in other processes that something moved.
+
+Idempotent: guarded by schema_version = 26; CREATE ... IF NOT EXISTS and a
+PRAGMA table_info check before each ALTER. Existing rows keep
+mark_version 0.
+"""
+
+import sqlite3
+from pathlib import Path
+
+from app.services.apply_migration_021 import watch_tables
+
+
+# No OR IGNORE here: an outer INSERT OR REPLACE (mark_learner_sqlite) would
+# override it inside the trigger and reset the counter.
+BUMP_SQL = """
+    INSERT INTO roll_call_version (mentor_group_id, date, version)
+    SELECT {group}, {date}, 0
+    WHERE NOT EXISTS (SELECT 1 FROM roll_call_version
+                      WHERE mentor_group_id = {group} AND date = {date});
+    UPDATE roll_call_version
+    SET version = version + 1, updated_at = datetime('now')
+    WHERE mentor_group_id = {group} AND date = {date};
+"""
+
+PENDING_STAMP_SQL = """
+    UPDATE pending_attendance
+    SET mark_version = (SELECT version FROM roll_call_version
+                        WHERE mentor_group_id = NEW.mentor_group_id AND date = NEW.date)
+    WHERE mentor_group_id = NEW.mentor_group_id AND learner_id = NEW.learner_id
+      AND date = NEW.date;
+"""
+
+ENTRY_GROUP = "(SELECT mentor_group_id FROM attendance WHERE id = NEW.attendance_id)"
+ENTRY_DATE = "(SELECT date FROM attendance WHERE id = NEW.attendance_id)"
+
+ENTRY_STAMP_SQL = """
+    UPDATE attendance_entry
+    SET mark_version = (SELECT version FROM roll_call_version
+                        WHERE mentor_group_id = {group} AND date = {date})
+    WHERE id = NEW.id;
+""".format(group=ENTRY_GROUP, date=ENTRY_DATE)
+
+TRIGGERS = {
+    "trg_roll_call_pending_insert":
+        "AFTER INSERT ON pending_attendance",
+    "trg_roll_call_pending_update":
+        "AFTER UPDATE OF status ON pending_attendance",
+    "trg_roll_call_pending_delete":
+        "AFTER DELETE ON pending_attendance",
+    "trg_roll_call_entry_insert":
+        "AFTER INSERT ON attendance_entry",
+    "trg_roll_call_entry_update":
+        "AFTER UPDATE OF status ON attendance_entry",
+}
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def _trigger_body(name):
+    if name == "trg_roll_call_pending_delete":
+        return BUMP_SQL.format(group="OLD.mentor_group_id", date="OLD.date")
+    if name.startswith("trg_roll_call_pending"):
+        return BUMP_SQL.format(group="NEW.mentor_group_id", date="NEW.date") + PENDING_STAMP_SQL
+    return BUMP_SQL.format(group=ENTRY_GROUP, date=ENTRY_DATE) + ENTRY_STAMP_SQL
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 026")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 26")
+    if cursor.fetchone():
+        print("Migration 026 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 026: roll-call change counter...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS roll_call_version (
+                mentor_group_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+                PRIMARY KEY (mentor_group_id, date)
+            )
+        """)
+
+        for table in ("pending_attendance", "attendance_entry"):
+            cursor.execute("PRAGMA table_info({})".format(table))
+            existing_cols = [row["name"] for row in cursor.fetchall()]
+            if "mark_version" not in existing_cols:
+                cursor.execute(
+                    "ALTER TABLE {} ADD COLUMN mark_version INTEGER NOT NULL DEFAULT 0".format(table))
+                print("Added column {}.mark_version".format(table))
+
+        for name, when in TRIGGERS.items():
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS {name}
+                {when}
+                BEGIN
+                    {body}
+                END
+            """.format(name=name, when=when, body=_trigger_body(name)))
+
+        watch_tables(cursor, ("roll_call_version",))
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (26, 'roll_call_version counter + mark_version on pending_attendance, attendance_entry')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 026 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,72 @@
+"""
+Migration 027: data_version counters on the timetable tables.
+
+WHY
+---
+The substitute engine, decline reassignment, terrain eligibility and the
+emergency smart-location lookup now read an in-memory TimetableIndex
+(app/services/timetable_index.py) instead of re-querying the timetable on
+every call. The index is built from staff, staff_venue, venue, period and
+timetable_slot; these counters tell every process when any of them has
+changed (timetable upload, Notion sync, seed script, manual SQL) so the
+index is rebuilt on next use.
+
+Reuses watch_tables() from migration 021.
+
+Idempotent: guarded by schema_version = 27; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+from app.services.apply_migration_021 import watch_tables
+
+
+WATCHED_TABLES = ("timetable_slot", "staff_venue", "venue", "period", "staff")
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 027")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 27")
+    if cursor.fetchone():
+        print("Migration 027 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 027: timetable data_version counters...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        watch_tables(cursor, WATCHED_TABLES)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (27, 'data_version triggers on timetable tables (timetable index)')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 027 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
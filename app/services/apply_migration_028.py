@@ -0,0 +1,152 @@
+"""
+Migration 028: per-day substitute cover counts (burden ledger).
+
+WHY
+---
+get_burden_ratios (Addendum v161a) ranks substitutes by covers in the
+trailing 28 days / free periods per cycle. The numerator was a GROUP BY over
+every substitute_request in the window, run once per period allocated and
+once per decline.
+
+This migration adds:
+  burden_cover_daily(tenant_id, request_date, substitute_id, covers)
+      Assigned/Confirmed requests per substitute per day;
+and triggers on substitute_request that keep it in step with every write
+that can move a cover - assign, decline, cancel, early return, reassign,
+delete - wherever it happens (engine, routes, scripts). The window sum is
+then at most one row per substitute per day (app/services/burden_ledger.py).
+
+Caveat: INSERT OR REPLACE on substitute_request removes the old row without
+firing the delete trigger (recursive_triggers is off). Nothing in the app
+does that; after such a script, run
+    python3 -m app.services.burden_ledger --rebuild
+
+substitute_request's own columns are untouched. Existing rows are
+backfilled from substitute_request.
+
+Idempotent: guarded by schema_version = 28; CREATE ... IF NOT EXISTS and the
+backfill replaces the table's contents.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+COVER_STATUSES = "('Assigned', 'Confirmed')"
+
+# No OR IGNORE / upsert: an outer OR REPLACE would override it inside the
+# trigger (see migration 026).
+ADD_SQL = """
+    INSERT INTO burden_cover_daily (tenant_id, request_date, substitute_id, covers)
+    SELECT NEW.tenant_id, NEW.request_date, NEW.substitute_id, 0
+    WHERE NEW.status IN {statuses}
+      AND NEW.substitute_id IS NOT NULL AND NEW.request_date IS NOT NULL
+      AND NEW.tenant_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM burden_cover_daily
+                      WHERE tenant_id = NEW.tenant_id AND request_date = NEW.request_date
+                        AND substitute_id = NEW.substitute_id);
+    UPDATE burden_cover_daily SET covers = covers + 1
+    WHERE NEW.status IN {statuses}
+      AND tenant_id = NEW.tenant_id AND request_date = NEW.request_date
+      AND substitute_id = NEW.substitute_id;
+""".format(statuses=COVER_STATUSES)
+
+REMOVE_SQL = """
+    UPDATE burden_cover_daily SET covers = covers - 1
+    WHERE OLD.status IN {statuses}
+      AND tenant_id = OLD.tenant_id AND request_date = OLD.request_date
+      AND substitute_id = OLD.substitute_id;
+    DELETE FROM burden_cover_daily
+    WHERE covers <= 0
+      AND tenant_id = OLD.tenant_id AND request_date = OLD.request_date
+      AND substitute_id = OLD.substitute_id;
+""".format(statuses=COVER_STATUSES)
+
+TRIGGERS = {
+    "trg_burden_cover_insert": (
+        "AFTER INSERT ON substitute_request", ADD_SQL),
+    "trg_burden_cover_update": (
+        "AFTER UPDATE OF status, substitute_id, request_date, tenant_id ON substitute_request",
+        REMOVE_SQL + ADD_SQL),
+    "trg_burden_cover_delete": (
+        "AFTER DELETE ON substitute_request", REMOVE_SQL),
+}
+
+BACKFILL_SQL = """
+    INSERT INTO burden_cover_daily (tenant_id, request_date, substitute_id, covers)
+    SELECT tenant_id, request_date, substitute_id, COUNT(*)
+    FROM substitute_request
+    WHERE status IN {statuses}
+      AND substitute_id IS NOT NULL AND request_date IS NOT NULL
+      AND tenant_id IS NOT NULL
+    GROUP BY tenant_id, request_date, substitute_id
+""".format(statuses=COVER_STATUSES)
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 028")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 28")
+    if cursor.fetchone():
+        print("Migration 028 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 028: burden_cover_daily ledger...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS burden_cover_daily (
+                tenant_id TEXT NOT NULL,
+                request_date TEXT NOT NULL,
+                substitute_id TEXT NOT NULL,
+                covers INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (tenant_id, request_date, substitute_id)
+            )
+        """)
+
+        for name, (when, body) in TRIGGERS.items():
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS {name}
+                {when}
+                BEGIN
+                    {body}
+                END
+            """.format(name=name, when=when, body=body))
+
+        cursor.execute("DELETE FROM burden_cover_daily")
+        cursor.execute(BACKFILL_SQL)
+        print("Backfilled {} burden_cover_daily rows".format(cursor.rowcount))
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (28, 'burden_cover_daily + triggers on substitute_request (burden ledger)')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 028 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
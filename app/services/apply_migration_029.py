@@ -0,0 +1,75 @@
+"""
+Migration 029: data_version counters for the Substitute Overview.
+
+WHY
+---
+Mission control polls /substitute/overview-partial every 5 seconds from
+every open management screen. The partial's data (absences, their
+substitute requests and duty replacements) is now built once per
+(tab, data version) and shared by all viewers
+(app/services/substitute_overview.py). It is read from absence,
+substitute_request, duty_roster, mentor_group and terrain_area plus staff,
+period, school_calendar and substitute_config, which are already watched
+(migrations 021, 027). These counters cover the rest, so any write from any
+process invalidates the shared result.
+
+Reuses watch_tables() from migration 021.
+
+Idempotent: guarded by schema_version = 29; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+from app.services.apply_migration_021 import watch_tables
+
+
+WATCHED_TABLES = ("absence", "substitute_request", "duty_roster", "mentor_group",
+                  "terrain_area")
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 029")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 29")
+    if cursor.fetchone():
+        print("Migration 029 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 029: overview data_version counters...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        watch_tables(cursor, WATCHED_TABLES)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (29, 'data_version triggers on absence, substitute_request, duty_roster, mentor_group, terrain_area (overview cache)')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 029 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,71 @@
+"""
+Migration 030: data_version counters for the enrolment index.
+
+WHY
+---
+My Day's who's-out-by-period view and the class register now answer from
+app/services/enrolment_index.py: class+subject enrolment held in memory,
+plus each date's attendance marks. These counters tell every process when
+learner_subject / learner (enrolment) or attendance / attendance_entry
+(roll-call submits, marks on a submitted register) change, so each piece
+is rebuilt on next use.
+
+Reuses watch_tables() from migration 021.
+
+Idempotent: guarded by schema_version = 30; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+from app.services.apply_migration_021 import watch_tables
+
+
+WATCHED_TABLES = ("learner_subject", "learner", "attendance", "attendance_entry")
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 030")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 30")
+    if cursor.fetchone():
+        print("Migration 030 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 030: enrolment index data_version counters...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        watch_tables(cursor, WATCHED_TABLES)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (30, 'data_version triggers on learner_subject, learner, attendance, attendance_entry (enrolment index)')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 030 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,84 @@
+"""
+Migration 032: sync_watermark table for incremental Notion sync.
+
+WHY
+---
+sync.py pulled every row of the grade, mentor group, staff and learner
+databases on every run, although only a handful of pages change between
+runs. It now asks Notion only for pages edited since the last successful
+run of each database, and records that point here.
+
+  sync_watermark
+    source            grades | mentor_groups | staff | learners
+    database_id       the Notion database the watermark belongs to; a
+                      different id (env changed) means a full pull
+    last_edited_time  newest last_edited_time seen on a successful pull
+    synced_at         when that pull finished
+    pages             pages fetched by that pull
+
+A watermark only moves after its rows are committed, so a failed fetch or
+write is simply re-pulled next time. `python3 -m app.services.sync --full`
+ignores the watermarks.
+
+Idempotent: guarded by schema_version = 32; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 032")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 32")
+    if cursor.fetchone():
+        print("Migration 032 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 032: sync_watermark...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_watermark (
+                tenant_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                database_id TEXT NOT NULL,
+                last_edited_time TEXT,
+                synced_at TEXT NOT NULL,
+                pages INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (tenant_id, source)
+            )
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (32, 'sync_watermark for incremental Notion sync')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 032 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
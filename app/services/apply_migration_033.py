@@ -0,0 +1,87 @@
+"""
+Migration 033: schedule_source extraction status (background extraction).
+
+WHY
+---
+schedules.upload ran the vision extraction (extract.extract_rows, one
+blocking call with a 90 s timeout) inline, pinning a gunicorn worker while
+the author watched a spinning form. The upload now stores the draft,
+enqueues a 'schedule.extract' job keyed by schedule_source.id and
+redirects straight to the review screen, which polls until the job is done.
+
+Adds to schedule_source (all nullable - a NULL extract_status means no
+extraction was attempted, which is every existing row and every programme
+without a prompt):
+  extract_status       queued | running | done | failed
+  extract_error        fail-closed reason from extract_rows / _parse_rows
+  extract_started_at   UTC ISO, set when a worker picks the job up
+  extract_finished_at  UTC ISO, set on done / failed
+
+Idempotent: guarded by schema_version = 33 and a PRAGMA column check per
+column.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+COLUMNS = (
+    ("extract_status", "TEXT"),
+    ("extract_error", "TEXT"),
+    ("extract_started_at", "TEXT"),
+    ("extract_finished_at", "TEXT"),
+)
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 033")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 33")
+    if cursor.fetchone():
+        print("Migration 033 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 033: schedule_source extraction status...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        cursor.execute("PRAGMA table_info(schedule_source)")
+        existing_cols = [row["name"] for row in cursor.fetchall()]
+        for name, col_type in COLUMNS:
+            if name not in existing_cols:
+                cursor.execute(
+                    "ALTER TABLE schedule_source ADD COLUMN {} {}".format(name, col_type))
+                print("Added column schedule_source.{}".format(name))
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (33, 'schedule_source.extract_status for background extraction')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 033 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,96 @@
+"""
+Migration 034: extract_cache table (memoized vision extraction results).
+
+WHY
+---
+extract.extract_rows sends the whole file to the model on every upload. The
+same Assessment Timetable PDF is routinely uploaded more than once (title
+corrected, draft deleted and redone, re-posted under another programme), and
+each repeat paid the full model latency. A TSV that already passed
+_parse_rows is now kept here and reused when the same bytes come back.
+
+  extract_cache
+    sha256          hex digest of the uploaded file bytes
+    programme_slug  selects the prompt shape
+    prompt_version  short hash of the prompt text and page splitting
+                    (extract.prompt_version), so editing either misses
+                    instead of serving old output
+    model           EXTRACT_MODEL at extraction time
+    tsv             the parsed rows re-serialised as TSV, merged across page
+                    ranges (schedules._merge_extractions) - not the model's
+                    verbatim response
+    bytes           len(tsv), for the size cap
+    created_at / last_hit_at / hits
+
+Eviction (extract_cache.evict) drops entries older than MAX_AGE_DAYS and then
+the least recently used ones beyond MAX_ENTRIES / MAX_BYTES.
+
+Idempotent: guarded by schema_version = 34; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 034")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 34")
+    if cursor.fetchone():
+        print("Migration 034 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 034: extract_cache...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS extract_cache (
+                sha256 TEXT NOT NULL,
+                programme_slug TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                model TEXT NOT NULL,
+                tsv TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                last_hit_at TEXT,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (sha256, programme_slug, prompt_version, model)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_extract_cache_used
+            ON extract_cache(COALESCE(last_hit_at, created_at))
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (34, 'extract_cache for memoized schedule extraction')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 034 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
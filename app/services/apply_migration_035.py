@@ -0,0 +1,83 @@
+"""
+Migration 035: upload_blob table (content-addressed upload store).
+
+WHY
+---
+Notice posters/PDFs and schedule originals were written under a fresh UUID
+name on every upload, so the same file posted twice was stored twice. They
+are now written once as <sha256>.<ext> (app/services/upload_store.py) and
+this table counts the rows that point at each file.
+
+  upload_blob
+    area        notice_img | notice_doc | schedule_img | schedule_doc - the
+                directory the file lives in (paths stay out of the DB)
+    file_name   bare <sha256>.<ext>, as stored on the notice/source row
+    sha256      content hash
+    bytes       file size
+    ref_count   rows referencing the file; the file is removed at zero
+    created_at  first upload
+
+Existing UUID-named files are not listed and keep being served as before.
+
+Idempotent: guarded by schema_version = 35; CREATE ... IF NOT EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 035")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 35")
+    if cursor.fetchone():
+        print("Migration 035 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 035: upload_blob...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS upload_blob (
+                area TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (area, file_name)
+            )
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (35, 'upload_blob for the content-addressed upload store')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 035 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,109 @@
+"""
+Migration 036: drop indexes the composite ones made redundant.
+
+WHY
+---
+Migration 031 added composites without removing what they supersede, so
+every INSERT/UPDATE on these tables kept maintaining both. A non-unique
+index whose columns are a prefix of another index on the same table serves
+no lookup the longer one cannot (query_plan_audit.redundant_indexes):
+
+  idx_entry_attendance         attendance_entry(attendance_id)
+  idx_attendance_mentor_group  attendance(mentor_group_id)
+  idx_attendance_tenant_date   attendance(tenant_id, date)
+  idx_subreq_absence           substitute_request(absence_id)
+  idx_subreq_date              substitute_request(request_date)
+  idx_absence_date             absence(absence_date)
+  idx_learner_subject_subject  learner_subject(subject)
+  idx_learner_subject_tenant   learner_subject(tenant_id)
+  idx_learner_tenant           learner(tenant_id)
+  idx_learner_mentor_group     learner(mentor_group_id)
+  idx_timetable_tenant         timetable_slot(tenant_id)
+  idx_pending_mentor_group     pending_attendance(mentor_group_id)  (its PK
+                               starts with mentor_group_id; written per mark)
+  idx_period_tenant            period(tenant_id)
+  idx_terrain_area_tenant      terrain_area(tenant_id)
+  idx_house_tenant             house(tenant_id)  (ux_house_name is
+                               (tenant_id, name))
+
+On the inflated audit copy the hot queries are unchanged, the statement
+flags are unchanged (73), and substitute_request goes from 6 to 4
+secondary indexes per write.
+
+schema.sql (re-applied by sync_all) and seed_substitute_data no longer
+create the dropped indexes.
+
+Idempotent: guarded by schema_version = 36; DROP INDEX IF EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+DROP_INDEXES = [
+    'idx_entry_attendance',
+    'idx_attendance_mentor_group',
+    'idx_attendance_tenant_date',
+    'idx_subreq_absence',
+    'idx_subreq_date',
+    'idx_absence_date',
+    'idx_learner_subject_subject',
+    'idx_learner_subject_tenant',
+    'idx_learner_tenant',
+    'idx_learner_mentor_group',
+    'idx_timetable_tenant',
+    'idx_pending_mentor_group',
+    'idx_period_tenant',
+    'idx_terrain_area_tenant',
+    'idx_house_tenant',
+]
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration 036")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = 36")
+    if cursor.fetchone():
+        print("Migration 036 already applied")
+        conn.close()
+        return
+
+    print("Applying migration 036: drop redundant indexes...")
+
+    try:
+        cursor.execute("BEGIN")
+
+        for name in DROP_INDEXES:
+            cursor.execute("DROP INDEX IF EXISTS {}".format(name))
+            print("Dropped index {}".format(name))
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES (36, 'drop prefix-redundant and duplicate indexes')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration 036 complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
@@ -0,0 +1,174 @@
+"""
+Attendance rollups - precomputed counts for the management dashboards.
+
+Two summary tables (migration 025) replace full-history scans of
+attendance_entry JOIN attendance:
+
+  attendance_daily_rollup   (tenant_id, date, mentor_group_id, grade_id)
+                            -> present/absent/late/total. grade_id is the
+                            learner's grade ('' if none); mentor_group_id the
+                            register's group, so per-grade views can use either.
+                            Serves YTD %, per-day %, per-grade %, today's counts.
+  attendance_learner_rollup (tenant_id, learner_id)     -> present/absent/late/total
+                            Serves the chronic-absentee lists.
+
+Maintenance is "recompute what was touched": after a register is
+submitted, edited or overridden, refresh_attendance() re-aggregates the
+affected dates (~one day of entries) and learners (~one class, ~200 rows
+each). Recomputing instead of applying +1/-1 deltas means a rollup row can
+never drift from the entries it summarises.
+
+seed_maragon_data.seed_all and seed_attendance_demo rebuild at the end.
+Other writers that bypass the app (seed_attendance.py, manual SQL) should be
+followed by a rebuild (Render Shell, from ~/project/src):
+    python3 -m app.services.attendance_rollup
+"""
+import time
+
+from app.services.db import get_connection, now_iso
+
+TENANT_ID = "MARAGON"
+
+_COUNTS_SQL = """
+    SUM(CASE WHEN ae.status = 'Present' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN ae.status = 'Absent' THEN 1 ELSE 0 END),
+    SUM(CASE WHEN ae.status = 'Late' THEN 1 ELSE 0 END),
+    COUNT(*)
+"""
+
+
+def _in_clause(values):
+    return ",".join("?" * len(values))
+
+
+def _refresh_dates(cursor, tenant_id, dates=None):
+    """Re-aggregate daily rows for `dates` (all dates if None)."""
+    date_filter = ""
+    params = [tenant_id]
+    if dates is not None:
+        date_filter = " AND date IN ({})".format(_in_clause(dates))
+        params += list(dates)
+    cursor.execute(
+        "DELETE FROM attendance_daily_rollup WHERE tenant_id = ?" + date_filter,
+        params)
+    cursor.execute("""
+        INSERT INTO attendance_daily_rollup
+            (tenant_id, date, mentor_group_id, grade_id,
+             present, absent, late, total, updated_at)
+        SELECT a.tenant_id, a.date, a.mentor_group_id, COALESCE(l.grade_id, ''), {counts}, ?
+        FROM attendance a
+        JOIN attendance_entry ae ON ae.attendance_id = a.id
+        LEFT JOIN learner l ON l.id = ae.learner_id
+        WHERE a.tenant_id = ?{date_filter}
+        GROUP BY a.tenant_id, a.date, a.mentor_group_id, COALESCE(l.grade_id, '')
+    """.format(counts=_COUNTS_SQL, date_filter=date_filter.replace("date", "a.date")),
+        [now_iso()] + params)
+
+
+def _refresh_learners(cursor, tenant_id, learner_ids=None):
+    """Re-aggregate per-learner totals for `learner_ids` (all if None)."""
+    learner_filter = ""
+    params = [tenant_id]
+    if learner_ids is not None:
+        learner_filter = " AND learner_id IN ({})".format(_in_clause(learner_ids))
+        params += list(learner_ids)
+    cursor.execute(
+        "DELETE FROM attendance_learner_rollup WHERE tenant_id = ?" + learner_filter,
+        params)
+    cursor.execute("""
+        INSERT INTO attendance_learner_rollup
+            (tenant_id, learner_id, present, absent, late, total,
+             first_date, last_date, updated_at)
+        SELECT a.tenant_id, ae.learner_id, {counts}, MIN(a.date), MAX(a.date), ?
+        FROM attendance_entry ae
+        JOIN attendance a ON a.id = ae.attendance_id
+        WHERE a.tenant_id = ?{learner_filter}
+        GROUP BY a.tenant_id, ae.learner_id
+    """.format(counts=_COUNTS_SQL,
+               learner_filter=learner_filter.replace("learner_id", "ae.learner_id")),
+        [now_iso()] + params)
+
+
+def _refresh_touched(cursor, attendance_ids, tenant_id):
+    cursor.execute(
+        "SELECT DISTINCT date FROM attendance WHERE id IN ({})".format(
+            _in_clause(attendance_ids)),
+        attendance_ids)
+    dates = [r['date'] for r in cursor.fetchall()]
+    cursor.execute(
+        "SELECT DISTINCT learner_id FROM attendance_entry WHERE attendance_id IN ({})".format(
+            _in_clause(attendance_ids)),
+        attendance_ids)
+    learner_ids = [r['learner_id'] for r in cursor.fetchall()]
+    if dates:
+        _refresh_dates(cursor, tenant_id, dates)
+    if learner_ids:
+        _refresh_learners(cursor, tenant_id, learner_ids)
+
+
+def refresh_attendance(attendance_ids, tenant_id=TENANT_ID):
+    """Bring both rollups up to date after entries on these registers
+    were written. Never raises - a failed refresh is logged and repaired
+    by the next refresh of the same date/learners or a rebuild."""
+    attendance_ids = [a for a in attendance_ids if a]
+    if not attendance_ids:
+        return
+    try:
+        with get_connection() as conn:
+            _refresh_touched(conn.cursor(), attendance_ids, tenant_id)
+            conn.commit()
+    except Exception as e:
+        print(f"Attendance rollup refresh error: {e}")
+
+
+def refresh_attendance_in(cursor, attendance_ids, tenant_id=TENANT_ID):
+    """refresh_attendance() inside the caller's open transaction, so the
+    rollups commit with the entries. Runs under a savepoint: a failure is
+    logged and undone without aborting the caller's writes."""
+    attendance_ids = [a for a in attendance_ids if a]
+    if not attendance_ids:
+        return
+    cursor.execute("SAVEPOINT attendance_rollup")
+    try:
+        _refresh_touched(cursor, attendance_ids, tenant_id)
+    except Exception as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT attendance_rollup")
+        print(f"Attendance rollup refresh error: {e}")
+    cursor.execute("RELEASE SAVEPOINT attendance_rollup")
+
+
+def refresh_for_entry(entry_id, tenant_id=TENANT_ID):
+    """refresh_attendance() for the register an entry belongs to."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT attendance_id FROM attendance_entry WHERE id = ?",
+            (entry_id,)).fetchone()
+    if row:
+        refresh_attendance([row['attendance_id']], tenant_id)
+
+
+def rebuild(tenant_id=TENANT_ID, cursor=None):
+    """Recompute both rollups from scratch. Returns (daily_rows, learner_rows)."""
+    if cursor is not None:
+        _refresh_dates(cursor, tenant_id)
+        _refresh_learners(cursor, tenant_id)
+        cursor.execute("SELECT COUNT(*) FROM attendance_daily_rollup WHERE tenant_id = ?", (tenant_id,))
+        daily = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM attendance_learner_rollup WHERE tenant_id = ?", (tenant_id,))
+        learners = cursor.fetchone()[0]
+        return daily, learners
+    with get_connection() as conn:
+        result = rebuild(tenant_id, conn.cursor())
+        conn.commit()
+    return result
+
+
+def main():
+    started = time.monotonic()
+    daily, learners = rebuild()
+    print(f"Attendance rollups rebuilt: {daily} daily rows, {learners} learner rows "
+          f"in {time.monotonic() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Per-process cache of user_session capability flags.
+
+enforce_active_session needs two facts on every request: is this staff
+member still active, and what are their live capability flags. Both come
+from user_session, which changes a few times a term. This cache answers
+from memory and keeps revocation immediate:
+
+  - invalidate(staff_id) is called by every in-app write to user_session
+    (toggle_access, session seeding), so this process sees it at once;
+  - the user_session data_version counter (migration 024) is re-read at
+    most once per VERSION_CHECK_SECONDS; any change from any process or
+    script drops the whole cache;
+  - entries also expire after TTL_SECONDS as a backstop.
+
+Without the counter table (pre-024 database) nothing is cached.
+"""
+
+import threading
+import time
+
+from app.services.db import get_connection, get_data_versions
+
+TENANT_ID = "MARAGON"
+
+TTL_SECONDS = 30
+VERSION_CHECK_SECONDS = 1.0
+
+FLAG_COLUMNS = ('can_resolve', 'can_post_notice', 'can_post_schedule',
+                'can_share_learner_notice')
+
+_lock = threading.Lock()
+_entries = {}           # staff_id -> (flags dict or None if inactive, expires_at)
+_state = {'version': None, 'checked_at': 0.0}
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'version_checks': 0}
+
+
+def _sync_version(conn, now):
+    """Drop everything if user_session changed since the last check.
+    Returns False if the counter is unavailable (caching disabled)."""
+    if now - _state['checked_at'] < VERSION_CHECK_SECONDS and _state['version'] is not None:
+        return True
+    versions = get_data_versions(conn, ('user_session',))
+    _stats['version_checks'] += 1
+    with _lock:
+        if versions != _state['version']:
+            _entries.clear()
+            _state['version'] = versions
+        _state['checked_at'] = now
+    return versions is not None
+
+
+def get_capabilities(staff_id):
+    """
+    Live capability flags for an active staff member, or None if they have
+    no active user_session row (revoked / removed).
+    """
+    now = time.monotonic()
+    with get_connection() as conn:
+        cacheable = _sync_version(conn, now)
+        if cacheable:
+            entry = _entries.get(staff_id)
+            if entry is not None and entry[1] > now:
+                _stats['hits'] += 1
+                return entry[0]
+
+        _stats['misses'] += 1
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT {} FROM user_session WHERE staff_id = ? AND tenant_id = ? "
+            "AND is_active = 1 LIMIT 1".format(", ".join(FLAG_COLUMNS)),
+            (staff_id, TENANT_ID)
+        )
+        row = cursor.fetchone()
+
+    flags = {col: bool(row[col]) for col in FLAG_COLUMNS} if row else None
+    if cacheable:
+        with _lock:
+            _entries[staff_id] = (flags, now + TTL_SECONDS)
+    return flags
+
+
+def invalidate(staff_id=None):
+    """Forget one staff member's flags, or everyone's (staff_id=None).
+    Call after committing any write to user_session."""
+    with _lock:
+        if staff_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(staff_id, None)
+    _stats['invalidations'] += 1
+
+
+def stats():
+    hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else 0.0,
+        'entries': len(_entries),
+        'invalidations': _stats['invalidations'],
+        'version_checks': _stats['version_checks'],
+        'ttl_seconds': TTL_SECONDS,
+    }
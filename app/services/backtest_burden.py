@@ -2,27 +2,40 @@
 Burden-ratio backtest (Addendum v161a acceptance criterion 1). READ-ONLY.
 
 Replays historical Assigned/Confirmed substitute_request rows in chronological
-order through the REAL engine pool builder (get_free_teachers_for_period),
-selecting by burden ratio (covered-in-window / free-per-cycle, tie-break
-first name A-Z, Pass 1 before Pass 2) at 21 / 28 / 42 day windows.
+order through the engine's pool rules (Pass 1 / Pass 2 from the timetable
+index, absences, already-picked-today), selecting by burden ratio
+(covered-in-window / free-per-cycle, tie-break first name A-Z, Pass 1 before
+Pass 2) for each window in a sweep.
+
+Everything window-independent is built ONCE (load_inputs): the timetable
+index, every absence, cycle days, and per-request base pools as tuples of
+staff positions. A window run is then pure Python over arrays: each
+substitute's simulated cover days are an ascending array of day ordinals,
+so "covers in (d - w, d]" is len - bisect (a prefix count), not a rescan.
+Windows run in parallel across a process pool.
 
 Run in Render Shell from ~/project/src:
     python3 -m app.services.backtest_burden
+    python3 -m app.services.backtest_burden --windows 7-90:7 --workers 4
 
 No writes. Safe to run repeatedly. Delete after acceptance if desired.
 """
 import os
 os.environ.setdefault('DATABASE_PATH', '/var/data/schoolops.db')
 
+import time
+from array import array
+from bisect import bisect_right
 from collections import defaultdict
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
 
 from app.services.db import get_connection
-from app.services.substitute_engine import (
-    get_free_teachers_for_period, get_cycle_day, TENANT_ID,
-)
+from app.services.substitute_engine import get_cycle_day, TENANT_ID
+from app.services import timetable_index
 
 WINDOWS = [21, 28, 42]
+BASE_WINDOW = 28  # sensitivity is reported against this window
 
 
 def derive_slots_per_cycle(conn):
@@ -72,74 +85,165 @@ def load_history(conn):
     return [dict(r) for r in cur.fetchall()]
 
 
-def rank_pick(pool, sim_dates, free, window_days, on_date):
-    """Lowest (covered_in_window / free) wins; tie-break first_name A-Z.
-    free == 0 ranks last (inf). Pool is one pass only."""
-    best, best_key = None, None
-    lo = on_date - timedelta(days=window_days)
-    for t in pool:
-        f = free.get(t['id'], 0)  # unknown teacher -> ranks last (inf)
-        covered = sum(1 for d in sim_dates[t['id']] if lo < d <= on_date)
-        ratio = covered / f if f > 0 else float('inf')
-        key = (ratio, (t['first_name'] or '').upper())
-        if best_key is None or key < best_key:
-            best, best_key = t, key
-    return best
-
-
-def simulate(history, free, window_days):
-    sim_dates = defaultdict(list)   # staff_id -> [date, ...] of simulated covers
-    assigned_on = defaultdict(set)  # date_str -> staff_ids picked that day
-    picks = defaultdict(int)
-    pick_seq = []
-    unfilled = mentor_rows = 0
-    cd_cache = {}
+def load_absences(conn):
+    """(staff_id, start, end) for every live absence, read once."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT staff_id, absence_date, COALESCE(end_date, absence_date) AS end_date
+        FROM absence
+        WHERE status IN ('Reported', 'Covered', 'Partial')
+    """)
+    return [(r['staff_id'], r['absence_date'], r['end_date']) for r in cur.fetchall()]
+
 
+def load_inputs(conn, free, history):
+    """
+    Window-independent replay inputs. Staff are numbered (position in
+    `staff`); each request becomes
+      (None, day, pos)                 mentor-register cover (counted only)
+      (date_str, day, pass1, pass2)    period cover with base pools
+    where day is a date ordinal and the pools are position tuples in the
+    engine's first-name order BEFORE excluding same-day picks. Exclusion
+    only removes members (it never moves anyone between passes), so a
+    window run can apply it later.
+    """
+    index = timetable_index.get_index(conn)
+    absences = load_absences(conn)
+
+    staff, pos = [], {}
+
+    def position(staff_id):
+        p = pos.get(staff_id)
+        if p is None:
+            p = pos[staff_id] = len(staff)
+            staff.append(staff_id)
+        return p
+
+    for _bit, row in index.substitutes:
+        position(row['id'])
+    names = {row['id']: (row['first_name'] or '').upper()
+             for _bit, row in index.substitutes}
+
+    absent_masks, cycle_days, pools = {}, {}, {}
+    requests = []
     for req in history:
         dstr = req['request_date']
-        d = datetime.strptime(dstr, '%Y-%m-%d').date()
-
+        day = date.fromisoformat(dstr).toordinal()
         if req['period_id'] is None:
+            requests.append((None, day, position(req['substitute_id'])))
+            continue
+        if dstr not in absent_masks:
+            absent_masks[dstr] = index.mask_of(
+                {sid for sid, start, end in absences if start <= dstr <= end})
+            cycle_days[dstr] = get_cycle_day(dstr)
+        key = (dstr, req['period_id'])
+        if key not in pools:
+            p1, p2 = index.free_pools(cycle_days[dstr], req['period_id'],
+                                      absent_mask=absent_masks[dstr])
+            pools[key] = (tuple(position(t['id']) for t in p1),
+                          tuple(position(t['id']) for t in p2))
+        requests.append((dstr, day) + pools[key])
+
+    free_by_pos = [free.get(sid, 0) for sid in staff]  # unknown -> ranks last
+    name_by_pos = [names.get(sid, '') for sid in staff]
+    return {'staff': staff, 'free': free_by_pos, 'names': name_by_pos,
+            'requests': requests}
+
+
+_INPUTS = None
+
+
+def _init_worker(inputs):
+    global _INPUTS
+    _INPUTS = inputs
+
+
+def simulate(inputs, window_days):
+    """
+    One replay at one window. Returns (picks, pick_seq, unfilled,
+    mentor_rows, ms): picks counts and pick_seq per request by staff
+    position (-1 no pool, -2 mentor row).
+    """
+    started = time.perf_counter()
+    free, names = inputs['free'], inputs['names']
+    n = len(inputs['staff'])
+    covers = [array('i') for _ in range(n)]  # ascending cover days per staff
+    picks = [0] * n
+    pick_seq = array('i')
+    assigned_on = defaultdict(set)
+    unfilled = mentor_rows = 0
+    inf = float('inf')
+
+    for req in inputs['requests']:
+        dstr, day = req[0], req[1]
+        if dstr is None:
             # Mentor-register cover: selection not pointer/ratio driven
-            # (backup/head mechanism). Burden still counts in the window.
+            # (backup/head mechanism). Burden still counts in the window,
+            # and (as get_teachers_assigned_on_date has no period filter)
+            # the teacher is excluded from later runs that day.
+            who = req[2]
             mentor_rows += 1
-            sim_dates[req['substitute_id']].append(d)
-            # Mirror cross-run behaviour: get_teachers_assigned_on_date has
-            # no period filter, so a mentor-cover teacher is excluded from
-            # later runs that day. (Within-run the real engine does not
-            # exclude them; per-request replay cannot distinguish runs --
-            # accepted approximation.)
-            assigned_on[dstr].add(req['substitute_id'])
-            pick_seq.append(('MENTOR', req['substitute_id']))
+            covers[who].append(day)
+            assigned_on[day].add(who)
+            pick_seq.append(-2)
             continue
 
-        if dstr not in cd_cache:
-            cd_cache[dstr] = get_cycle_day(dstr)
-        p1, p2 = get_free_teachers_for_period(
-            req['period_id'], cd_cache[dstr],
-            exclude_staff_ids=list(assigned_on[dstr]), target_date=dstr,
-        )
-        pool = p1 if p1 else p2
+        taken = assigned_on[day]
+        pool = [p for p in req[2] if p not in taken]
+        if not pool:
+            pool = [p for p in req[3] if p not in taken]
         if not pool:
             unfilled += 1
-            pick_seq.append(('NONE', None))
+            pick_seq.append(-1)
             continue
 
-        pick = rank_pick(pool, sim_dates, free, window_days, d)
-        picks[pick['id']] += 1
-        sim_dates[pick['id']].append(d)
-        assigned_on[dstr].add(pick['id'])
-        pick_seq.append(('PICK', pick['id']))
+        # Lowest (covered_in_window / free); tie-break first_name A-Z.
+        # History is chronological, so every recorded day is <= day and the
+        # window count is a prefix count from the right.
+        lo = day - window_days
+        best, best_key = None, None
+        for p in pool:
+            f = free[p]
+            days = covers[p]
+            covered = len(days) - bisect_right(days, lo)
+            key = (covered / f if f > 0 else inf, names[p])
+            if best_key is None or key < best_key:
+                best, best_key = p, key
+        picks[best] += 1
+        covers[best].append(day)
+        taken.add(best)
+        pick_seq.append(best)
 
-    return picks, pick_seq, unfilled, mentor_rows
+    ms = (time.perf_counter() - started) * 1000
+    return picks, pick_seq, unfilled, mentor_rows, ms
 
 
-def norm_stats(counts, free, eligible_ids):
-    """Normalized burden (covers / free) across ALL eligible subs."""
+def _run_window(window_days):
+    return window_days, simulate(_INPUTS, window_days)
+
+
+def sweep(inputs, windows, workers=None):
+    """{window: simulate(...)} for every window, across a process pool."""
+    windows = sorted(set(windows))
+    if workers == 1 or len(windows) == 1:
+        return {w: simulate(inputs, w) for w in windows}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(inputs,)) as pool:
+        return dict(pool.map(_run_window, windows))
+
+
+def norm_values(counts, free, eligible_ids):
+    """Normalized burden (covers / free) for ALL eligible subs."""
     vals = []
     for sid in eligible_ids:
         f = free.get(sid, 0)
         vals.append((counts.get(sid, 0) / f) if f > 0 else 0.0)
+    return vals
+
+
+def norm_stats(counts, free, eligible_ids):
+    """Normalized burden (covers / free) across ALL eligible subs."""
+    vals = norm_values(counts, free, eligible_ids)
     n = len(vals)
     if not n:
         return 0.0, 0.0, 0.0, 0.0
@@ -148,18 +252,57 @@ def norm_stats(counts, free, eligible_ids):
     return mean, sd, min(vals), max(vals)
 
 
+def gini(vals):
+    """Gini coefficient: 0 = perfectly even burden, 1 = one person does it all."""
+    vals = sorted(vals)
+    n, total = len(vals), sum(vals)
+    if not n or total == 0:
+        return 0.0
+    weighted = sum((i + 1) * v for i, v in enumerate(vals))
+    return (2 * weighted) / (n * total) - (n + 1) / n
+
+
+def parse_windows(spec):
+    """'21,28,42' or ranges 'a-b' / 'a-b:step' (inclusive), comma-separated."""
+    windows = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            bounds, _, step = part.partition(':')
+            lo, hi = (int(x) for x in bounds.split('-'))
+            windows.extend(range(lo, hi + 1, int(step or 1)))
+        else:
+            windows.append(int(part))
+    return [w for w in windows if w > 0]
+
+
 def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Burden-ratio backtest (read-only).")
+    ap.add_argument('--windows', default=','.join(str(w) for w in WINDOWS),
+                    help="window days, e.g. 21,28,42 or 7-90:7 (default %(default)s)")
+    ap.add_argument('--workers', type=int, default=None,
+                    help="process pool size (default: CPU count; 1 = serial)")
+    args = ap.parse_args()
+    windows = parse_windows(args.windows)
+
+    started = time.perf_counter()
     with get_connection() as conn:
         slots = derive_slots_per_cycle(conn)
         free, names = load_free_and_names(conn, slots)
         history = load_history(conn)
 
-    eligible_ids = list(free.keys())
-    print(f"slots per cycle (derived): {slots}")
-    if not eligible_ids or not history:
-        print(f"nothing to backtest: eligible={len(eligible_ids)} "
-              f"history={len(history)}")
-        return
+        eligible_ids = list(free.keys())
+        print(f"slots per cycle (derived): {slots}")
+        if not eligible_ids or not history or not windows:
+            print(f"nothing to backtest: eligible={len(eligible_ids)} "
+                  f"history={len(history)} windows={len(windows)}")
+            return
+        inputs = load_inputs(conn, free, history)
+    load_ms = (time.perf_counter() - started) * 1000
+
     print(f"eligible subs: {len(eligible_ids)}  free range: "
           f"{min(free.values())}-{max(free.values())}")
     print(f"history rows (Assigned/Confirmed): {len(history)}  "
@@ -172,29 +315,44 @@ def main():
     am, asd, amn, amx = norm_stats(actual, free, eligible_ids)
     zero_actual = sum(1 for s in eligible_ids if actual.get(s, 0) == 0)
     print(f"\nACTUAL (pointer): norm-burden mean={am:.3f} sd={asd:.3f} "
-          f"min={amn:.3f} max={amx:.3f}  never-used={zero_actual}/{len(eligible_ids)}")
+          f"min={amn:.3f} max={amx:.3f}  gini={gini(norm_values(actual, free, eligible_ids)):.3f}"
+          f"  never-used={zero_actual}/{len(eligible_ids)}")
 
+    sweep_started = time.perf_counter()
+    results = sweep(inputs, windows, args.workers)
+    sweep_ms = (time.perf_counter() - sweep_started) * 1000
+
+    staff = inputs['staff']
     seqs = {}
-    for w in WINDOWS:
-        picks, seq, unfilled, mentor = simulate(history, free, w)
+    for w, (pick_counts, seq, unfilled, mentor, ms) in sorted(results.items()):
         seqs[w] = seq
+        picks = {}  # first-pick order, so top5 ties read as before
+        for p in seq:
+            if p >= 0 and staff[p] not in picks:
+                picks[staff[p]] = pick_counts[p]
         m, sd, mn, mx = norm_stats(picks, free, eligible_ids)
+        g = gini(norm_values(picks, free, eligible_ids))
         zero = sum(1 for s in eligible_ids if picks.get(s, 0) == 0)
         print(f"\nWINDOW {w}d: norm-burden mean={m:.3f} sd={sd:.3f} "
-              f"min={mn:.3f} max={mx:.3f}  never-used={zero}/{len(eligible_ids)}"
-              f"  unfilled={unfilled}  mentor-rows={mentor}")
+              f"min={mn:.3f} max={mx:.3f}  gini={g:.3f}  max/mean="
+              f"{(mx / m if m else 0.0):.2f}  never-used={zero}/{len(eligible_ids)}"
+              f"  unfilled={unfilled}  mentor-rows={mentor}  ({ms:.0f} ms)")
         top = sorted(picks.items(), key=lambda kv: -kv[1])[:5]
         print("  top5: " + ", ".join(
             f"{names.get(s, s)}={c}" for s, c in top))
 
-    # Sensitivity: how many picks differ vs the 28d run
-    base = seqs[28]
-    for w in WINDOWS:
-        if w == 28:
+    # Sensitivity: how many picks differ vs the base window run
+    base_w = BASE_WINDOW if BASE_WINDOW in seqs else min(seqs)
+    base = seqs[base_w]
+    for w in sorted(seqs):
+        if w == base_w:
             continue
         diff = sum(1 for a, b in zip(seqs[w], base)
-                   if a[0] == 'PICK' and b[0] == 'PICK' and a[1] != b[1])
-        print(f"\npicks differing {w}d vs 28d: {diff}")
+                   if a >= 0 and b >= 0 and a != b)
+        print(f"\npicks differing {w}d vs {base_w}d: {diff}")
+
+    print(f"\ntiming: load {load_ms:.0f} ms, {len(windows)} windows "
+          f"{sweep_ms:.0f} ms wall ({len(history)} requests each)")
 
 
 if __name__ == '__main__':
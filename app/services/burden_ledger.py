@@ -0,0 +1,221 @@
+"""
+Burden ledger - the inputs to get_burden_ratios without rescanning requests.
+
+  ratio = covers in the trailing BURDEN_WINDOW_DAYS / free periods per cycle
+
+Numerator: burden_cover_daily (migration 028) holds Assigned/Confirmed
+covers per substitute per day, kept current by triggers on
+substitute_request, so assign / decline / cancel / early return / reassign
+are all reflected however they are written. A window is at most one row per
+substitute per day instead of a GROUP BY over every request.
+
+Denominator: teaching periods x cycle length minus each substitute's
+timetable slots. Held in memory, keyed on the data_version counters of
+period, substitute_config, staff and timetable_slot (migrations 021, 027),
+so it is rebuilt only when one of those changes.
+
+Verification: the original SQL is kept here as _sql_free_periods /
+_sql_covered_counts.
+  BURDEN_LEDGER_VERIFY=1        every ledger read is diffed against the SQL;
+                                mismatches are printed and the SQL wins
+  python3 -m app.services.burden_ledger [--from D] [--to D] [--rebuild]
+                                diff ratios and rankings for every date in a
+                                range (read-only unless --rebuild)
+"""
+
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from app.services.db import get_connection, get_data_versions
+
+TENANT_ID = "MARAGON"
+BURDEN_WINDOW_DAYS = 28  # Addendum v161a: trailing calendar-day window
+
+FREE_TABLES = ('period', 'substitute_config', 'staff', 'timetable_slot')
+
+VERIFY = os.environ.get('BURDEN_LEDGER_VERIFY') == '1'
+
+_free_lock = threading.Lock()
+_free_snapshot = None
+
+
+def _window(target_date_str):
+    return (TENANT_ID, target_date_str, '-' + str(BURDEN_WINDOW_DAYS) + ' day',
+            target_date_str)
+
+
+def _sql_free_periods(cursor):
+    """Reference denominator: staff_id -> free periods per cycle."""
+    cursor.execute("""
+        SELECT COUNT(*) AS c FROM period
+        WHERE tenant_id = ? AND is_teaching = 1
+    """, (TENANT_ID,))
+    teaching_periods = cursor.fetchone()['c']
+    cursor.execute("""
+        SELECT cycle_length FROM substitute_config WHERE tenant_id = ?
+    """, (TENANT_ID,))
+    row = cursor.fetchone()
+    cycle_len = row['cycle_length'] if row and row['cycle_length'] else 7
+    slots_per_cycle = teaching_periods * cycle_len
+    cursor.execute("""
+        SELECT s.id, COALESCE(t.c, 0) AS taught
+        FROM staff s
+        LEFT JOIN (
+            SELECT staff_id, COUNT(*) AS c FROM timetable_slot
+            WHERE tenant_id = ? GROUP BY staff_id
+        ) t ON t.staff_id = s.id
+        WHERE s.tenant_id = ? AND s.is_active = 1 AND s.can_substitute = 1
+    """, (TENANT_ID, TENANT_ID))
+    return {r['id']: slots_per_cycle - r['taught'] for r in cursor.fetchall()}
+
+
+def _sql_covered_counts(cursor, target_date_str):
+    """Reference numerator: staff_id -> covers in the trailing window."""
+    cursor.execute("""
+        SELECT substitute_id, COUNT(*) AS c FROM substitute_request
+        WHERE tenant_id = ?
+          AND status IN ('Assigned', 'Confirmed')
+          AND substitute_id IS NOT NULL
+          AND request_date > date(?, ?)
+          AND request_date <= ?
+        GROUP BY substitute_id
+    """, _window(target_date_str))
+    return {r['substitute_id']: r['c'] for r in cursor.fetchall()}
+
+
+def _report(what, target, ledger, reference):
+    if ledger != reference:
+        keys = sorted(set(ledger) | set(reference))
+        diff = {k: (ledger.get(k), reference.get(k)) for k in keys
+                if ledger.get(k) != reference.get(k)}
+        print(f"Burden ledger MISMATCH ({what} {target}): {diff}")
+
+
+def free_periods(conn):
+    """staff_id -> free periods per cycle, rebuilt only when a watched table
+    changed. Shared between callers - do not mutate."""
+    global _free_snapshot
+    versions = get_data_versions(conn, FREE_TABLES)
+    snapshot = _free_snapshot
+    if (snapshot is None or versions is None
+            or snapshot['versions'] != versions):
+        with _free_lock:
+            snapshot = {'versions': versions,
+                        'free': _sql_free_periods(conn.cursor())}
+            _free_snapshot = snapshot
+    return snapshot['free']
+
+
+def _ledger_covered_counts(cursor, target_date_str):
+    cursor.execute("""
+        SELECT substitute_id, SUM(covers) AS c FROM burden_cover_daily
+        WHERE tenant_id = ?
+          AND request_date > date(?, ?)
+          AND request_date <= ?
+        GROUP BY substitute_id
+        HAVING SUM(covers) > 0
+    """, _window(target_date_str))
+    return {r['substitute_id']: r['c'] for r in cursor.fetchall()}
+
+
+def covered_counts(cursor, target_date_str):
+    """staff_id -> covers in (target - window, target], from the ledger."""
+    covered = _ledger_covered_counts(cursor, target_date_str)
+    if VERIFY:
+        reference = _sql_covered_counts(cursor, target_date_str)
+        _report('covers', target_date_str, covered, reference)
+        return reference
+    return covered
+
+
+def load(conn, target_date_str):
+    """(free, covered) for one target date."""
+    free = free_periods(conn)
+    if VERIFY:
+        reference = _sql_free_periods(conn.cursor())
+        _report('free', target_date_str, free, reference)
+        free = reference
+    return free, covered_counts(conn.cursor(), target_date_str)
+
+
+def invalidate():
+    """Drop the denominator snapshot (in-process writers, tests)."""
+    global _free_snapshot
+    _free_snapshot = None
+
+
+def rebuild():
+    """Recompute burden_cover_daily from substitute_request."""
+    from app.services.apply_migration_028 import BACKFILL_SQL
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM burden_cover_daily")
+        cursor.execute(BACKFILL_SQL)
+        conn.commit()
+        return cursor.rowcount
+
+
+def _ranking(free, covered):
+    ratios = {sid: ((covered.get(sid, 0) / f) if f > 0 else float('inf'))
+              for sid, f in free.items()}
+    return sorted(ratios, key=lambda sid: (ratios[sid], sid)), ratios
+
+
+def verify(start_date, end_date):
+    """
+    Diff ledger vs SQL for every calendar day in [start_date, end_date].
+    Returns a list of (date, staff_id, ledger_ratio, sql_ratio) plus
+    (date, 'ranking', ledger_order, sql_order) when the orders differ.
+    """
+    mismatches = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        free = free_periods(conn)
+        reference_free = _sql_free_periods(cursor)
+        day = start_date
+        while day <= end_date:
+            day_str = day.isoformat()
+            order, ratios = _ranking(free, _ledger_covered_counts(cursor, day_str))
+            reference_order, reference = _ranking(
+                reference_free, _sql_covered_counts(cursor, day_str))
+            for sid in sorted(set(ratios) | set(reference)):
+                if ratios.get(sid) != reference.get(sid):
+                    mismatches.append((day_str, sid, ratios.get(sid), reference.get(sid)))
+            if order != reference_order:
+                mismatches.append((day_str, 'ranking', order, reference_order))
+            day += timedelta(days=1)
+    return mismatches
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Verify the burden ledger against the SQL.")
+    ap.add_argument('--from', dest='start', help="first date (default: 120 days ago)")
+    ap.add_argument('--to', dest='end', help="last date (default: today + 30)")
+    ap.add_argument('--rebuild', action='store_true',
+                    help="recompute burden_cover_daily from substitute_request first")
+    args = ap.parse_args()
+
+    today = date.today()
+    start = (datetime.strptime(args.start, '%Y-%m-%d').date() if args.start
+             else today - timedelta(days=120))
+    end = (datetime.strptime(args.end, '%Y-%m-%d').date() if args.end
+           else today + timedelta(days=30))
+
+    if args.rebuild:
+        print(f"Rebuilt burden_cover_daily: {rebuild()} rows")
+
+    mismatches = verify(start, end)
+    days = (end - start).days + 1
+    if not mismatches:
+        print(f"Burden ledger OK: {days} days {start} .. {end}, identical ratios and rankings")
+        return 0
+    for m in mismatches[:50]:
+        print("MISMATCH", *m)
+    print(f"Burden ledger: {len(mismatches)} mismatches over {days} days")
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,6 +5,7 @@ Reference data remains in Notion
 """
 
 import sqlite3
+import threading
 import uuid
 from datetime import datetime, date, timedelta, timezone
 from pathlib import Path
@@ -49,18 +50,147 @@ def init_db():
     print(f"Database initialized: {get_db_path()}")
 
 
-@contextmanager
-def get_connection():
-    """Context manager for database connections."""
-    conn = sqlite3.connect(get_db_path())
+# ============================================
+# CONNECTION POOL
+# ============================================
+#
+# One long-lived connection per worker thread instead of a fresh
+# sqlite3.connect + 3 PRAGMAs on every get_connection() call.
+#
+# Nesting: a `with get_connection()` opened INSIDE another one on the same
+# thread gets its own connection (depth 1, 2, ...), exactly as before - an
+# inner commit never commits the outer block's pending writes, and an inner
+# read never sees them. Every depth is pooled, so nested callers reuse too.
+#
+# Leaving the outermost block of a depth rolls back anything uncommitted,
+# which is what conn.close() used to do implicitly.
+#
+# Fork safety: connections are tagged with the pid that opened them. A
+# gunicorn worker that inherits the master's thread-local (migrations run
+# at import) discards those and opens its own.
+
+STATEMENT_CACHE_SIZE = 256  # sqlite3's per-connection prepared-statement LRU
+
+_local = threading.local()
+
+
+def _open_connection(db_path) -> sqlite3.Connection:
+    """Open a connection and apply the per-connection PRAGMAs once."""
+    conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row  # Enable dict-like access
     conn.execute("PRAGMA foreign_keys = ON")
     conn.execute("PRAGMA journal_mode = WAL")
     conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def _thread_pool() -> list:
+    """This thread's connections, one per nesting depth. Reset after fork
+    or if DB_PATH has been repointed (scripts, seeding against a copy)."""
+    db_path = str(get_db_path())
+    pool = getattr(_local, 'pool', None)
+    if (pool is None or _local.pid != os.getpid()
+            or _local.db_path != db_path):
+        if pool is not None and _local.pid == os.getpid():
+            for conn in pool:
+                conn.close()
+        pool = _local.pool = []
+        _local.pid = os.getpid()
+        _local.db_path = db_path
+        _local.depth = 0
+    return pool
+
+
+def _release(conn: sqlite3.Connection) -> None:
+    """Return a connection to its slot: discard uncommitted work, as close() did."""
+    if conn.in_transaction:
+        conn.rollback()
+
+
+@contextmanager
+def get_connection():
+    """Context manager for database connections (pooled per thread)."""
+    pool = _thread_pool()
+    depth = _local.depth
+    if depth == len(pool):
+        pool.append(_open_connection(_local.db_path))
+    conn = pool[depth]
+    pinned = depth == 0 and _request_scoped()
+    if pinned:
+        from flask import g
+        g._db_conn = conn
+    _local.depth = depth + 1
     try:
         yield conn
     finally:
-        conn.close()
+        _local.depth = depth
+        if not pinned:
+            try:
+                _release(conn)
+            except sqlite3.Error:
+                # Broken connection - drop it so the next caller reopens.
+                pool[depth:] = []
+                conn.close()
+
+
+def close_thread_connections() -> None:
+    """Close every pooled connection held by the calling thread."""
+    pool = getattr(_local, 'pool', None)
+    if pool and _local.pid == os.getpid():
+        for conn in pool:
+            conn.close()
+    _local.pool = None
+
+
+# --- Opt-in request-scoped mode (Flask `g`) ---
+#
+# With app.config['DB_REQUEST_SCOPED'] = True (or env DB_REQUEST_SCOPED=1),
+# every top-level get_connection() block in a request shares the thread's
+# depth-0 connection as ONE unit of work: uncommitted writes stay visible
+# to later blocks in the same request and are only rolled back at request
+# teardown. Default mode keeps the old per-block discard. Nested blocks
+# still get their own connection in both modes.
+
+def _request_scoped() -> bool:
+    try:
+        from flask import has_app_context, current_app
+    except ImportError:
+        return False
+    if not has_app_context():
+        return False
+    return bool(current_app.config.get('DB_REQUEST_SCOPED'))
+
+
+def init_app(app) -> None:
+    """Register the request-scoped connection teardown on a Flask app."""
+    app.config.setdefault('DB_REQUEST_SCOPED',
+                          os.environ.get('DB_REQUEST_SCOPED') == '1')
+
+    @app.teardown_appcontext
+    def _release_request_connection(exc):
+        from flask import g
+        conn = g.pop('_db_conn', None)
+        if conn is not None:
+            try:
+                _release(conn)
+            except sqlite3.Error:
+                close_thread_connections()
+
+
+def get_data_versions(conn, names) -> Optional[tuple]:
+    """Current data_version counters (migration 021) for the given table
+    names, in order. Any write to a watched table bumps its counter, so an
+    in-memory cache built at version X is stale once this differs.
+    Returns None if the counter table is missing (pre-021 database)."""
+    try:
+        rows = conn.execute(
+            "SELECT name, version FROM data_version WHERE name IN ({})".format(
+                ",".join("?" * len(names))),
+            tuple(names)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    found = {row['name']: row['version'] for row in rows}
+    return tuple(found.get(name, 0) for name in names)
 
 
 def generate_id() -> str:
@@ -598,6 +728,34 @@ def get_pending_stats_sqlite(mentor_group_id: str) -> dict:
     return {'present': present, 'absent': absent, 'late': late, 'unmarked': unmarked}
 
 
+def get_roll_call_version(mentor_group_id: str, attendance_date: str) -> int:
+    """Change counter for a group's register (migration 026). Read it
+    BEFORE the marks it describes, so nothing written in between is missed."""
+    with get_connection() as conn:
+        row = conn.execute('''
+            SELECT version FROM roll_call_version WHERE mentor_group_id = ? AND date = ?
+        ''', (mentor_group_id, attendance_date)).fetchone()
+    return row['version'] if row else 0
+
+
+def get_roll_call_changes(mentor_group_id: str, attendance_date: str, since: int,
+                          attendance_id: str = None) -> dict:
+    """{learner_id: status} for marks changed after version `since` - on the
+    submitted register if attendance_id is given, else in pending_attendance."""
+    with get_connection() as conn:
+        if attendance_id:
+            rows = conn.execute('''
+                SELECT learner_id, status FROM attendance_entry
+                WHERE attendance_id = ? AND mark_version > ?
+            ''', (attendance_id, since)).fetchall()
+        else:
+            rows = conn.execute('''
+                SELECT learner_id, status FROM pending_attendance
+                WHERE mentor_group_id = ? AND date = ? AND mark_version > ?
+            ''', (mentor_group_id, attendance_date, since)).fetchall()
+    return {row['learner_id']: row['status'] for row in rows}
+
+
 def clear_pending_attendance_sqlite(mentor_group_id: str):
     """Clear pending attendance for today after submission."""
     from datetime import date
@@ -757,6 +915,127 @@ def update_attendance_submitted(attendance_id: str):
         conn.commit()
 
 
+# uuid4-shaped ids generated inside SQLite, for INSERT...SELECT.
+_SQL_UUID4 = ("lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || "
+              "substr(lower(hex(randomblob(2))), 2) || '-' || "
+              "substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || "
+              "lower(hex(randomblob(6)))")
+
+
+def submit_roll_call(mentor_group_id: str, attendance_date: str,
+                     existing_attendance_id: str = None,
+                     tenant_id: str = "MARAGON") -> Optional[Dict]:
+    """
+    Submit a mentor group's register in one transaction.
+
+    Moves today's pending_attendance into attendance_entry (INSERT...SELECT),
+    updates learner_absent_tracking for the whole class with one UPSERT,
+    refreshes the attendance rollups and commits once. BEGIN IMMEDIATE takes
+    the write lock up front, so two devices submitting the same group
+    serialise: the second finds the register already there and re-submits
+    it instead of creating a duplicate.
+
+    Returns {'attendance_id', 'count', 'is_update'}, or None if there is no
+    register yet and nothing has been marked.
+    """
+    from app.services.attendance_rollup import refresh_attendance_in
+
+    now = datetime.now().isoformat()
+
+    with get_connection() as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+
+        attendance_id = existing_attendance_id
+        if not attendance_id:
+            cursor.execute('''
+                SELECT id FROM attendance
+                WHERE mentor_group_id = ? AND date = ?
+                ORDER BY submitted_at DESC LIMIT 1
+            ''', (mentor_group_id, attendance_date))
+            row = cursor.fetchone()
+            attendance_id = row['id'] if row else None
+        is_update = attendance_id is not None
+
+        if is_update:
+            cursor.execute('''
+                UPDATE attendance SET submitted_at = ?, status = 'Submitted'
+                WHERE id = ?
+            ''', (now, attendance_id))
+            # Marks left in pending (e.g. a second device marking before the
+            # first submitted) are folded into the existing register.
+            cursor.execute('''
+                UPDATE attendance_entry
+                SET status = (SELECT p.status FROM pending_attendance p
+                              WHERE p.mentor_group_id = ? AND p.date = ?
+                                AND p.learner_id = attendance_entry.learner_id),
+                    updated_at = ?
+                WHERE attendance_id = ? AND learner_id IN (
+                    SELECT learner_id FROM pending_attendance
+                    WHERE mentor_group_id = ? AND date = ?)
+            ''', (mentor_group_id, attendance_date, now, attendance_id,
+                  mentor_group_id, attendance_date))
+        else:
+            cursor.execute('''
+                SELECT 1 FROM pending_attendance
+                WHERE mentor_group_id = ? AND date = ? LIMIT 1
+            ''', (mentor_group_id, attendance_date))
+            if cursor.fetchone() is None:
+                conn.rollback()
+                return None
+            attendance_id = str(uuid.uuid4())
+            cursor.execute('''
+                INSERT INTO attendance (id, tenant_id, date, mentor_group_id, submitted_by_id, submitted_at, status)
+                VALUES (?, ?, ?, ?, NULL, ?, 'Submitted')
+            ''', (attendance_id, tenant_id, attendance_date, mentor_group_id, now))
+
+        cursor.execute('''
+            INSERT INTO attendance_entry (id, attendance_id, learner_id, status)
+            SELECT {uuid}, ?, p.learner_id, p.status
+            FROM pending_attendance p
+            WHERE p.mentor_group_id = ? AND p.date = ?
+              AND NOT EXISTS (SELECT 1 FROM attendance_entry ae
+                              WHERE ae.attendance_id = ? AND ae.learner_id = p.learner_id)
+        '''.format(uuid=_SQL_UUID4), (attendance_id, mentor_group_id, attendance_date, attendance_id))
+
+        cursor.execute(
+            'DELETE FROM pending_attendance WHERE mentor_group_id = ? AND date = ?',
+            (mentor_group_id, attendance_date))
+
+        # Same rules as update_learner_absent_tracking(): Absent adds a day,
+        # Present/Late resets to 0, and a learner already recorded with the
+        # same status for this date is left alone (resubmits don't re-count).
+        cursor.execute('''
+            INSERT INTO learner_absent_tracking
+                (learner_id, tenant_id, consecutive_absent_days, last_status,
+                 last_attendance_date, updated_at)
+            SELECT learner_id, ?,
+                   CASE WHEN status = 'Absent' THEN 1 ELSE 0 END,
+                   CASE WHEN status = 'Absent' THEN 'Absent' ELSE 'Present' END,
+                   ?, ?
+            FROM attendance_entry
+            WHERE attendance_id = ? AND status IN ('Present', 'Absent', 'Late')
+            ON CONFLICT(learner_id) DO UPDATE SET
+                consecutive_absent_days = CASE WHEN excluded.last_status = 'Absent'
+                    THEN learner_absent_tracking.consecutive_absent_days + 1 ELSE 0 END,
+                last_status = excluded.last_status,
+                last_attendance_date = excluded.last_attendance_date,
+                updated_at = excluded.updated_at
+            WHERE learner_absent_tracking.last_attendance_date IS NOT excluded.last_attendance_date
+               OR learner_absent_tracking.last_status IS NOT excluded.last_status
+        ''', (tenant_id, attendance_date, now, attendance_id))
+
+        cursor.execute('SELECT COUNT(*) FROM attendance_entry WHERE attendance_id = ?',
+                       (attendance_id,))
+        count = cursor.fetchone()[0]
+
+        refresh_attendance_in(cursor, [attendance_id], tenant_id)
+        conn.commit()
+
+    return {'attendance_id': attendance_id, 'count': count, 'is_update': is_update}
+
+
 def mark_stasy_captured(attendance_id: str, captured_by: str = None):
     """Mark attendance as captured in STASY."""
     from datetime import datetime
@@ -784,137 +1063,244 @@ def get_attendance_with_entries(attendance_id: str) -> list:
         ''', (attendance_id,))
         return [dict(row) for row in cursor.fetchall()]
 
-# Run migrations on import
-def run_pending_migrations():
-    """Run any pending migrations on startup."""
-    try:
-        from app.services.apply_migration_004 import apply_migration
-        apply_migration()
-    except Exception as e:
-        print(f"Migration 004 check: {e}")
-    
-    try:
-        from app.services.apply_migration_005 import apply_migration as apply_migration_005
-        apply_migration_005()
-    except Exception as e:
-        print(f"Migration 005 check: {e}")
-    
-    try:
-        from app.services.seed_calendar_2026 import seed_calendar
-        seed_calendar()
-    except Exception as e:
-        print(f"Calendar seed check: {e}")
-    
-    try:
-        from app.services.apply_migration_006 import apply_migration as apply_migration_006
-        apply_migration_006()
-    except Exception as e:
-        print(f"Migration 006 check: {e}")
-    
-    try:
-        from app.services.apply_migration_007 import apply_migration as apply_migration_007
-        apply_migration_007()
-    except Exception as e:
-        print(f"Migration 007 check: {e}")
-    
-    try:
-        from app.services.apply_migration_008 import apply_migration as apply_migration_008
-        apply_migration_008()
-    except Exception as e:
-        print(f"Migration 008 check: {e}")
-    
-    try:
-        from app.services.apply_migration_008b import apply_migration as apply_migration_008b
-        apply_migration_008b()
-    except Exception as e:
-        print(f"Migration 008b check: {e}")
-    
-    try:
-        from app.services.apply_migration_009 import apply_migration as apply_migration_009
-        apply_migration_009()
-    except Exception as e:
-        print(f"Migration 009 check: {e}")
-    
+# ============================================
+# MIGRATIONS
+# ============================================
+#
+# Every migration/seed below is idempotent, but probing them all costs ~25
+# module imports and connections - per gunicorn worker, per boot, all
+# racing for the write lock. ensure_migrations() therefore:
+#   1. fingerprints the step list + the source of every step module;
+#   2. compares it with migration_ledger in ONE query - equal means the
+#      database already ran exactly this code, so nothing else happens;
+#   3. otherwise takes an exclusive file lock next to the database, so one
+#      process migrates while the others wait, re-checks, and runs the steps
+#      in order - skipping any whose source hash migration_step already
+#      records as 'ok'.
+# Each step's outcome is written to migration_step as soon as it finishes
+# ('ok', or 'failed' with the error), so a step that keeps failing is
+# retried on its own next boot instead of re-running the whole list
+# (SELECT * FROM migration_step WHERE status = 'failed' shows why).
+# migration_ledger gets the fingerprint only once every step is 'ok'.
+#
+# Adding a migration: append it to MIGRATION_STEPS. Editing any listed
+# module also changes the fingerprint and re-runs that (idempotent) step.
+
+# (label, module, function) - run in this order
+MIGRATION_STEPS = [
+    ("Migration 004", "app.services.apply_migration_004", "apply_migration"),
+    ("Migration 005", "app.services.apply_migration_005", "apply_migration"),
+    ("Calendar seed", "app.services.seed_calendar_2026", "seed_calendar"),
+    ("Migration 006", "app.services.apply_migration_006", "apply_migration"),
+    ("Migration 007", "app.services.apply_migration_007", "apply_migration"),
+    ("Migration 008", "app.services.apply_migration_008", "apply_migration"),
+    ("Migration 008b", "app.services.apply_migration_008b", "apply_migration"),
+    ("Migration 009", "app.services.apply_migration_009", "apply_migration"),
+    ("Migration 010", "app.services.apply_migration_010", "apply_migration"),
+    ("Migration 011", "app.services.apply_migration_011", "apply_migration"),
+    ("Migration 012", "app.services.apply_migration_012", "apply_migration"),
+    ("Migration 013", "app.services.apply_migration_013", "apply_migration"),
+    ("Migration 014", "app.services.apply_migration_014", "apply_migration"),
+    ("Migration 015", "app.services.apply_migration_015", "apply_migration"),
+    ("Migration 016", "app.services.apply_migration_016", "apply_migration"),
+    ("Migration 017", "app.services.apply_migration_017", "apply_migration"),
+    ("Migration 018", "app.services.apply_migration_018", "apply_migration"),
+    ("Migration 019", "app.services.apply_migration_019", "apply_migration"),
+    ("Migration 020", "app.services.apply_migration_020", "apply_migration"),
+    ("Migration 021", "app.services.apply_migration_021", "apply_migration"),
+    ("Migration 022", "app.services.apply_migration_022", "apply_migration"),
+    ("Migration 023", "app.services.apply_migration_023", "apply_migration"),
+    ("Migration 024", "app.services.apply_migration_024", "apply_migration"),
+    ("Migration 025", "app.services.apply_migration_025", "apply_migration"),
+    ("Migration 026", "app.services.apply_migration_026", "apply_migration"),
+    ("Migration 027", "app.services.apply_migration_027", "apply_migration"),
+    ("Migration 028", "app.services.apply_migration_028", "apply_migration"),
+    ("Migration 029", "app.services.apply_migration_029", "apply_migration"),
+    ("Migration 030", "app.services.apply_migration_030", "apply_migration"),
+    ("Migration 031", "app.services.apply_migration_031", "apply_migration"),
+    ("Migration 032", "app.services.apply_migration_032", "apply_migration"),
+    ("Migration 033", "app.services.apply_migration_033", "apply_migration"),
+    ("Migration 034", "app.services.apply_migration_034", "apply_migration"),
+    ("Migration 035", "app.services.apply_migration_035", "apply_migration"),
+    ("Migration 036", "app.services.apply_migration_036", "apply_migration"),
+    ("Sport events seed", "app.services.seed_sport_events", "seed_sport_events"),
+    ("Sport duties seed", "app.services.seed_sport_duties", "seed_sport_duties"),
+    # Older package-style runner (app/services/migrations/), formerly
+    # called separately from the app factory.
+    ("Migration runner", "app.services.run_migrations", "run_migrations"),
+]
+
+# Outcome of this process's ensure_migrations(), for boot logging.
+MIGRATION_STATUS = {'state': None, 'fingerprint': None, 'ms': None}
+
+
+def _step_hash(label, module, func) -> str:
+    """sha256 over one step's entry and its module's source."""
+    import hashlib
+    import importlib.util
+    h = hashlib.sha256(f"{label}|{module}|{func}\n".encode())
+    spec = importlib.util.find_spec(module)
+    if spec and spec.origin:
+        with open(spec.origin, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def migration_fingerprint() -> str:
+    """sha256 over every step's hash, in order."""
+    import hashlib
+    h = hashlib.sha256()
+    for step in MIGRATION_STEPS:
+        h.update(_step_hash(*step).encode())
+    return h.hexdigest()
+
+
+def _ensure_ledger_tables(conn) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS migration_ledger (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            fingerprint TEXT NOT NULL,
+            steps INTEGER NOT NULL,
+            duration_ms REAL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS migration_step (
+            label TEXT PRIMARY KEY,
+            step_hash TEXT NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            duration_ms REAL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def _completed_steps(conn) -> dict:
+    """label -> step_hash of every step recorded as 'ok'."""
     try:
-        from app.services.apply_migration_010 import apply_migration as apply_migration_010
-        apply_migration_010()
-    except Exception as e:
-        print(f"Migration 010 check: {e}")
+        rows = conn.execute(
+            "SELECT label, step_hash FROM migration_step WHERE status = 'ok'").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {row['label']: row['step_hash'] for row in rows}
 
-    try:
-        from app.services.apply_migration_011 import apply_migration as apply_migration_011
-        apply_migration_011()
-    except Exception as e:
-        print(f"Migration 011 check: {e}")
 
+def _record_step(label, step_hash, error, duration_ms) -> None:
+    with get_connection() as conn:
+        _ensure_ledger_tables(conn)
+        conn.execute("""
+            INSERT INTO migration_step (label, step_hash, status, error, duration_ms, applied_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(label) DO UPDATE SET
+                step_hash = excluded.step_hash, status = excluded.status,
+                error = excluded.error, duration_ms = excluded.duration_ms,
+                applied_at = excluded.applied_at
+        """, (label, step_hash, 'failed' if error else 'ok', error,
+              round(duration_ms, 1), now_iso()))
+        conn.commit()
+
+
+def run_pending_migrations(force: bool = False) -> int:
+    """Run every step not already recorded 'ok' at its current source hash
+    (every step if force), recording each outcome. Returns the number of
+    steps that raised."""
+    import importlib
+    import time
+    with get_connection() as conn:
+        completed = {} if force else _completed_steps(conn)
+    failures = 0
+    for label, module, func in MIGRATION_STEPS:
+        step_hash = _step_hash(label, module, func)
+        if completed.get(label) == step_hash:
+            continue
+        started = time.perf_counter()
+        error = None
+        try:
+            getattr(importlib.import_module(module), func)()
+        except Exception as e:
+            failures += 1
+            error = f"{type(e).__name__}: {e}"[:500]
+            print(f"{label} check: {e}")
+        try:
+            _record_step(label, step_hash, error,
+                         (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            print(f"{label} ledger write failed: {e}")
+    return failures
+
+
+def _ledger_fingerprint(conn) -> Optional[str]:
     try:
-        from app.services.apply_migration_012 import apply_migration as apply_migration_012
-        apply_migration_012()
-    except Exception as e:
-        print(f"Migration 012 check: {e}")
-    
-    try:
-        from app.services.apply_migration_013 import apply_migration as apply_migration_013
-        apply_migration_013()
-    except Exception as e:
-        print(f"Migration 013 check: {e}")
-    
-    try:
-        from app.services.apply_migration_014 import apply_migration as apply_migration_014
-        apply_migration_014()
-    except Exception as e:
-        print(f"Migration 014 check: {e}")
-    
-    try:
-        from app.services.apply_migration_015 import apply_migration as apply_migration_015
-        apply_migration_015()
-    except Exception as e:
-        print(f"Migration 015 check: {e}")
-    
-    try:
-        from app.services.apply_migration_016 import apply_migration as apply_migration_016
-        apply_migration_016()
-    except Exception as e:
-        print(f"Migration 016 check: {e}")
-    
-    try:
-        from app.services.apply_migration_017 import apply_migration as apply_migration_017
-        apply_migration_017()
-    except Exception as e:
-        print(f"Migration 017 check: {e}")
-    
-    try:
-        from app.services.apply_migration_018 import apply_migration as apply_migration_018
-        apply_migration_018()
-    except Exception as e:
-        print(f"Migration 018 check: {e}")
-    
-    try:
-        from app.services.apply_migration_019 import apply_migration as apply_migration_019
-        apply_migration_019()
-    except Exception as e:
-        print(f"Migration 019 check: {e}")
-    
-    try:
-        from app.services.apply_migration_020 import apply_migration as apply_migration_020
-        apply_migration_020()
-    except Exception as e:
-        print(f"Migration 020 check: {e}")
-    
-    try:
-        from app.services.seed_sport_events import seed_sport_events
-        seed_sport_events()
-    except Exception as e:
-        print(f"Sport events seed check: {e}")
-    
+        row = conn.execute("SELECT fingerprint FROM migration_ledger WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row['fingerprint'] if row else None
+
+
+@contextmanager
+def _migration_lock():
+    """Exclusive cross-process lock on <db>.migrate.lock (no-op without fcntl)."""
     try:
-        from app.services.seed_sport_duties import seed_sport_duties
-        seed_sport_duties()
-    except Exception as e:
-        print(f"Sport duties seed check: {e}")
+        import fcntl
+    except ImportError:
+        yield
+        return
+    lock_path = str(get_db_path()) + ".migrate.lock"
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_migrations(force: bool = False) -> dict:
+    """Bring the schema up to date unless the ledger says it already is."""
+    import time
+    started = time.perf_counter()
+    fingerprint = migration_fingerprint()
 
-# Auto-run on module load
-run_pending_migrations()
+    with get_connection() as conn:
+        current = _ledger_fingerprint(conn)
+    if current == fingerprint and not force:
+        state = 'current'
+    else:
+        with _migration_lock():
+            with get_connection() as conn:
+                current = _ledger_fingerprint(conn)
+            if current == fingerprint and not force:
+                state = 'current'  # another process migrated while we waited
+            else:
+                failures = run_pending_migrations(force)
+                state = 'applied'
+                if failures:
+                    state = 'incomplete'
+                    print(f"Migrations: {failures} step(s) failed - recorded in migration_step, "
+                          f"only those will be retried next boot")
+                else:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    with get_connection() as conn:
+                        _ensure_ledger_tables(conn)
+                        conn.execute("""
+                            INSERT INTO migration_ledger (id, fingerprint, steps, duration_ms, applied_at)
+                            VALUES (1, ?, ?, ?, ?)
+                            ON CONFLICT(id) DO UPDATE SET
+                                fingerprint = excluded.fingerprint, steps = excluded.steps,
+                                duration_ms = excluded.duration_ms, applied_at = excluded.applied_at
+                        """, (fingerprint, len(MIGRATION_STEPS), round(elapsed_ms, 1), now_iso()))
+                        conn.commit()
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    MIGRATION_STATUS.update(state=state, fingerprint=fingerprint[:12], ms=round(elapsed_ms, 1))
+    print(f"Migrations {state} ({fingerprint[:12]}) in {elapsed_ms:.1f} ms [pid {os.getpid()}]")
+    return MIGRATION_STATUS
+
+
+# Auto-run on module load (one ledger lookup when nothing changed)
+ensure_migrations()
 
 
 # ============================================
@@ -966,7 +1352,10 @@ def get_whos_out_by_period(staff_id: str, date_str: str, cycle_day: int, tenant_
           -> attendance_entry (status='Absent')       -> joined to attendance for the date
     Periods ordered ASC by period.sort_order; learners ASC by first_name.
     Returns one dict per period with a nested 'learners' list (empty if none absent).
+    The learner_subject/attendance half of the chain is the in-memory
+    enrolment index (enrolment_index.py), for all periods at once.
     """
+    from app.services import enrolment_index
     with get_connection() as conn:
         slots = conn.execute("""
             SELECT ts.period_id, ts.class_name, ts.subject,
@@ -977,19 +1366,13 @@ def get_whos_out_by_period(staff_id: str, date_str: str, cycle_day: int, tenant_
             ORDER BY p.sort_order
         """, (staff_id, cycle_day, tenant_id)).fetchall()
 
-        result = []
-        for slot in slots:
-            learners = conn.execute("""
-                SELECT l.id, l.first_name, l.surname
-                FROM learner_subject ls
-                JOIN learner l ON ls.learner_id = l.id
-                JOIN attendance_entry ae ON ae.learner_id = l.id
-                JOIN attendance a ON ae.attendance_id = a.id
-                WHERE ls.class_name = ? AND ls.subject = ? AND ls.is_active = 1
-                  AND a.tenant_id = ? AND a.date = ? AND ae.status = 'Absent'
-                ORDER BY l.first_name, l.surname
-            """, (slot['class_name'], slot['subject'], tenant_id, date_str)).fetchall()
+        # Enrolment index x the date's absent set, all periods in one pass.
+        absent = enrolment_index.absent_on(
+            conn, tenant_id, date_str,
+            [(slot['class_name'], slot['subject']) for slot in slots])
 
+        result = []
+        for slot, learners in zip(slots, absent):
             result.append({
                 'period_id': slot['period_id'],
                 'period_name': slot['period_name'],
@@ -997,7 +1380,8 @@ def get_whos_out_by_period(staff_id: str, date_str: str, cycle_day: int, tenant_
                 'end_time': slot['end_time'],
                 'class_name': slot['class_name'],
                 'subject': slot['subject'],
-                'learners': [dict(lr) for lr in learners],
+                'learners': [{'id': lid, 'first_name': first_name, 'surname': surname}
+                             for lid, first_name, surname in learners],
                 'absent_count': len(learners),
             })
 
@@ -1011,10 +1395,11 @@ def get_period_roster(class_name: str, subject: str, date_str: str, tenant_id: s
     class_name + subject), widened to EVERY enrolled learner with their status,
     not only absentees.
 
-    Join shape: attendance_entry is matched to each learner via a
-    subquery-scoped attendance_id (the register(s) for this tenant+date), so the
-    result stays constrained to the enrolled class - one row per enrolled
-    learner, no fan-out. A learner with no entry resolves to 'Unmarked'.
+    Answered from the enrolment index (enrolment_index.py): the class's
+    enrolled learners matched in memory to the entries on this tenant+date's
+    register(s), so the result stays constrained to the enrolled class - one
+    row per enrolled learner, no fan-out. A learner with no entry resolves to
+    'Unmarked'.
     notes carried through (empty today; reason-capture epic fills it later).
 
     PROVEN against production 2026-06-17 (Gr8 SM / Arts and Culture):
@@ -1028,25 +1413,17 @@ def get_period_roster(class_name: str, subject: str, date_str: str, tenant_id: s
           'exception_count': int,    # anyone not 'Present'
         }
     """
+    from app.services import enrolment_index
     with get_connection() as conn:
-        rows = conn.execute("""
-            SELECT l.id, l.first_name, l.surname,
-                   COALESCE(ae.status, 'Unmarked') AS status,
-                   ae.notes AS notes
-            FROM learner_subject ls
-            JOIN learner l ON ls.learner_id = l.id
-            LEFT JOIN attendance_entry ae
-                   ON ae.learner_id = l.id
-                  AND ae.attendance_id IN (
-                        SELECT id FROM attendance
-                        WHERE tenant_id = ls.tenant_id AND date = ?
-                      )
-            WHERE ls.class_name = ? AND ls.subject = ? AND ls.is_active = 1
-              AND ls.tenant_id = ?
-            ORDER BY l.first_name, l.surname
-        """, (date_str, class_name, subject, tenant_id)).fetchall()
-
-        learners = [dict(r) for r in rows]
+        marks = enrolment_index.day_marks(conn, tenant_id, date_str)
+        learners = []
+        for lid, first_name, surname in enrolment_index.enrolled(
+                conn, tenant_id, class_name, subject):
+            for status, notes in marks.get(lid) or (('Unmarked', None),):
+                learners.append({'id': lid, 'first_name': first_name,
+                                 'surname': surname,
+                                 'status': status if status is not None else 'Unmarked',
+                                 'notes': notes})
         present_count = sum(1 for lr in learners if lr['status'] == 'Present')
         total = len(learners)
         return {
@@ -0,0 +1,148 @@
+"""
+Enrolment index - who is in which class+subject, and who is out on a date.
+
+My Day's who's-out view (get_whos_out_by_period) ran one learner_subject x
+attendance_entry x attendance query per timetable slot, and the class
+register (get_period_roster) matched every learner row against a
+correlated IN (SELECT ... FROM attendance). Both are opened by every
+teacher and every substitute.
+
+Two in-memory pieces replace those queries:
+
+  enrolment   (tenant_id, class_name, subject) -> tuple of learner tuples
+              (id, first_name, surname), active learner_subject rows joined
+              to learner, in first_name, surname order. One tuple per
+              learner_subject row, so duplicate enrolments still show twice.
+              Keyed on the learner_subject + learner data_version counters.
+
+  day marks   (tenant_id, date) -> learner_id -> [(status, notes), ...]
+              every attendance_entry on that date's registers, plus the
+              absent set (learner_id -> Absent entry count). Keyed on the
+              attendance + attendance_entry counters, so a roll-call submit
+              or a mark on a submitted register refreshes it on next use.
+
+Who's-out and the roster are then lookups and set intersections over these,
+answered for all of a teacher's periods in one pass. Counters come from
+migration 030. Without the counter table nothing is cached (built per call).
+"""
+
+import threading
+
+from app.services.db import get_data_versions
+
+ENROLMENT_TABLES = ('learner_subject', 'learner')
+MARK_TABLES = ('attendance', 'attendance_entry')
+
+MAX_CACHED_DAYS = 8
+
+_lock = threading.Lock()
+_enrolment = {'versions': None, 'classes': None}
+_days = {'versions': None, 'marks': {}}
+
+
+def _name_key(learner):
+    # SQLite ORDER BY: NULLs first, then binary (code point) order.
+    _, first_name, surname = learner
+    return (first_name is not None, first_name or '',
+            surname is not None, surname or '')
+
+
+def _load_enrolment(cursor):
+    cursor.execute("""
+        SELECT ls.tenant_id, ls.class_name, ls.subject,
+               l.id, l.first_name, l.surname
+        FROM learner_subject ls
+        JOIN learner l ON ls.learner_id = l.id
+        WHERE ls.is_active = 1
+    """)
+    classes = {}
+    for row in cursor.fetchall():
+        key = (row['tenant_id'], row['class_name'], row['subject'])
+        classes.setdefault(key, []).append((row['id'], row['first_name'], row['surname']))
+    return {key: tuple(sorted(learners, key=_name_key))
+            for key, learners in classes.items()}
+
+
+def _load_day(cursor, tenant_id, date_str):
+    cursor.execute("""
+        SELECT ae.learner_id, ae.status, ae.notes
+        FROM attendance a
+        JOIN attendance_entry ae ON ae.attendance_id = a.id
+        WHERE a.tenant_id = ? AND a.date = ?
+    """, (tenant_id, date_str))
+    marks, absent = {}, {}
+    for row in cursor.fetchall():
+        marks.setdefault(row['learner_id'], []).append((row['status'], row['notes']))
+        if row['status'] == 'Absent':
+            absent[row['learner_id']] = absent.get(row['learner_id'], 0) + 1
+    return marks, absent
+
+
+def _classes(conn):
+    versions = get_data_versions(conn, ENROLMENT_TABLES)
+    if versions is None:
+        return _load_enrolment(conn.cursor())
+    if _enrolment['versions'] != versions:
+        with _lock:
+            if _enrolment['versions'] != versions:
+                _enrolment['classes'] = _load_enrolment(conn.cursor())
+                _enrolment['versions'] = versions
+    return _enrolment['classes']
+
+
+def _day_marks(conn, tenant_id, date_str):
+    versions = get_data_versions(conn, MARK_TABLES)
+    if versions is None:
+        return _load_day(conn.cursor(), tenant_id, date_str)
+    key = (tenant_id, date_str)
+    with _lock:
+        if _days['versions'] != versions:
+            _days['marks'] = {}
+            _days['versions'] = versions
+        marks = _days['marks'].get(key)
+        if marks is None:
+            if len(_days['marks']) >= MAX_CACHED_DAYS:
+                _days['marks'].clear()
+            marks = _days['marks'][key] = _load_day(conn.cursor(), tenant_id, date_str)
+    return marks
+
+
+def enrolled(conn, tenant_id, class_name, subject):
+    """(id, first_name, surname) tuples enrolled in class+subject, name order."""
+    return _classes(conn).get((tenant_id, class_name, subject), ())
+
+
+def day_marks(conn, tenant_id, date_str):
+    """learner_id -> [(status, notes), ...] for every register on date_str.
+    Shared between callers - do not mutate."""
+    return _day_marks(conn, tenant_id, date_str)[0]
+
+
+def absent_on(conn, tenant_id, date_str, slots):
+    """
+    For each (class_name, subject) in slots, the enrolled learners marked
+    Absent on date_str as (id, first_name, surname) tuples - one pass, one
+    lookup per slot. A learner Absent on two registers appears twice, as
+    the joined query did.
+    """
+    classes = _classes(conn)
+    absent = _day_marks(conn, tenant_id, date_str)[1]
+    result = []
+    for class_name, subject in slots:
+        out = []
+        if absent:  # nobody out today -> every slot is empty
+            for learner in classes.get((tenant_id, class_name, subject), ()):
+                n = absent.get(learner[0])
+                if n:
+                    out.extend([learner] * n)
+        result.append(out)
+    return result
+
+
+def invalidate():
+    """Drop both caches (tests, scripts)."""
+    with _lock:
+        _enrolment['versions'] = None
+        _enrolment['classes'] = None
+        _days['versions'] = None
+        _days['marks'] = {}
@@ -0,0 +1,160 @@
+"""
+In-process pub/sub for Server-Sent Events.
+
+publish(topic, data) hands an event to every open stream on that topic in
+this process, immediately. Other gunicorn processes learn about the change
+through the data_version counters (migrations 021/023/026): while anything is
+subscribed, one watcher thread per process checks the counters of each
+watched topic and publishes when they move. Query load is therefore one
+primary-key lookup per process per WATCH_SECONDS, however many phones
+have a stream open.
+
+Streams end after STREAM_MAX_SECONDS; EventSource reconnects by itself,
+so no worker is held by a single client forever.
+
+SSE is off unless SSE_ENABLED=1. An open stream occupies a worker for up to
+STREAM_MAX_SECONDS, so only enable it when serving with threaded (or gevent)
+workers, e.g.
+
+    gunicorn -w 2 -k gthread --threads 32 run:app
+
+With the flag off the stream routes answer 204 (EventSource stops
+reconnecting), the pages do not open a stream and their polling runs as
+before. With it on, every page with an emergency banner (base.html and the
+home screens), the active-alert page and the roll-call page open a stream,
+and banner polling only runs while that stream is down.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from app.services.db import get_connection, get_data_versions
+
+SSE_ENABLED = os.environ.get('SSE_ENABLED') == '1'
+
+WATCH_SECONDS = 2.0
+HEARTBEAT_SECONDS = 20
+STREAM_MAX_SECONDS = 300
+RETRY_MS = 5000
+
+# topic -> tables whose data_version counters signal a change
+WATCHED_TOPICS = {
+    'emergency': ('emergency_alert', 'emergency_response'),
+    'roll_call': ('roll_call_version',),
+}
+
+_lock = threading.Lock()
+_subscribers = {}       # topic -> set of queue.Queue
+_seen_versions = {}     # topic -> last counter tuple published
+_watcher_pid = None
+
+
+def subscribe(topic):
+    q = queue.Queue(maxsize=100)
+    with _lock:
+        _subscribers.setdefault(topic, set()).add(q)
+    if topic in WATCHED_TOPICS:
+        _ensure_watcher()
+    return q
+
+
+def unsubscribe(topic, q):
+    with _lock:
+        _subscribers.get(topic, set()).discard(q)
+
+
+def subscriber_count(topic=None):
+    with _lock:
+        if topic:
+            return len(_subscribers.get(topic, ()))
+        return sum(len(s) for s in _subscribers.values())
+
+
+def publish(topic, data=None):
+    """Deliver an event to every stream on `topic` in this process."""
+    if topic in WATCHED_TOPICS:
+        # The watcher would see this write's counter bump and send the
+        # same event again - record it as seen.
+        versions = _read_versions(topic)
+        if versions is not None:
+            _seen_versions[topic] = versions
+    _fan_out(topic, data or {})
+
+
+def _fan_out(topic, data):
+    with _lock:
+        targets = list(_subscribers.get(topic, ()))
+    for q in targets:
+        try:
+            q.put_nowait(data)
+        except queue.Full:
+            pass  # stalled client; it refetches on its next event anyway
+
+
+def _read_versions(topic):
+    try:
+        with get_connection() as conn:
+            return get_data_versions(conn, WATCHED_TOPICS[topic])
+    except Exception as e:
+        print(f"Event watcher read error ({topic}): {e}")
+        return None
+
+
+def _ensure_watcher():
+    global _watcher_pid
+    if _watcher_pid == os.getpid():
+        return
+    with _lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    threading.Thread(target=_watch_loop, name='event-watcher', daemon=True).start()
+
+
+def _watch_loop():
+    global _watcher_pid
+    while True:
+        time.sleep(WATCH_SECONDS)
+        if not subscriber_count():
+            # Nobody listening: stop; the next subscribe() restarts us.
+            with _lock:
+                if not any(_subscribers.values()):
+                    _watcher_pid = None
+                    _seen_versions.clear()
+                    return
+        for topic in WATCHED_TOPICS:
+            if not subscriber_count(topic):
+                continue
+            versions = _read_versions(topic)
+            if versions is None:
+                continue
+            previous = _seen_versions.get(topic)
+            _seen_versions[topic] = versions
+            if previous is not None and versions != previous:
+                _fan_out(topic, {'kind': 'changed'})
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream(topic, event, initial=None):
+    """Generator for a text/event-stream response: the `initial` payload,
+    then one `event` per publish on `topic`, with heartbeat comments."""
+    q = subscribe(topic)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        yield format_sse(event, initial or {})
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                data = q.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event, data)
+    finally:
+        unsubscribe(topic, q)
@@ -7,36 +7,68 @@ is supported for now: the Assessment Timetable (Band-1 colour grid). Other
 programmes get their own prompt when Phase 2 widens.
 
 Design contract (handover v131 section 5):
-  - NO new dependency. Calls the Anthropic REST endpoint directly via `requests`
-    (already in requirements.txt; the app already does outbound HTTPS in
-    notion.py / push.py). The `anthropic` SDK is deliberately NOT used.
+  - Calls the Anthropic REST endpoint directly via `requests` (already in
+    requirements.txt; the app already does outbound HTTPS in notion.py /
+    push.py). The `anthropic` SDK is deliberately NOT used. pypdf (page
+    splitting, below) is in requirements.txt and installed by default; the
+    import is guarded only so a deploy without it degrades to whole-file
+    calls instead of failing, as image_derivatives does without Pillow.
   - Key + model come from the environment, NEVER from code/repo:
         ANTHROPIC_API_KEY  (required; empty -> fail closed)
         EXTRACT_MODEL      (optional; defaults to a Claude string below)
   - FAIL CLOSED. Any problem (no key, non-200, exception, empty body) returns
     (None, reason). The caller falls back to the empty paste box (B-3 path is
     the permanent safety net). Extraction is an enhancement, never a dependency.
-  - ONE attempt, timeout=90. No retry in v1 - predictable per-call cost.
+  - ONE attempt per call, timeout=90. No retry in v1 - predictable cost.
+    Called from a background job (schedules.run_extraction), never from a
+    request: the upload returns before the model call starts.
+  - With pypdf installed, a multi-page PDF is split into page ranges
+    (extract_page_ranges): each call gets a small PDF of only its pages, and
+    the calls run concurrently. Latency follows the longest range rather than
+    the whole file, and one timeout loses only its own pages. Ranges not
+    started by EXTRACT_DEADLINE_SECONDS fail as 'deadline', so the job ends
+    well inside its stale window (jobs.KIND_STALE_SECONDS). Without pypdf, or
+    for a PDF it cannot read, the whole file goes in one call, as before.
   - The returned TSV is NOT trusted: the caller runs it through the same
     _parse_rows a human paste goes through, so a model misread is rejected
     identically to a bad hand-paste.
+  - Rows that pass are memoized by extract_cache, keyed on the file hash plus
+    prompt_version() and current_model() below, so a repeat upload of the
+    same file skips the call.
 
 ASCII-only. Tenant-agnostic (no DB, no session) - pure transform.
 """
 
+import io
 import os
+import time
 import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = None
+
 
 # --- Anthropic REST shape (verified against current docs, handover 5.2) -----
-API_URL = "https://api.anthropic.com/v1/messages"
+# EXTRACT_API_URL points at a local stub of the messages endpoint for testing.
+API_URL = os.environ.get("EXTRACT_API_URL", "https://api.anthropic.com/v1/messages")
 ANTHROPIC_VERSION = "2023-06-01"
 DEFAULT_MODEL = "claude-opus-4-8"
 MAX_TOKENS = 8192          # the Assessment Timetable proof run was ~51 rows
 REQUEST_TIMEOUT = 90       # seconds; one attempt only
 
+# Multi-page PDFs: one call per PAGES_PER_CALL pages, EXTRACT_WORKERS at once.
+PAGES_PER_CALL = int(os.environ.get("EXTRACT_PAGES_PER_CALL", "2"))
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", "4"))
+# No range call starts after this many seconds, so a job lasts at most this
+# plus REQUEST_TIMEOUT. Keep well under jobs.KIND_STALE_SECONDS.
+EXTRACT_DEADLINE_SECONDS = 900
+
 # media_type for each image extension the upload route admits. The upload route
 # stores file_kind as 'image'/'pdf'; for an image we still need the precise
 # media_type, derived from the stored file extension by the caller is overkill,
@@ -73,6 +105,34 @@ _PROMPTS = {
     "assessment-timetable": _ASSESSMENT_TIMETABLE_PROMPT,
 }
 
+# Appended when a multi-page PDF is split into page ranges (extract_page_ranges).
+_PAGE_SCOPE = (
+    "\nThis document is pages %d to %d (inclusive) of a longer timetable; "
+    "output the rows these pages show."
+)
+
+
+def prompt_version(programme_slug):
+    """Short hash of the programme's prompt text, or None if it has no prompt.
+    Part of the extract_cache key: editing a prompt (or how PDFs are split
+    across calls) retires its cached rows."""
+    prompt = _PROMPTS.get(programme_slug)
+    if prompt is None:
+        return None
+    text = "%s\n%s\n%d" % (prompt, _PAGE_SCOPE if splitting_available() else "",
+                            PAGES_PER_CALL)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def splitting_available():
+    """True if multi-page PDFs are split into page ranges (pypdf installed)."""
+    return PdfReader is not None
+
+
+def current_model():
+    """The model extract_rows will call (EXTRACT_MODEL or the default)."""
+    return os.environ.get("EXTRACT_MODEL", DEFAULT_MODEL)
+
 
 def _image_media_type(file_bytes):
     """Return the precise image/* media_type from magic bytes, or None."""
@@ -113,13 +173,67 @@ def _build_source_block(file_bytes, file_kind):
     return None, "unsupported_file_kind"
 
 
-def extract_rows(file_bytes, file_kind, programme_slug):
+def split_pdf(file_bytes):
+    """[((first, last), range_pdf_bytes), ...] - the PDF cut into runs of
+    PAGES_PER_CALL pages (1-based, inclusive) - or None when it should go
+    whole: pypdf missing, unreadable or encrypted file, or too few pages."""
+    if PdfReader is None:
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(file_bytes))
+        if reader.is_encrypted:
+            return None
+        pages = len(reader.pages)
+        if pages <= PAGES_PER_CALL:
+            return None
+        parts = []
+        for first in range(1, pages + 1, PAGES_PER_CALL):
+            last = min(first + PAGES_PER_CALL - 1, pages)
+            writer = PdfWriter()
+            for index in range(first - 1, last):
+                writer.add_page(reader.pages[index])
+            out = io.BytesIO()
+            writer.write(out)
+            parts.append(((first, last), out.getvalue()))
+        return parts
+    except Exception as e:
+        print("PDF split failed, sending whole file: %s" % e)
+        return None
+
+
+def extract_page_ranges(file_bytes, file_kind, programme_slug):
+    """Run extract_rows once per page range, EXTRACT_WORKERS at a time.
+
+    Returns [(page_range, tsv_text, reason), ...] in page order, one entry per
+    range; page_range is None for a whole-file call. Each entry fails closed on
+    its own, so the caller can keep the rows of the ranges that worked.
+    """
+    parts = split_pdf(file_bytes) if file_kind == "pdf" else None
+    if parts is None:
+        return [(None,) + extract_rows(file_bytes, file_kind, programme_slug)]
+    deadline = time.monotonic() + EXTRACT_DEADLINE_SECONDS
+
+    def run(part):
+        pages, range_bytes = part
+        if time.monotonic() > deadline:
+            return None, "deadline"
+        return extract_rows(range_bytes, file_kind, programme_slug, pages=pages)
+
+    workers = max(1, min(EXTRACT_WORKERS, len(parts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(run, parts)
+        return [(part[0],) + result for part, result in zip(parts, results)]
+
+
+def extract_rows(file_bytes, file_kind, programme_slug, pages=None):
     """Extract structured TSV rows from an uploaded artifact.
 
     Args:
         file_bytes:     raw bytes of the uploaded file (already validated upstream).
         file_kind:      'pdf' or 'image' (as the upload route classifies it).
         programme_slug: the source programme's slug; selects the prompt shape.
+        pages:          optional (first, last) - file_bytes holds only these
+                        pages of a longer PDF (split_pdf); named in the prompt.
 
     Returns:
         (tsv_text, None) on success - the model's tab-separated rows, ready to
@@ -129,12 +243,14 @@ def extract_rows(file_bytes, file_kind, programme_slug):
     prompt = _PROMPTS.get(programme_slug)
     if prompt is None:
         return None, "no_prompt_for_programme"
+    if pages is not None:
+        prompt = prompt + _PAGE_SCOPE % pages
 
     key = os.environ.get("ANTHROPIC_API_KEY", "")
     if not key:
         return None, "no_key"
 
-    model = os.environ.get("EXTRACT_MODEL", DEFAULT_MODEL)
+    model = current_model()
 
     source_block, block_err = _build_source_block(file_bytes, file_kind)
     if block_err is not None:
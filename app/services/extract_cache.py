@@ -0,0 +1,174 @@
+"""
+Persistent cache of vision extraction results (migration 034).
+
+extract_rows is a pure transform of (file bytes, prompt, model), so its
+output can be reused whenever all three repeat. Entries are keyed by
+(sha256 of the bytes, programme_slug, extract.prompt_version, model) and
+only ever hold TSV that already passed _parse_rows - a misread is never
+remembered.
+
+  lookup(sha256, slug)       -> tsv or None; counts a hit or a miss
+  store(sha256, slug, tsv)   -> remember a good extraction, then evict
+  evict()                        -> age limit, then LRU down to the size caps
+
+schedules.upload asks lookup() before queueing the job, so a repeat upload
+lands on the review screen with its rows already in place. The digest is
+the one upload_store computed while streaming the file in.
+
+CLI:
+    python3 -m app.services.extract_cache            # summary
+    python3 -m app.services.extract_cache --evict
+    python3 -m app.services.extract_cache --clear
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from app.services.db import get_connection
+from app.services.extract import current_model, prompt_version
+
+MAX_AGE_DAYS = 180
+MAX_ENTRIES = 500
+MAX_BYTES = 5 * 1024 * 1024      # of TSV; a 51-row timetable is ~2 KB
+
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def _key(sha256, programme_slug):
+    version = prompt_version(programme_slug)
+    if version is None:
+        return None
+    return (sha256, programme_slug, version, current_model())
+
+
+def lookup(sha256, programme_slug):
+    """Cached TSV for the file with this sha256 (hex) under the current
+    prompt + model, or None."""
+    key = _key(sha256, programme_slug)
+    if key is None:
+        return None
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT tsv FROM extract_cache "
+                "WHERE sha256 = ? AND programme_slug = ? "
+                "AND prompt_version = ? AND model = ?", key)
+            row = cur.fetchone()
+            if row is None:
+                _stats['misses'] += 1
+                return None
+            cur.execute(
+                "UPDATE extract_cache SET hits = hits + 1, last_hit_at = ? "
+                "WHERE sha256 = ? AND programme_slug = ? "
+                "AND prompt_version = ? AND model = ?",
+                (datetime.now(timezone.utc).isoformat(),) + key)
+            conn.commit()
+    except Exception as e:
+        print("Extract cache lookup error: %s" % e)
+        return None
+    _stats['hits'] += 1
+    return row['tsv']
+
+
+def store(sha256, programme_slug, tsv):
+    """Remember a TSV that passed _parse_rows. Best-effort."""
+    key = _key(sha256, programme_slug)
+    if key is None or not tsv:
+        return
+    try:
+        with get_connection() as conn:
+            conn.execute(
+                "INSERT INTO extract_cache "
+                "(sha256, programme_slug, prompt_version, model, tsv, bytes, "
+                " created_at, last_hit_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, NULL, 0) "
+                "ON CONFLICT(sha256, programme_slug, prompt_version, model) "
+                "DO UPDATE SET tsv = excluded.tsv, bytes = excluded.bytes, "
+                " created_at = excluded.created_at",
+                key + (tsv, len(tsv.encode('utf-8')),
+                       datetime.now(timezone.utc).isoformat()))
+            conn.commit()
+            _stats['stores'] += 1
+            _evict(conn)
+    except Exception as e:
+        print("Extract cache store error: %s" % e)
+
+
+def _evict(conn):
+    cur = conn.cursor()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=MAX_AGE_DAYS)).isoformat()
+    cur.execute(
+        "DELETE FROM extract_cache WHERE COALESCE(last_hit_at, created_at) < ?",
+        (cutoff,))
+    removed = cur.rowcount
+
+    # Newest-used first; everything past either cap goes.
+    cur.execute(
+        "SELECT rowid, bytes FROM extract_cache "
+        "ORDER BY COALESCE(last_hit_at, created_at) DESC")
+    doomed, entries, total = [], 0, 0
+    for row in cur.fetchall():
+        entries += 1
+        total += row['bytes']
+        if entries > MAX_ENTRIES or total > MAX_BYTES:
+            doomed.append((row['rowid'],))
+    if doomed:
+        cur.executemany("DELETE FROM extract_cache WHERE rowid = ?", doomed)
+        removed += len(doomed)
+    conn.commit()
+    _stats['evictions'] += removed
+    return removed
+
+
+def evict():
+    """Apply the age and size limits now. Returns the number of entries removed."""
+    with get_connection() as conn:
+        return _evict(conn)
+
+
+def clear():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM extract_cache")
+        conn.commit()
+        return cur.rowcount
+
+
+def stats():
+    hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    result = {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else 0.0,
+        'stores': _stats['stores'],
+        'evictions': _stats['evictions'],
+        'max_age_days': MAX_AGE_DAYS,
+        'max_entries': MAX_ENTRIES,
+        'max_bytes': MAX_BYTES,
+    }
+    try:
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS entries, COALESCE(SUM(bytes), 0) AS bytes, "
+                "       COALESCE(SUM(hits), 0) AS lifetime_hits "
+                "FROM extract_cache").fetchone()
+            result.update(dict(row))
+    except Exception as e:
+        print("Extract cache stats error: %s" % e)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Inspect or trim the extraction cache.")
+    ap.add_argument('--evict', action='store_true', help="apply age/size limits now")
+    ap.add_argument('--clear', action='store_true', help="drop every entry")
+    args = ap.parse_args()
+    if args.clear:
+        print("Cleared %d entries" % clear())
+    elif args.evict:
+        print("Evicted %d entries" % evict())
+    s = stats()
+    print("extract_cache: %d entries, %d bytes, %d lifetime hits"
+          % (s.get('entries', 0), s.get('bytes', 0), s.get('lifetime_hits', 0)))
@@ -0,0 +1,111 @@
+"""
+Send an uploaded file, optionally handing the transfer to the front proxy.
+
+notices.serve_file and schedules.serve_file check the session, tenant and
+row in Python and then streamed the file with send_file, so a sync gunicorn
+worker stayed busy for the whole download - a 10 MB PDF to a phone on
+school Wi-Fi holds it for tens of seconds. FILE_SERVE_MODE chooses who moves
+the bytes once the checks pass:
+
+  direct      (default) send_file from the worker, as before
+  x-accel     empty response with X-Accel-Redirect: <FILE_ACCEL_PREFIX>/<path
+              relative to FILE_ACCEL_ROOT>; nginx streams the file
+  x-sendfile  empty response with X-Sendfile: <absolute path> (Apache
+              mod_xsendfile, lighttpd)
+
+Every mode sends a strong ETag built from the file's sha256: the name itself
+for content-addressed uploads (upload_store) and their derivatives, a hash
+computed once per (path, size, mtime) for older UUID-named files. An
+If-None-Match hit is answered 304 here without involving the proxy. Range
+requests are served by send_file in direct mode and by the proxy otherwise.
+
+nginx, for FILE_ACCEL_ROOT=/var/data and FILE_ACCEL_PREFIX=/_files:
+
+    location /_files/ {
+        internal;
+        alias /var/data/;
+        etag off;                              # keep the app's strong ETag
+        add_header ETag $upstream_http_etag;
+        add_header Vary $upstream_http_vary;
+    }
+
+Content-Type and Cache-Control from the app are kept by nginx on an
+internal redirect. The files never change under a given name, so nginx
+answering If-Range from Last-Modified is still correct.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from urllib.parse import quote
+
+from flask import Response, request, send_file
+
+FILE_SERVE_MODE = os.environ.get("FILE_SERVE_MODE", "direct")
+FILE_ACCEL_ROOT = os.environ.get("FILE_ACCEL_ROOT", "/var/data")
+FILE_ACCEL_PREFIX = os.environ.get("FILE_ACCEL_PREFIX", "/_files")
+
+MODES = ("direct", "x-accel", "x-sendfile")
+if FILE_SERVE_MODE not in MODES:
+    print("FILE_SERVE_MODE=%r not recognised, using direct" % FILE_SERVE_MODE)
+    FILE_SERVE_MODE = "direct"
+
+# <sha256>.<ext> (upload_store) and <sha256>.<size>.<fmt> (image_derivatives)
+_HASHED_NAME_RE = re.compile(r"^[0-9a-f]{64}(\.[a-z]+)+$")
+
+_MAX_HASHES = 2048
+_lock = threading.Lock()
+_hashes = {}            # (path, size, mtime_ns) -> sha256 hex
+
+
+def _file_hash(path, st):
+    key = (path, st.st_size, st.st_mtime_ns)
+    digest = _hashes.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _lock:
+            if len(_hashes) >= _MAX_HASHES:
+                _hashes.clear()
+            _hashes[key] = digest
+    return digest
+
+
+def etag_for(path, st=None):
+    """Strong ETag value (unquoted) for the file at path. A hashed name is
+    its own tag (it differs between an original and each derivative)."""
+    name = os.path.basename(path)
+    if _HASHED_NAME_RE.match(name):
+        return name
+    return _file_hash(path, st or os.stat(path))
+
+
+def send(path, mimetype):
+    """Response for an already-authorised file at absolute path."""
+    st = os.stat(path)
+    etag = etag_for(path, st)
+
+    rel = os.path.relpath(path, FILE_ACCEL_ROOT)
+    if FILE_SERVE_MODE == "direct" or (
+            FILE_SERVE_MODE == "x-accel" and rel.startswith('..')):
+        return send_file(path, mimetype=mimetype, conditional=True, etag=etag)
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    resp = Response(mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.last_modified = int(st.st_mtime)
+    resp.cache_control.no_cache = True
+    if FILE_SERVE_MODE == "x-accel":
+        resp.headers['X-Accel-Redirect'] = quote(
+            "%s/%s" % (FILE_ACCEL_PREFIX.rstrip('/'), rel.replace(os.sep, '/')))
+    else:
+        resp.headers['X-Sendfile'] = path
+    return resp
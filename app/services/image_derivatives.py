@@ -0,0 +1,181 @@
+"""
+Resized copies of uploaded images for the notice board and schedules.
+
+The board showed every poster through serve_file at full upload size (phone
+photos up to 5 MB) even though a card is at most ~600 CSS px wide. Images
+now also exist in SIZES, stored next to the original under DERIVED_DIR:
+
+    <IMG_DIR>/_derived/<stem>.<size>.webp     for clients that accept WebP
+    <IMG_DIR>/_derived/<stem>.<size>.jpg      for everyone else
+
+path_for() makes a missing derivative on first request (written to a temp
+name and renamed, so concurrent requests never see half a file); the upload
+routes also queue an 'image.derive' job so the common sizes are ready before
+anyone opens the board. Images are never upscaled, and a derivative is
+re-made only if deleted. upload_store.release() deletes an image's
+derivatives with the original; --prune catches any a request re-made in
+between.
+
+Pillow is in requirements.txt and installed by default. The import is
+guarded so a deploy without it still works: path_for() then returns None
+and callers serve the original as before.
+
+CLI:
+    python3 -m app.services.image_derivatives --prune    # drop orphaned derivatives
+"""
+
+import os
+import uuid
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+DERIVED_DIR = "_derived"
+
+# size -> longest edge in px. thumb fills a board card on a 2x screen;
+# medium covers the tap-to-enlarge modal and 3x phones.
+SIZES = {
+    'thumb': 480,
+    'medium': 1200,
+}
+JPEG_QUALITY = 80
+WEBP_QUALITY = 78
+MAX_PIXELS = 40 * 1000 * 1000    # refuse decompression bombs outright
+
+_MIME = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+
+def available():
+    return Image is not None
+
+
+def accepts_webp(accept_header):
+    """Explicit image/webp only - older Safari sends image/* but cannot decode it."""
+    return 'image/webp' in (accept_header or '')
+
+
+def _webp_ok():
+    return available() and features.check('webp')
+
+
+def _derived_path(directory, name, size, fmt):
+    stem = name.rsplit('.', 1)[0]
+    return os.path.join(directory, DERIVED_DIR, "%s.%s.%s" % (stem, size, fmt))
+
+
+def _render(src_path, dst_path, edge, fmt):
+    with Image.open(src_path) as im:
+        if im.width * im.height > MAX_PIXELS:
+            raise ValueError("image too large to resize")
+        if im.format == 'JPEG':
+            im.draft('RGB', (edge, edge))   # decode at reduced scale
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((edge, edge), Image.LANCZOS)
+        if fmt == 'jpg':
+            if im.mode in ('RGBA', 'LA', 'P'):
+                im = im.convert('RGBA')
+                bg = Image.new('RGB', im.size, (255, 255, 255))
+                bg.paste(im, mask=im.getchannel('A'))
+                im = bg
+            elif im.mode != 'RGB':
+                im = im.convert('RGB')
+            save = {'format': 'JPEG', 'quality': JPEG_QUALITY,
+                    'optimize': True, 'progressive': True}
+        else:
+            if im.mode not in ('RGB', 'RGBA'):
+                im = im.convert('RGBA')
+            save = {'format': 'WEBP', 'quality': WEBP_QUALITY, 'method': 4}
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        tmp_path = "%s.%s.tmp" % (dst_path, uuid.uuid4().hex)
+        try:
+            im.save(tmp_path, **save)
+            os.replace(tmp_path, dst_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def path_for(directory, name, size, accept_webp):
+    """(path, mimetype) of the size derivative of directory/name, made on
+    first use; None if it cannot be made (no Pillow, unknown size, unreadable
+    image) - the caller then serves the original."""
+    edge = SIZES.get(size)
+    if edge is None or not available():
+        return None
+    fmt = 'webp' if accept_webp and _webp_ok() else 'jpg'
+    dst_path = _derived_path(directory, name, size, fmt)
+    if not os.path.isfile(dst_path):
+        try:
+            _render(os.path.join(directory, name), dst_path, edge, fmt)
+        except Exception as e:
+            print("Image derivative error (%s %s): %s" % (name, size, e))
+            return None
+    return dst_path, _MIME[fmt]
+
+
+def warm(directory, name):
+    """Job handler for 'image.derive': make every size in both formats."""
+    for size in SIZES:
+        path_for(directory, name, size, accept_webp=True)
+        path_for(directory, name, size, accept_webp=False)
+
+
+def queue_warm(directory, name):
+    """Queue warm() for a freshly stored image. Best-effort; without Pillow
+    there is nothing to do."""
+    if not available():
+        return
+    try:
+        from app.services.jobs import enqueue
+        enqueue('image.derive', directory, name)
+    except Exception as e:
+        print("Image derivative enqueue error (%s): %s" % (name, e))
+
+
+def remove_for(directory, name):
+    """Delete every derivative of directory/name (called by
+    upload_store.release when the original goes). Returns the count removed."""
+    derived = os.path.join(directory, DERIVED_DIR)
+    if not os.path.isdir(derived):
+        return 0
+    prefix = name.rsplit('.', 1)[0] + '.'
+    removed = 0
+    for entry in os.listdir(derived):
+        if entry.startswith(prefix):
+            try:
+                os.remove(os.path.join(derived, entry))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def prune(directory):
+    """Remove derivatives whose original is gone. Returns the count removed."""
+    derived = os.path.join(directory, DERIVED_DIR)
+    if not os.path.isdir(derived):
+        return 0
+    stems = {entry.rsplit('.', 1)[0] for entry in os.listdir(directory)}
+    removed = 0
+    for entry in os.listdir(derived):
+        if entry.split('.', 1)[0] not in stems:
+            os.remove(os.path.join(derived, entry))
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Maintain resized image copies.")
+    ap.add_argument('--prune', action='store_true', help="drop orphaned derivatives")
+    args = ap.parse_args()
+    from app.routes import notices, schedules
+    for directory in (notices.IMG_DIR, schedules.IMG_DIR):
+        if args.prune:
+            print("%s: removed %d orphaned derivatives" % (directory, prune(directory)))
+        derived = os.path.join(directory, DERIVED_DIR)
+        count = len(os.listdir(derived)) if os.path.isdir(derived) else 0
+        print("%s: %d derivatives (Pillow %s)"
+              % (directory, count, "available" if available() else "missing"))
@@ -0,0 +1,409 @@
+"""
+Background jobs - side effects that should not hold up the request.
+
+enqueue() writes a job_queue row (migration 022) and wakes this process's
+worker threads. The row is the source of truth, so a job survives a crash
+or redeploy: whichever worker starts next picks it up. Workers claim rows
+with a guarded UPDATE, so every gunicorn process can run workers against
+the same queue without double-running a job.
+
+Only kinds listed in JOB_KINDS can be enqueued. A handler that raises (or
+a push job where FCM failed and nothing was delivered) is retried with
+exponential backoff until max_attempts, then marked 'dead' and left for
+the admin queue view (/admin/jobs). Finished rows are pruned after
+DONE_RETENTION_DAYS ('done') or DEAD_RETENTION_DAYS ('dead').
+
+Slow kinds are capped by KIND_CONCURRENCY (running rows of that kind across
+every process), so a schedule extraction - model calls of up to minutes -
+never holds all JOB_WORKERS while push jobs wait behind it. KIND_STALE_SECONDS
+gives such kinds a longer window before a 'running' row counts as lost.
+"""
+
+import importlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.services.db import get_connection, generate_id
+
+TENANT_ID = "MARAGON"
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+POLL_SECONDS = 2.0          # idle re-check for retries / other processes' jobs
+STALE_SECONDS = 300         # 'running' this long = its worker died; requeue
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_CAP_SECONDS = 600
+DONE_RETENTION_DAYS = int(os.environ.get('JOB_DONE_RETENTION_DAYS', '7'))
+DEAD_RETENTION_DAYS = int(os.environ.get('JOB_DEAD_RETENTION_DAYS', '30'))
+PRUNE_INTERVAL_SECONDS = 3600
+
+# kind -> max rows of that kind 'running' at once, queue-wide. Keep below
+# JOB_WORKERS so the other kinds always have a worker.
+KIND_CONCURRENCY = {
+    'schedule.extract': int(os.environ.get('EXTRACT_JOB_CONCURRENCY', '1')),
+}
+# kind -> STALE_SECONDS override; must exceed the kind's longest honest run
+# (extract.EXTRACT_DEADLINE_SECONDS + REQUEST_TIMEOUT for schedule.extract).
+KIND_STALE_SECONDS = {
+    'schedule.extract': 1800,
+}
+
+# kind -> (module, function, max_attempts)
+JOB_KINDS = {
+    'push.absence_reported': ('app.routes.push', 'send_absence_reported_push', 5),
+    'push.absence_covered': ('app.routes.push', 'send_absence_covered_push', 5),
+    'push.substitute_assigned': ('app.routes.push', 'send_substitute_assigned_push', 5),
+    'duty.absent_teacher_duties': ('app.services.substitute_engine', 'handle_absent_teacher_duties', 3),
+    'schedule.extract': ('app.routes.schedules', 'run_extraction', 2),
+    'image.derive': ('app.services.image_derivatives', 'warm', 2),
+}
+
+
+class RetryJob(Exception):
+    """Raised by a handler to ask for another attempt after backoff."""
+
+
+_app = None
+_wake = threading.Condition()
+_started_pid = None
+_start_lock = threading.Lock()
+_last_stale_check = 0.0
+_last_prune = 0.0
+
+
+def _stamp(dt=None):
+    return (dt or datetime.now()).isoformat(timespec='microseconds')
+
+
+# =============================================================================
+# PRODUCER
+# =============================================================================
+
+def enqueue(kind, *args, **kwargs):
+    """Queue kind(*args, **kwargs) for a worker. Returns the job id.
+    Arguments must be JSON-serialisable (dates are stored as ISO strings)."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    max_attempts = JOB_KINDS[kind][2]
+    job_id = generate_id()
+    now = _stamp()
+    payload = json.dumps({'args': list(args), 'kwargs': kwargs}, default=str)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO job_queue (id, tenant_id, kind, payload, status,
+                                   max_attempts, run_after, created_at)
+            VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)
+        """, (job_id, TENANT_ID, kind, payload, max_attempts, now, now))
+        conn.commit()
+
+    ensure_workers()
+    with _wake:
+        _wake.notify()
+    return job_id
+
+
+# =============================================================================
+# WORKERS
+# =============================================================================
+
+def init_app(app):
+    """Remember the app (handlers run inside its context) and make sure each
+    serving process has workers - started lazily so they exist after fork."""
+    global _app
+    _app = app
+
+    @app.before_request
+    def _start_job_workers():
+        ensure_workers()
+
+
+def ensure_workers():
+    """Start JOB_WORKERS daemon threads once per process."""
+    global _started_pid
+    if _started_pid == os.getpid() or JOB_WORKERS <= 0:
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        for i in range(JOB_WORKERS):
+            threading.Thread(target=_worker_loop, name=f'job-worker-{i}',
+                             daemon=True).start()
+        print(f"Job queue: {JOB_WORKERS} workers started (pid {_started_pid})")
+
+
+def _worker_loop():
+    while True:
+        try:
+            _requeue_stale()
+            _prune_periodically()
+            job = _claim()
+        except Exception as e:
+            # DB briefly locked / table missing on a pre-022 database.
+            print(f"Job queue claim error: {e}")
+            job = None
+        if job is None:
+            with _wake:
+                _wake.wait(POLL_SECONDS)
+            continue
+        _execute(job)
+
+
+def _requeue_stale():
+    """Return jobs whose worker died mid-run to the queue (once a minute)."""
+    global _last_stale_check
+    if time.monotonic() - _last_stale_check < 60:
+        return
+    _last_stale_check = time.monotonic()
+    now = datetime.now()
+    cutoff = _stamp(now - timedelta(seconds=STALE_SECONDS))
+    slow = list(KIND_STALE_SECONDS)
+    marks = ', '.join('?' * len(slow)) or "''"
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            UPDATE job_queue SET status = 'pending', last_error = 'worker lost mid-run'
+            WHERE tenant_id = ? AND status = 'running' AND started_at < ?
+              AND kind NOT IN ({marks})
+        """, [TENANT_ID, cutoff] + slow)
+        requeued = cursor.rowcount
+        for kind, seconds in KIND_STALE_SECONDS.items():
+            cursor.execute("""
+                UPDATE job_queue SET status = 'pending', last_error = 'worker lost mid-run'
+                WHERE tenant_id = ? AND status = 'running' AND kind = ? AND started_at < ?
+            """, (TENANT_ID, kind, _stamp(now - timedelta(seconds=seconds))))
+            requeued += cursor.rowcount
+        if requeued:
+            print(f"Job queue: requeued {requeued} stale jobs")
+        conn.commit()
+
+
+def _prune_periodically():
+    global _last_prune
+    if time.monotonic() - _last_prune < PRUNE_INTERVAL_SECONDS:
+        return
+    _last_prune = time.monotonic()
+    removed = prune()
+    if removed:
+        print(f"Job queue: pruned {removed} finished jobs")
+
+
+def prune(done_days=None, dead_days=None):
+    """Delete 'done' rows older than done_days and 'dead' rows older than
+    dead_days (by finished_at). Returns the number of rows removed."""
+    done_days = DONE_RETENTION_DAYS if done_days is None else done_days
+    dead_days = DEAD_RETENTION_DAYS if dead_days is None else dead_days
+    now = datetime.now()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM job_queue
+            WHERE tenant_id = ?
+              AND ((status = 'done' AND finished_at < ?)
+                OR (status = 'dead' AND finished_at < ?))
+        """, (TENANT_ID, _stamp(now - timedelta(days=done_days)),
+              _stamp(now - timedelta(days=dead_days))))
+        removed = cursor.rowcount
+        conn.commit()
+    return removed
+
+
+def _claim():
+    """Take the oldest due job whose kind is under its KIND_CONCURRENCY cap.
+    The guards on the UPDATE (still pending, cap not reached) make the claim
+    atomic across threads and processes."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for _ in range(3):
+            now = _stamp()
+            full = []
+            for kind, limit in KIND_CONCURRENCY.items():
+                cursor.execute("""
+                    SELECT COUNT(*) FROM job_queue
+                    WHERE tenant_id = ? AND kind = ? AND status = 'running'
+                """, (TENANT_ID, kind))
+                if cursor.fetchone()[0] >= limit:
+                    full.append(kind)
+            marks = ', '.join('?' * len(full)) or "''"
+            cursor.execute(f"""
+                SELECT id, kind FROM job_queue
+                WHERE tenant_id = ? AND status = 'pending' AND run_after <= ?
+                  AND kind NOT IN ({marks})
+                ORDER BY run_after LIMIT 1
+            """, [TENANT_ID, now] + full)
+            row = cursor.fetchone()
+            if not row:
+                return None
+            limit = KIND_CONCURRENCY.get(row['kind'])
+            if limit is None:
+                cursor.execute("""
+                    UPDATE job_queue
+                    SET status = 'running', attempts = attempts + 1, started_at = ?
+                    WHERE id = ? AND status = 'pending'
+                """, (now, row['id']))
+            else:
+                cursor.execute("""
+                    UPDATE job_queue
+                    SET status = 'running', attempts = attempts + 1, started_at = ?
+                    WHERE id = ? AND status = 'pending'
+                      AND (SELECT COUNT(*) FROM job_queue
+                           WHERE tenant_id = ? AND kind = ? AND status = 'running') < ?
+                """, (now, row['id'], TENANT_ID, row['kind'], limit))
+            claimed = cursor.rowcount == 1
+            conn.commit()
+            if claimed:
+                cursor.execute("SELECT * FROM job_queue WHERE id = ?", (row['id'],))
+                return dict(cursor.fetchone())
+    return None
+
+
+def _run_handler(kind, payload):
+    module, func, _ = JOB_KINDS[kind]
+    handler = getattr(importlib.import_module(module), func)
+    args = payload.get('args', [])
+    kwargs = payload.get('kwargs', {})
+
+    if not kind.startswith('push.'):
+        return handler(*args, **kwargs)
+
+    # Push senders swallow FCM errors and return a count, so look at the
+    # outcomes: retry only when something failed AND nothing was delivered
+    # (a partial success is not resent - no duplicate notifications).
+    from app.routes.push import track_push_outcomes
+    with track_push_outcomes() as counts:
+        result = handler(*args, **kwargs)
+    if counts['error'] and not counts['ok']:
+        raise RetryJob(f"push not delivered ({counts['error']} FCM errors)")
+    return result
+
+
+def _execute(job):
+    try:
+        payload = json.loads(job['payload'] or '{}')
+        if _app is not None:
+            with _app.app_context():
+                _run_handler(job['kind'], payload)
+        else:
+            _run_handler(job['kind'], payload)
+    except Exception as e:
+        _fail(job, e)
+        return
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE job_queue SET status = 'done', finished_at = ?, last_error = NULL
+            WHERE id = ?
+        """, (_stamp(), job['id']))
+        conn.commit()
+
+
+def _fail(job, error):
+    attempts = job['attempts']
+    message = f"{type(error).__name__}: {error}"[:500]
+    now = datetime.now()
+    if attempts >= job['max_attempts']:
+        status, run_after = 'dead', now
+        print(f"Job {job['kind']} {job['id'][:8]} dead after {attempts} attempts: {message}")
+    else:
+        delay = min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+        delay *= random.uniform(1.0, 1.2)
+        status, run_after = 'pending', now + timedelta(seconds=delay)
+        print(f"Job {job['kind']} {job['id'][:8]} attempt {attempts} failed, "
+              f"retry in {delay:.0f}s: {message}")
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE job_queue
+            SET status = ?, run_after = ?, finished_at = ?, last_error = ?
+            WHERE id = ?
+        """, (status, _stamp(run_after), _stamp(now), message, job['id']))
+        conn.commit()
+
+
+# =============================================================================
+# ADMIN VIEW
+# =============================================================================
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (0.0 if empty).
+    Shared with push.fan_out_push."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def queue_stats(sample=200):
+    """Depth by status/kind, age of the oldest due job, wait/run latency
+    over the last `sample` finished jobs, and the most recent failures."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT kind, status, COUNT(*) AS n FROM job_queue
+            WHERE tenant_id = ? GROUP BY kind, status
+        """, (TENANT_ID,))
+        by_kind = {}
+        depth = {'pending': 0, 'running': 0, 'done': 0, 'dead': 0}
+        for row in cursor.fetchall():
+            by_kind.setdefault(row['kind'], {})[row['status']] = row['n']
+            depth[row['status']] = depth.get(row['status'], 0) + row['n']
+
+        cursor.execute("""
+            SELECT MIN(run_after) FROM job_queue
+            WHERE tenant_id = ? AND status = 'pending' AND run_after <= ?
+        """, (TENANT_ID, _stamp()))
+        oldest = cursor.fetchone()[0]
+        oldest_due_secs = ((datetime.now() - datetime.fromisoformat(oldest)).total_seconds()
+                           if oldest else 0.0)
+
+        cursor.execute("""
+            SELECT (julianday(started_at) - julianday(created_at)) * 86400.0 AS wait,
+                   (julianday(finished_at) - julianday(started_at)) * 86400.0 AS run
+            FROM job_queue
+            WHERE tenant_id = ? AND status = 'done'
+            ORDER BY finished_at DESC LIMIT ?
+        """, (TENANT_ID, sample))
+        rows = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT id, kind, status, attempts, max_attempts, run_after, last_error
+            FROM job_queue
+            WHERE tenant_id = ? AND last_error IS NOT NULL AND status != 'done'
+            ORDER BY finished_at DESC LIMIT 10
+        """, (TENANT_ID,))
+        failures = [dict(r) for r in cursor.fetchall()]
+
+    waits = sorted(r['wait'] for r in rows if r['wait'] is not None)
+    runs = sorted(r['run'] for r in rows if r['run'] is not None)
+    return {
+        'depth': depth,
+        'by_kind': by_kind,
+        'oldest_due_secs': round(oldest_due_secs, 1),
+        'wait_ms': {'p50': round(percentile(waits, 50) * 1000),
+                    'p95': round(percentile(waits, 95) * 1000)},
+        'run_ms': {'p50': round(percentile(runs, 50) * 1000),
+                   'p95': round(percentile(runs, 95) * 1000)},
+        'sample': len(rows),
+        'failures': failures,
+        'workers': JOB_WORKERS if _started_pid == os.getpid() else 0,
+        'retention_days': {'done': DONE_RETENTION_DAYS, 'dead': DEAD_RETENTION_DAYS},
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Inspect or prune the job queue.")
+    ap.add_argument('--prune', action='store_true',
+                    help="delete finished jobs past their retention now")
+    args = ap.parse_args()
+    if args.prune:
+        print(f"Pruned {prune()} finished jobs")
+    s = queue_stats()
+    print(f"job_queue: {s['depth']} oldest due {s['oldest_due_secs']}s")
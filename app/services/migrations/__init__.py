@@ -1,9 +1,12 @@
 """Migrations package"""
 
 def run_on_startup():
-    """Run pending migrations - called from app factory."""
+    """Run pending migrations - called from app factory.
+
+    The runner for this package is a step in db.MIGRATION_STEPS, gated by
+    the migration ledger; importing db runs ensure_migrations() once per
+    process, so there is nothing more to do here."""
     try:
-        from app.services.run_migrations import run_migrations
-        run_migrations()
+        from app.services import db  # noqa: F401 - import runs ensure_migrations()
     except Exception as e:
         print(f"Migration warning: {e}")
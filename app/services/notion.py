@@ -4,17 +4,29 @@ Transactional data is in SQLite
 """
 
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 import requests
+from requests.adapters import HTTPAdapter
 from functools import lru_cache
 from typing import Optional, List, Dict, Any
 
 # Notion API configuration
 NOTION_API_KEY = os.environ.get('NOTION_API_KEY', '')
 NOTION_VERSION = "2022-06-28"
+# Point at a local stand-in for development: NOTION_API_BASE=http://127.0.0.1:8765/v1
+NOTION_API_BASE = os.environ.get('NOTION_API_BASE', 'https://api.notion.com/v1').rstrip('/')
+
+REQUEST_TIMEOUT = 30        # seconds per HTTP call
+MAX_ATTEMPTS = 5            # 429 / 5xx / connection errors are retried
+BACKOFF_BASE_SECONDS = 1
+BACKOFF_CAP_SECONDS = 30
+POOL_SIZE = 8               # keep-alive connections shared by sync threads
 
 # Database IDs from environment
 DB_STAFF = os.environ.get('NOTION_DB_STAFF', '')
@@ -32,48 +44,96 @@ HEADERS = {
 }
 
 
-def _query_database(database_id: str, filter_obj: Optional[Dict] = None, sorts: Optional[List] = None) -> List[Dict]:
-    """Query a Notion database with optional filter and sorts."""
-    url = f"https://api.notion.com/v1/databases/{database_id}/query"
-    
-    payload = {}
+class NotionError(Exception):
+    """A Notion call that failed after retries (or was not retryable)."""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """One pooled keep-alive session per process, shared by all threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(HEADERS)
+                _session = session
+    return _session
+
+
+def _retry_delay(attempt: int, response=None) -> float:
+    """Retry-After when Notion sends one (429), else capped exponential backoff."""
+    if response is not None:
+        try:
+            return min(BACKOFF_CAP_SECONDS, float(response.headers.get('Retry-After', '')))
+        except ValueError:
+            pass
+    delay = min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+    return delay * random.uniform(1.0, 1.2)
+
+
+def _request(method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+    """JSON body of one Notion API call. Raises NotionError."""
+    url = f"{NOTION_API_BASE}{path}"
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            response = _get_session().request(method, url, json=payload, timeout=REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == MAX_ATTEMPTS:
+                raise NotionError(f"{method} {path}: {e}")
+            time.sleep(_retry_delay(attempt))
+            continue
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code in (429, 500, 502, 503, 504) and attempt < MAX_ATTEMPTS:
+            delay = _retry_delay(attempt, response if response.status_code == 429 else None)
+            print(f"Notion API {response.status_code} on {path}, retry in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        raise NotionError(f"{response.status_code} - {response.text[:300]}")
+
+
+def query_pages(database_id: str, filter_obj: Optional[Dict] = None,
+                sorts: Optional[List] = None) -> List[Dict]:
+    """Every page of a database query, following cursors. Raises NotionError,
+    so a caller can tell "no rows" from "Notion unavailable"."""
+    payload = {"page_size": 100}
     if filter_obj:
         payload["filter"] = filter_obj
     if sorts:
         payload["sorts"] = sorts
-    
+
     all_results = []
-    has_more = True
-    start_cursor = None
-    
-    while has_more:
-        if start_cursor:
-            payload["start_cursor"] = start_cursor
-        
-        response = requests.post(url, headers=HEADERS, json=payload)
-        
-        if response.status_code != 200:
-            print(f"Notion API error: {response.status_code} - {response.text}")
-            return []
-        
-        data = response.json()
+    while True:
+        data = _request("POST", f"/databases/{database_id}/query", payload)
         all_results.extend(data.get("results", []))
-        has_more = data.get("has_more", False)
-        start_cursor = data.get("next_cursor")
-    
-    return all_results
+        if not data.get("has_more") or not data.get("next_cursor"):
+            return all_results
+        payload["start_cursor"] = data["next_cursor"]
+
+
+def _query_database(database_id: str, filter_obj: Optional[Dict] = None, sorts: Optional[List] = None) -> List[Dict]:
+    """Query a Notion database with optional filter and sorts."""
+    try:
+        return query_pages(database_id, filter_obj, sorts)
+    except NotionError as e:
+        print(f"Notion API error: {e}")
+        return []
 
 
 def _get_page(page_id: str) -> Optional[Dict]:
     """Get a single Notion page by ID."""
-    url = f"https://api.notion.com/v1/pages/{page_id}"
-    response = requests.get(url, headers=HEADERS)
-    
-    if response.status_code != 200:
-        print(f"Notion API error: {response.status_code} - {response.text}")
+    try:
+        return _request("GET", f"/pages/{page_id}")
+    except NotionError as e:
+        print(f"Notion API error: {e}")
         return None
-    
-    return response.json()
 
 
 def _extract_property(prop: Dict) -> Any:
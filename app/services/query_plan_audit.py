@@ -0,0 +1,749 @@
+"""
+Query-plan audit for the SQL the app issues. READ-ONLY against the live DB.
+
+  1. collect  every SQL string passed to execute()/executemany() under
+              app/routes and app/services (ast; f-string and .format()
+              holes become ?, simple `query = ...; query += ...` built in
+              the same function are followed). Migrations and seed scripts
+              are skipped.
+  2. explain  EXPLAIN QUERY PLAN each one against a COPY of the database,
+              inflated with synthetic history: --inflate N adds N
+              date-shifted copies of substitute_request, absence,
+              duty_roster, attendance and attendance_entry.
+  3. flag     on tables with >= --min-rows rows:
+                SCAN      full table / full index scan
+                TEMP      temp B-tree for ORDER BY / GROUP BY / DISTINCT
+                AUTO      SQLite builds an automatic index per statement
+                PARTIAL   SEARCH on a non-unique index that uses fewer
+                          equality columns than the statement constrains
+  4. suggest  a composite index per flagged (table, predicate): equality
+              columns in statement order, then one range column.
+              CURATED_INDEXES (hand-picked from the hot paths) are always
+              taken; a suggestion is kept only if creating it on the copy
+              removes a flag, and dropped if an existing index already
+              starts with its columns.
+  5. prune    non-unique indexes whose columns are a prefix of another
+              index on the same table (the longer one serves every lookup
+              the shorter one did) are dropped on the copy.
+  6. time     HOT_QUERIES (with real parameter values sampled from the
+              copy) before and after, and re-count the flags.
+  7. cost     per table: indexes and triggers every INSERT maintains, and
+              the median time of a batch of WRITE_SAMPLE inserts (copies of
+              existing rows, rolled back), before and after.
+
+Run in Render Shell from ~/project/src:
+    python3 -m app.services.query_plan_audit
+    python3 -m app.services.query_plan_audit --inflate 30 --verbose
+    python3 -m app.services.query_plan_audit --write-migration
+
+--write-migration writes app/services/apply_migration_NNN.py (next free
+number) with CREATE INDEX IF NOT EXISTS for every recommendation and DROP
+INDEX IF EXISTS for every index it makes redundant; review it and add it
+to MIGRATION_STEPS in db.py.
+"""
+
+import ast
+import os
+import re
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+APP_ROOT = Path(__file__).resolve().parent.parent
+SCAN_DIRS = ('routes', 'services')
+SKIP_FILES = re.compile(r'^(apply_migration_|seed_|migrate_|run_migrations|query_plan_audit)')
+
+# (table, columns, name) - the composite indexes the hot paths need regardless
+# of what the heuristic finds:
+#   substitute_request  per-date assigned / overview (tenant_id is left out:
+#                       one tenant, and a tenant-first twin cannot serve the
+#                       statements that filter on request_date alone)
+#   absence             live absences overlapping a date
+#   duty_roster         same-day and weekly duty blocks, replacements
+#   learner_subject     class+subject enrolment (class register, who's out)
+#   attendance_entry    absentees per register
+CURATED_INDEXES = [
+    ('substitute_request', ('request_date', 'status', 'substitute_id'),
+     'idx_substitute_request_request_date_status_substitute_id'),
+    ('absence', ('tenant_id', 'status', 'absence_date', 'end_date'),
+     'idx_absence_tenant_status_dates'),
+    ('duty_roster', ('tenant_id', 'duty_type', 'duty_date', 'replacement_id'),
+     'idx_duty_tenant_type_date_repl'),
+    ('learner_subject', ('tenant_id', 'class_name', 'subject', 'is_active'),
+     'idx_learner_subject_tenant_class_subject'),
+    ('attendance_entry', ('attendance_id', 'status'),
+     'idx_entry_attendance_status'),
+]
+_CURATED_NAMES = {(table, cols): name for table, cols, name in CURATED_INDEXES}
+
+# table -> (id-like columns suffixed per copy, date columns shifted per copy)
+INFLATE = {
+    'absence': (('id',), ('absence_date', 'end_date')),
+    'substitute_request': (('id', 'absence_id'), ('request_date',)),
+    'duty_roster': (('id',), ('duty_date',)),
+    'attendance': (('id',), ('date',)),
+    'attendance_entry': (('id', 'attendance_id'), ()),
+}
+
+# Tables whose insert cost is timed (the ones the app writes per request).
+WRITE_TABLES = ('substitute_request', 'absence', 'attendance_entry',
+                'attendance', 'duty_roster')
+WRITE_SAMPLE = 200
+
+# label -> (sql, sampler): sampler returns one parameter tuple from the copy.
+HOT_QUERIES = {
+    'assigned on date': (
+        """SELECT DISTINCT substitute_id FROM substitute_request
+           WHERE request_date = ? AND status IN ('Assigned', 'Confirmed')
+             AND substitute_id IS NOT NULL""",
+        "SELECT request_date FROM substitute_request ORDER BY request_date DESC LIMIT 1"),
+    'burden window (reference SQL)': (
+        """SELECT substitute_id, COUNT(*) AS c FROM substitute_request
+           WHERE tenant_id = 'MARAGON' AND status IN ('Assigned', 'Confirmed')
+             AND substitute_id IS NOT NULL
+             AND request_date > date(?, '-28 day') AND request_date <= ?
+           GROUP BY substitute_id""",
+        "SELECT request_date, request_date FROM substitute_request ORDER BY request_date DESC LIMIT 1"),
+    'absent staff on date': (
+        """SELECT DISTINCT staff_id FROM absence
+           WHERE absence_date <= ? AND COALESCE(end_date, absence_date) >= ?
+             AND status IN ('Reported', 'Covered', 'Partial')""",
+        "SELECT absence_date, absence_date FROM absence ORDER BY absence_date DESC LIMIT 1"),
+    'overview absences': (
+        """SELECT a.id FROM absence a
+           WHERE a.tenant_id = 'MARAGON' AND a.absence_date <= ?
+             AND (COALESCE(a.end_date, a.absence_date) >= ? OR a.is_open_ended = 1)
+             AND a.status NOT IN ('Resolved', 'Cancelled')""",
+        "SELECT absence_date, absence_date FROM absence ORDER BY absence_date DESC LIMIT 1"),
+    'same-day duty block': (
+        """SELECT staff_id AS sid FROM duty_roster
+           WHERE tenant_id = 'MARAGON' AND duty_type = ? AND duty_date = ?
+           UNION
+           SELECT replacement_id AS sid FROM duty_roster
+           WHERE tenant_id = 'MARAGON' AND duty_type = ? AND duty_date = ?
+             AND replacement_id IS NOT NULL""",
+        """SELECT COALESCE(duty_type, 'terrain'), duty_date, COALESCE(duty_type, 'terrain'), duty_date
+           FROM duty_roster ORDER BY duty_date DESC LIMIT 1"""),
+    'class register enrolment': (
+        """SELECT l.id FROM learner_subject ls JOIN learner l ON ls.learner_id = l.id
+           WHERE ls.class_name = ? AND ls.subject = ? AND ls.is_active = 1
+             AND ls.tenant_id = 'MARAGON'""",
+        "SELECT class_name, subject FROM learner_subject LIMIT 1"),
+    'absentees per register': (
+        """SELECT learner_id FROM attendance_entry
+           WHERE attendance_id = ? AND status = 'Absent'""",
+        "SELECT attendance_id FROM attendance_entry LIMIT 1"),
+}
+
+_KEYWORDS = {'where', 'on', 'join', 'left', 'inner', 'outer', 'cross', 'group',
+             'order', 'limit', 'using', 'set', 'natural', 'union', 'as', 'having',
+             'values', 'select', 'and', 'or'}
+
+
+# ---------------------------------------------------------------- collect
+
+def _render(node, assigns):
+    """SQL text for an AST expression, or None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(str(value.value))
+            else:
+                parts.append('?')
+        return ''.join(parts)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _render(node.left, assigns), _render(node.right, assigns)
+        if left is not None and right is not None:
+            return left + right
+        return None
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr == 'format'):
+        base = _render(node.func.value, assigns)
+        return re.sub(r'\{[^{}]*\}', '?', base) if base is not None else None
+    if isinstance(node, ast.Name):
+        return assigns.get(node.id)
+    return None
+
+
+def _function_assigns(func):
+    """name -> SQL text from `x = "..."` and `x += "..."` in one function."""
+    assigns = {}
+    for node in ast.walk(func):
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+                and isinstance(node.targets[0], ast.Name):
+            text = _render(node.value, assigns)
+            if text is not None and node.targets[0].id not in assigns:
+                assigns[node.targets[0].id] = text
+        elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name) \
+                and isinstance(node.op, ast.Add) and node.target.id in assigns:
+            text = _render(node.value, assigns)
+            if text is not None:
+                assigns[node.target.id] += text
+    return assigns
+
+
+def _is_query(sql):
+    head = sql.strip().split(None, 1)[0].upper() if sql.strip() else ''
+    if head in ('SELECT', 'WITH', 'UPDATE', 'DELETE'):
+        return True
+    return head in ('INSERT', 'REPLACE') and 'SELECT' in sql.upper()
+
+
+def collect_statements(root=APP_ROOT):
+    """[(location, sql)] for every query statement under routes/services,
+    plus the count of execute() calls whose SQL could not be resolved."""
+    statements, unresolved = [], 0
+    for sub in SCAN_DIRS:
+        for path in sorted((root / sub).glob('*.py')):
+            if SKIP_FILES.match(path.name):
+                continue
+            tree = ast.parse(path.read_text(), filename=str(path))
+            funcs = [n for n in ast.walk(tree)
+                     if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            for func in [tree] + funcs:
+                assigns = _function_assigns(func) if func is not tree else {}
+                body = func.body if func is not tree else [
+                    n for n in tree.body
+                    if not isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+                for stmt in body:
+                    for node in ast.walk(stmt):
+                        if not (isinstance(node, ast.Call)
+                                and isinstance(node.func, ast.Attribute)
+                                and node.func.attr in ('execute', 'executemany')
+                                and node.args):
+                            continue
+                        sql = _render(node.args[0], assigns)
+                        if sql is None:
+                            unresolved += 1
+                            continue
+                        if _is_query(sql):
+                            where = f"{path.relative_to(root.parent)}:{node.lineno}"
+                            statements.append((where, ' '.join(sql.split())))
+    # Nested functions are walked from their parent too: keep one of each.
+    seen, unique = set(), []
+    for where, sql in statements:
+        if (where, sql) not in seen:
+            seen.add((where, sql))
+            unique.append((where, sql))
+    return unique, unresolved
+
+
+# ---------------------------------------------------------------- database
+
+def make_audit_db(source, inflate):
+    """Copy `source` to a temp file and add `inflate` date-shifted copies of
+    the history tables. Returns the temp path."""
+    fd, path = tempfile.mkstemp(prefix='plan_audit_', suffix='.db')
+    os.close(fd)
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(path)
+    src.backup(dst)
+    src.close()
+    dst.row_factory = sqlite3.Row
+    tables = {r['name'] for r in dst.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, (id_cols, date_cols) in INFLATE.items():
+        if table not in tables or inflate <= 0:
+            continue
+        cols = [r['name'] for r in dst.execute(f"PRAGMA table_info({table})")]
+        span = 35
+        if date_cols:
+            row = dst.execute(
+                f"SELECT julianday(MAX({date_cols[0]})) - julianday(MIN({date_cols[0]})) AS d "
+                f"FROM {table}").fetchone()
+            span = max(7, int(row['d'] or 0) + 7)
+        for k in range(1, inflate + 1):
+            exprs = []
+            for col in cols:
+                if col in id_cols:
+                    exprs.append(f"{col} || '~{k}'")
+                elif col in date_cols:
+                    exprs.append(f"date({col}, '-{k * span} day')")
+                else:
+                    exprs.append(col)
+            dst.execute(f"INSERT OR IGNORE INTO {table} ({', '.join(cols)}) "
+                        f"SELECT {', '.join(exprs)} FROM {table} WHERE {id_cols[0]} NOT LIKE '%~%'")
+    dst.commit()
+    dst.close()
+    return path
+
+
+def _table_sizes(conn):
+    return {r[0]: conn.execute(f'SELECT COUNT(*) FROM "{r[0]}"').fetchone()[0]
+            for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                  "AND name NOT LIKE 'sqlite_%'")}
+
+
+def _table_columns(conn, table):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _existing_indexes(conn):
+    """table -> [column tuple, ...], and the set of unique index names."""
+    out, unique = {}, set()
+    for (name, table) in conn.execute(
+            "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"):
+        cols = tuple(r[2] for r in conn.execute(f'PRAGMA index_info("{name}")'))
+        out.setdefault(table, []).append(cols)
+    for table in out:
+        for row in conn.execute(f'PRAGMA index_list("{table}")'):
+            if row[2]:
+                unique.add(row[1])
+    return out, unique
+
+
+def redundant_indexes(conn):
+    """[(name, table, cols, kept_name)] for non-unique, non-partial indexes
+    whose columns are a prefix of (or equal to) another non-partial index on
+    the same table. Of two identical indexes the later name is reported."""
+    found = []
+    tables = [r[0] for r in conn.execute(
+        "SELECT DISTINCT tbl_name FROM sqlite_master WHERE type = 'index'")]
+    for table in tables:
+        indexes = []
+        for row in conn.execute(f'PRAGMA index_list("{table}")'):
+            name, unique, partial = row[1], row[2], row[4]
+            cols = tuple(r[2] for r in conn.execute(f'PRAGMA index_info("{name}")'))
+            indexes.append((name, cols, bool(unique), bool(partial)))
+        for name, cols, unique, partial in indexes:
+            if unique or partial:
+                continue
+            for other, other_cols, _, other_partial in sorted(indexes):
+                if other == name or other_partial or other_cols[:len(cols)] != cols:
+                    continue
+                if len(other_cols) > len(cols) or other < name:
+                    found.append((name, table, cols, other))
+                    break
+    return found
+
+
+def write_cost(conn, tables=WRITE_TABLES, sample=WRITE_SAMPLE, repeat=5):
+    """table -> {'indexes', 'triggers', 'insert_ms'}: what every INSERT
+    maintains, and the median time to insert `sample` copies of existing
+    rows (inside a savepoint that is rolled back). insert_ms is None when
+    the table is empty or the copy violates a constraint."""
+    cost = {}
+    for table in tables:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (table,)).fetchone():
+            continue
+        indexes = len(conn.execute(f'PRAGMA index_list("{table}")').fetchall())
+        triggers = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?",
+            (table,)).fetchone()[0]
+        cols = _table_columns(conn, table)
+        exprs = ', '.join(f"{c} || '~w'" if c == 'id' else c for c in cols)
+        sql = (f"INSERT INTO {table} ({', '.join(cols)}) "
+               f"SELECT {exprs} FROM {table} LIMIT {sample}")
+        runs = []
+        try:
+            if conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]:
+                for _ in range(repeat):
+                    conn.execute("SAVEPOINT write_cost")
+                    started = time.perf_counter()
+                    conn.execute(sql)
+                    runs.append((time.perf_counter() - started) * 1000)
+                    conn.execute("ROLLBACK TO write_cost")
+                    conn.execute("RELEASE write_cost")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK TO write_cost")
+            conn.execute("RELEASE write_cost")
+            runs = []
+        cost[table] = {'indexes': indexes, 'triggers': triggers,
+                       'insert_ms': statistics.median(runs) if runs else None}
+    return cost
+
+
+# ---------------------------------------------------------------- explain
+
+def _strip_literals(sql):
+    return re.sub(r"'(?:[^']|'')*'", "''", sql)
+
+
+def _params(sql):
+    bare = _strip_literals(sql)
+    named = re.findall(r'(?<![:\w]):([A-Za-z_]\w*)', bare)
+    if named:
+        return {name: None for name in named}
+    return [None] * bare.count('?')
+
+
+def explain(conn, sql):
+    """EXPLAIN QUERY PLAN detail strings, or raises sqlite3.Error."""
+    return [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, _params(sql))]
+
+
+def _aliases(sql, tables):
+    """alias -> table for FROM/JOIN/UPDATE/INTO clauses."""
+    mapping = {}
+    for table, alias in re.findall(
+            r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.I):
+        if table not in tables:
+            continue
+        mapping[table] = table
+        if alias and alias.lower() not in _KEYWORDS:
+            mapping[alias] = table
+    return mapping
+
+
+_CLAUSE = re.compile(
+    r'\b(?:WHERE|ON)\b(.*?)(?=\b(?:GROUP\s+BY|ORDER\s+BY|LIMIT|HAVING|UNION|SELECT|FROM'
+    r'|(?:LEFT\s+|INNER\s+|CROSS\s+)?JOIN)\b|$)', re.I | re.S)
+_PREDICATE = re.compile(
+    r'(?<![\w.])(?:(\w+)\.)?(\w+)\s*(=|IN\b|IS\s+NOT\s+NULL|IS\b|<=|>=|<|>|BETWEEN\b)', re.I)
+
+
+def _predicates(sql, table, columns, aliases, other_columns):
+    """(equality columns, range columns) the WHERE / ON clauses put on one
+    table, in statement order. Unqualified names that also exist on another
+    table in the statement are left out."""
+    text = ' '.join(_CLAUSE.findall(_strip_literals(sql)))
+    eq, rng = [], []
+    for qualifier, col, op in _PREDICATE.findall(text):
+        if col not in columns:
+            continue
+        if qualifier and aliases.get(qualifier) != table:
+            continue
+        if not qualifier and col in other_columns:
+            continue
+        if op.upper() in ('=', 'IN', 'IS'):
+            if col not in eq:
+                eq.append(col)
+        elif col not in rng:
+            rng.append(col)
+    return eq, [c for c in rng if c not in eq]
+
+
+_PLAN_ROW = re.compile(
+    r'(SCAN|SEARCH) (\w+)(?: USING (AUTOMATIC )?(?:COVERING |PARTIAL )*INDEX (\w+)?(?: \((.*)\))?)?')
+
+
+def audit(conn, statements, min_rows):
+    """[(where, sql, [flag strings], [(table, cols) suggestions])] for the
+    statements with at least one flag, and the count that would not EXPLAIN."""
+    sizes = _table_sizes(conn)
+    tables = set(sizes)
+    _, unique = _existing_indexes(conn)
+    columns = {}
+    results, errors = [], 0
+    for where, sql in statements:
+        try:
+            plan = explain(conn, sql)
+        except sqlite3.Error:
+            errors += 1
+            continue
+        aliases = _aliases(sql, tables)
+        involved = set(aliases.values())
+        for table in involved:
+            if table not in columns:
+                columns[table] = set(_table_columns(conn, table))
+        flags, suggestions = [], []
+        big = any(sizes.get(t, 0) >= min_rows for t in involved)
+        for detail in plan:
+            if detail.startswith('USE TEMP B-TREE'):
+                if big:
+                    flags.append('TEMP ' + detail[len('USE TEMP B-TREE '):])
+                continue
+            m = _PLAN_ROW.match(detail)
+            if not m or detail.startswith('SCAN CONSTANT') or 'PRIMARY KEY' in detail:
+                continue
+            kind, alias, automatic, index, constraint = m.groups()
+            table = aliases.get(alias, alias)
+            if sizes.get(table, 0) < min_rows or table not in columns:
+                continue
+            others = set().union(*[columns[t] for t in involved if t != table])
+            eq, rng = _predicates(sql, table, columns[table], aliases, others)
+            if automatic:
+                flags.append(f'AUTO {table} ({constraint})')
+            elif kind == 'SCAN':
+                flags.append(f'SCAN {table}' + (f' (index {index})' if index else ''))
+            elif index in unique or (constraint or '').count('=') >= len(eq):
+                continue
+            else:
+                flags.append(f'PARTIAL {table} via {index} ({constraint})')
+            cols = tuple(eq[:3] + rng[:1])
+            if cols and (table, cols) not in suggestions:
+                suggestions.append((table, cols))
+        if flags:
+            results.append((where, sql, flags, suggestions))
+    return results, errors
+
+
+def _flag_count(conn, statements, min_rows):
+    return sum(len(flags) for _w, _s, flags, _g in audit(conn, statements, min_rows)[0])
+
+
+def recommend(conn, results, min_rows):
+    """
+    CURATED_INDEXES, then the heuristic suggestions most-proposed first,
+    each kept only if it removes a flag from a statement that proposed it.
+    Anything an existing index (or an earlier pick) already starts with is
+    skipped. Picks are CREATED on the audit copy as they are chosen.
+    """
+    existing, _ = _existing_indexes(conn)
+    tables = set(_table_sizes(conn))
+    picked = []
+
+    def covered(table, cols):
+        for idx in existing.get(table, []) + [c for t, c in picked if t == table]:
+            if tuple(idx[:len(cols)]) == tuple(cols):
+                return True
+        return False
+
+    for table, cols, _name in CURATED_INDEXES:
+        if table in tables and not covered(table, cols):
+            conn.execute(create_sql(table, cols))
+            picked.append((table, cols))
+
+    proposers = {}
+    for where, sql, _flags, suggestions in results:
+        for suggestion in suggestions:
+            proposers.setdefault(suggestion, []).append((where, sql))
+    for (table, cols), statements in sorted(proposers.items(), key=lambda kv: -len(kv[1])):
+        if covered(table, cols):
+            continue
+        before = _flag_count(conn, statements, min_rows)
+        conn.execute(create_sql(table, cols))
+        if _flag_count(conn, statements, min_rows) < before:
+            picked.append((table, cols))
+        else:
+            conn.execute('DROP INDEX {}'.format(index_name(table, cols)))
+    conn.commit()
+    return picked
+
+
+def index_name(table, cols):
+    return _CURATED_NAMES.get((table, cols)) or 'idx_{}_{}'.format(table, '_'.join(cols))
+
+
+def create_sql(table, cols):
+    return 'CREATE INDEX IF NOT EXISTS {} ON {}({})'.format(
+        index_name(table, cols), table, ', '.join(cols))
+
+
+# ---------------------------------------------------------------- timing
+
+def time_hot_queries(conn, repeat=25):
+    """label -> median ms (None if the query or its sampler fails)."""
+    timings = {}
+    for label, (sql, sampler) in HOT_QUERIES.items():
+        try:
+            params = conn.execute(sampler).fetchone()
+            if params is None:
+                timings[label] = None
+                continue
+            runs = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(sql, tuple(params)).fetchall()
+                runs.append((time.perf_counter() - started) * 1000)
+            timings[label] = statistics.median(runs)
+        except sqlite3.Error:
+            timings[label] = None
+    return timings
+
+
+# ---------------------------------------------------------------- migration
+
+MIGRATION_TEMPLATE = '''"""
+Migration {num:03d}: composite indexes for the hot SQL.
+
+WHY
+---
+Generated by app/services/query_plan_audit.py, which EXPLAINs every SQL
+statement the routes and services issue against an inflated copy of the
+database and flags full scans, temp B-trees and single-column index
+searches on multi-column filters. These are the indexes it recommends:
+
+{listing}
+
+and the indexes they (or existing ones) make redundant, dropped here:
+
+{drop_listing}
+
+Idempotent: guarded by schema_version = {num}; CREATE INDEX IF NOT EXISTS,
+DROP INDEX IF EXISTS.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+INDEXES = [
+{entries}
+]
+
+DROP_INDEXES = [
+{drop_entries}
+]
+
+
+def get_db_path():
+    import os
+    default_path = Path(__file__).parent.parent / "data" / "schoolops.db"
+    return Path(os.environ.get("DATABASE_PATH", default_path))
+
+
+def apply_migration():
+    db_path = get_db_path()
+
+    if not db_path.exists():
+        print("Database doesn't exist yet, skipping migration {num:03d}")
+        return
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT version FROM schema_version WHERE version = {num}")
+    if cursor.fetchone():
+        print("Migration {num:03d} already applied")
+        conn.close()
+        return
+
+    print("Applying migration {num:03d}: composite indexes...")
+
+    try:
+        for name, table, columns in INDEXES:
+            cursor.execute("CREATE INDEX IF NOT EXISTS {{}} ON {{}}({{}})".format(
+                name, table, ", ".join(columns)))
+            print("Created index {{}}".format(name))
+
+        for name in DROP_INDEXES:
+            cursor.execute("DROP INDEX IF EXISTS {{}}".format(name))
+            print("Dropped index {{}}".format(name))
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO schema_version (version, description)
+            VALUES ({num}, 'composite indexes from query_plan_audit')
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+    conn.close()
+    print("Migration {num:03d} complete!")
+
+
+if __name__ == "__main__":
+    apply_migration()
+'''
+
+
+def write_migration(picked, dropped=(), services_dir=Path(__file__).resolve().parent):
+    numbers = [int(m.group(1)) for p in services_dir.glob('apply_migration_*.py')
+               for m in [re.match(r'apply_migration_(\d+)\.py$', p.name)] if m]
+    num = max(numbers, default=0) + 1
+    listing = '\n'.join('  {}({})'.format(table, ', '.join(cols)) for table, cols in picked)
+    entries = '\n'.join('    ({!r},\n     {!r}, {!r}),'.format(index_name(t, c), t, c)
+                        for t, c in picked)
+    drop_listing = '\n'.join('  {} ({}({}), covered by {})'.format(name, table, ', '.join(cols), kept)
+                             for name, table, cols, kept in dropped) or '  (none)'
+    drop_entries = '\n'.join('    {!r},'.format(name) for name, _t, _c, _k in dropped)
+    path = services_dir / 'apply_migration_{:03d}.py'.format(num)
+    path.write_text(MIGRATION_TEMPLATE.format(
+        num=num, listing=listing, entries=entries,
+        drop_listing=drop_listing, drop_entries=drop_entries))
+    return path
+
+
+# ---------------------------------------------------------------- main
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN audit (read-only).")
+    ap.add_argument('--db', default=os.environ.get('DATABASE_PATH', '/var/data/schoolops.db'),
+                    help="source database (copied, never written)")
+    ap.add_argument('--inflate', type=int, default=20,
+                    help="date-shifted copies of the history tables (default %(default)s)")
+    ap.add_argument('--min-rows', type=int, default=500,
+                    help="ignore plans on tables smaller than this (default %(default)s)")
+    ap.add_argument('--verbose', action='store_true', help="print every flagged statement")
+    ap.add_argument('--write-migration', action='store_true',
+                    help="write apply_migration_NNN.py with the recommended indexes")
+    args = ap.parse_args()
+
+    statements, unresolved = collect_statements()
+    print(f"statements: {len(statements)} collected, {unresolved} execute() calls unresolved")
+
+    started = time.perf_counter()
+    path = make_audit_db(args.db, args.inflate)
+    try:
+        conn = sqlite3.connect(path)
+        sizes = _table_sizes(conn)
+        big = sorted(((n, t) for t, n in sizes.items() if n >= args.min_rows), reverse=True)
+        print(f"audit db: {(time.perf_counter() - started) * 1000:.0f} ms, "
+              f"tables >= {args.min_rows} rows: " + ', '.join(f'{t}={n}' for n, t in big))
+
+        results, errors = audit(conn, statements, args.min_rows)
+        counts = {}
+        for _w, _s, flags, _g in results:
+            for flag in flags:
+                counts[flag.split()[0]] = counts.get(flag.split()[0], 0) + 1
+        print(f"\nBEFORE: {len(results)} statements flagged "
+              f"({', '.join(f'{k}={v}' for k, v in sorted(counts.items())) or 'none'}), "
+              f"{errors} not explainable")
+        if args.verbose:
+            for where, sql, flags, suggestions in results:
+                print(f"\n  {where}\n    {sql[:160]}")
+                for flag in flags:
+                    print(f"    - {flag}")
+
+        before = time_hot_queries(conn)
+        cost_before = write_cost(conn)
+        picked = recommend(conn, results, args.min_rows)
+        print("\nRECOMMENDED:")
+        for table, cols in picked:
+            print("  " + create_sql(table, cols))
+        dropped = redundant_indexes(conn)
+        for name, _table, _cols, _kept in dropped:
+            conn.execute(f"DROP INDEX {name}")
+        conn.commit()
+        print("\nREDUNDANT (prefix of another index):")
+        for name, table, cols, kept in dropped:
+            print(f"  DROP INDEX IF EXISTS {name};  -- {table}({', '.join(cols)}), covered by {kept}")
+        after = time_hot_queries(conn)
+        cost_after = write_cost(conn)
+
+        results_after, _ = audit(conn, statements, args.min_rows)
+        counts = {}
+        for _w, _s, flags, _g in results_after:
+            for flag in flags:
+                counts[flag.split()[0]] = counts.get(flag.split()[0], 0) + 1
+        print(f"\nAFTER: {len(results_after)} statements flagged "
+              f"({', '.join(f'{k}={v}' for k, v in sorted(counts.items())) or 'none'})")
+
+        print("\nHOT QUERIES (median ms, before -> after):")
+        for label in HOT_QUERIES:
+            b, a = before.get(label), after.get(label)
+            if b is None or a is None:
+                print(f"  {label:32s} n/a")
+            else:
+                print(f"  {label:32s} {b:8.3f} -> {a:8.3f}  ({b / a if a else 0:.1f}x)")
+
+        print(f"\nWRITE COST (indexes / triggers per INSERT, ms per {WRITE_SAMPLE} inserts, before -> after):")
+        for table, b in cost_before.items():
+            a = cost_after[table]
+            ms = ("n/a" if b['insert_ms'] is None or a['insert_ms'] is None
+                  else f"{b['insert_ms']:7.2f} -> {a['insert_ms']:7.2f}")
+            print(f"  {table:20s} {b['indexes']:2d} -> {a['indexes']:2d} idx  "
+                  f"{b['triggers']:2d} trg  {ms}")
+        conn.close()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    if args.write_migration and (picked or dropped):
+        print(f"\nwrote {write_migration(picked, dropped)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -25,8 +25,6 @@ CREATE TABLE IF NOT EXISTS attendance (
 );
 
 CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date);
-CREATE INDEX IF NOT EXISTS idx_attendance_mentor_group ON attendance(mentor_group_id);
-CREATE INDEX IF NOT EXISTS idx_attendance_tenant_date ON attendance(tenant_id, date);
 
 CREATE TABLE IF NOT EXISTS attendance_entry (
     id TEXT PRIMARY KEY,                    -- UUID generated in Python
@@ -41,7 +39,6 @@ CREATE TABLE IF NOT EXISTS attendance_entry (
     FOREIGN KEY (attendance_id) REFERENCES attendance(id) ON DELETE CASCADE
 );
 
-CREATE INDEX IF NOT EXISTS idx_entry_attendance ON attendance_entry(attendance_id);
 CREATE INDEX IF NOT EXISTS idx_entry_learner ON attendance_entry(learner_id);
 
 -- ============================================
@@ -65,7 +62,6 @@ CREATE TABLE IF NOT EXISTS absence (
     updated_at TEXT NOT NULL DEFAULT (datetime('now'))
 );
 
-CREATE INDEX IF NOT EXISTS idx_absence_date ON absence(absence_date);
 CREATE INDEX IF NOT EXISTS idx_absence_staff ON absence(staff_id);
 CREATE INDEX IF NOT EXISTS idx_absence_tenant_date ON absence(tenant_id, absence_date);
 
@@ -93,7 +89,6 @@ CREATE TABLE IF NOT EXISTS substitute_request (
     updated_at TEXT NOT NULL DEFAULT (datetime('now')),
     FOREIGN KEY (absence_id) REFERENCES absence(id) ON DELETE CASCADE
 );
-CREATE INDEX IF NOT EXISTS idx_subreq_absence ON substitute_request(absence_id);
 CREATE INDEX IF NOT EXISTS idx_subreq_substitute ON substitute_request(substitute_id);
 CREATE INDEX IF NOT EXISTS idx_subreq_status ON substitute_request(status);
 
@@ -212,8 +207,6 @@ CREATE TABLE IF NOT EXISTS grade (
     subject_head_of TEXT
 );
 
-CREATE INDEX IF NOT EXISTS idx_learner_mentor_group ON learner(mentor_group_id);
-CREATE INDEX IF NOT EXISTS idx_learner_tenant ON learner(tenant_id);
 CREATE INDEX IF NOT EXISTS idx_mentor_group_tenant ON mentor_group(tenant_id);
 CREATE INDEX IF NOT EXISTS idx_staff_tenant ON staff(tenant_id);
 
@@ -231,7 +224,6 @@ CREATE TABLE IF NOT EXISTS pending_attendance (
     PRIMARY KEY (mentor_group_id, learner_id, date)
 );
 
-CREATE INDEX IF NOT EXISTS idx_pending_mentor_group ON pending_attendance(mentor_group_id);
 CREATE INDEX IF NOT EXISTS idx_pending_date ON pending_attendance(date);
 -- ============================================
 -- VENUE MODULE
@@ -374,7 +366,6 @@ CREATE TABLE IF NOT EXISTS period (
     created_at TEXT NOT NULL DEFAULT (datetime('now'))
 );
 
-CREATE INDEX IF NOT EXISTS idx_period_tenant ON period(tenant_id);
 CREATE INDEX IF NOT EXISTS idx_period_sort ON period(tenant_id, sort_order);
 
 -- Timetable slots: who teaches what, when, where
@@ -395,7 +386,6 @@ CREATE TABLE IF NOT EXISTS timetable_slot (
 
 CREATE INDEX IF NOT EXISTS idx_timetable_staff ON timetable_slot(staff_id);
 CREATE INDEX IF NOT EXISTS idx_timetable_day_period ON timetable_slot(tenant_id, cycle_day, period_id);
-CREATE INDEX IF NOT EXISTS idx_timetable_tenant ON timetable_slot(tenant_id);
 
 -- Substitute configuration per tenant
 CREATE TABLE IF NOT EXISTS substitute_config (
@@ -486,7 +476,6 @@ CREATE TABLE IF NOT EXISTS terrain_area (
     created_at TEXT NOT NULL DEFAULT (datetime('now'))
 );
 
-CREATE INDEX IF NOT EXISTS idx_terrain_area_tenant ON terrain_area(tenant_id);
 CREATE INDEX IF NOT EXISTS idx_terrain_area_sort ON terrain_area(tenant_id, sort_order);
 
 CREATE TABLE IF NOT EXISTS school_calendar (
@@ -620,7 +609,6 @@ CREATE TABLE IF NOT EXISTS learner_subject (
 
 CREATE INDEX IF NOT EXISTS idx_learner_subject_learner ON learner_subject(learner_id);
 CREATE INDEX IF NOT EXISTS idx_learner_subject_class ON learner_subject(subject, class_name);
-CREATE INDEX IF NOT EXISTS idx_learner_subject_tenant ON learner_subject(tenant_id);
 
 INSERT OR IGNORE INTO schema_version (version, description) 
 VALUES (8, 'Learner subject enrollments - synthetic data from timetable');
@@ -214,6 +214,12 @@ def main():
     conn.commit()
     print(f'  Tracked {len(tracking)} learners')
 
+    print('Rebuilding attendance rollups...')
+    from app.services.attendance_rollup import rebuild
+    daily, learner_rows = rebuild(TENANT_ID, c)
+    conn.commit()
+    print(f'  {daily} daily rows, {learner_rows} learner rows')
+
     c.execute("""
         SELECT
           SUM(CASE WHEN ae.status='Present' THEN 1 ELSE 0 END) AS present,
@@ -180,7 +180,10 @@ def seed_staff_venues():
                 count += 1
         
         conn.commit()
-        return count
+    
+    from app.services.auth_cache import invalidate
+    invalidate()
+    return count
 
 
 def seed_user_sessions():
@@ -232,7 +235,10 @@ def seed_user_sessions():
                 count += 1
         
         conn.commit()
-        return count
+    
+    from app.services.auth_cache import invalidate
+    invalidate()
+    return count
 
 
 def seed_all_emergency():
@@ -406,6 +406,10 @@ def seed_all():
         learner_ids = seed_learners(cursor, mentor_groups, grade_ids)
         seed_historical_attendance(cursor, mentor_groups, learner_ids)
         
+        # The dashboards read the rollups, not attendance_entry.
+        from app.services.attendance_rollup import rebuild
+        rebuild(TENANT_ID, cursor)
+        
         conn.commit()
         
         # Return counts
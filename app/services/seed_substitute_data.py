@@ -34,7 +34,6 @@ def init_substitute_tables():
                 created_at TEXT NOT NULL DEFAULT (datetime('now'))
             )
         """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_period_tenant ON period(tenant_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_period_sort ON period(tenant_id, sort_order)")
         
         # Timetable slot table
@@ -52,7 +51,6 @@ def init_substitute_tables():
         """)
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_timetable_staff ON timetable_slot(staff_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_timetable_day_period ON timetable_slot(tenant_id, cycle_day, period_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_timetable_tenant ON timetable_slot(tenant_id)")
         
         # Substitute config table
         cursor.execute("""
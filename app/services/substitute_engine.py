@@ -4,49 +4,162 @@ The magic that auto-assigns substitutes when a teacher reports sick.
 Updated: Multi-day support + absence checking
 """
 
+import threading
 import uuid
 from datetime import datetime, date, timedelta
-from app.services.db import get_connection, sast_now
+from app.services.db import get_connection, get_data_versions, sast_now
+from app.services import timetable_index, burden_ledger
 
 TENANT_ID = "MARAGON"
-BURDEN_WINDOW_DAYS = 28  # Addendum v161a: trailing calendar-day window
+BURDEN_WINDOW_DAYS = burden_ledger.BURDEN_WINDOW_DAYS  # Addendum v161a
+
+
+# ============================================
+# CYCLE-DAY RESOLVER
+# ============================================
+#
+# Cycle day used to be found by walking every calendar day from
+# cycle_start_date to the target date (hundreds of iterations late in the
+# year, on every call). Now:
+#   - the weekday count is closed-form (_weekdays_before), and
+#   - substitute_config + school_calendar are loaded once into a snapshot,
+#     memoising each resolved date.
+# The snapshot is keyed on the data_version counters (migration 021), so
+# any write to either table - from any process - rebuilds it on next use.
+# Checking is one primary-key read.
+
+_calendar_lock = threading.Lock()
+_calendar_snapshot = None
+
+_CALENDAR_TABLES = ('school_calendar', 'substitute_config')
+
+
+def _weekdays_before(start_date, target_date):
+    """Number of Mon-Fri days in [start_date, target_date). O(1)."""
+    days = (target_date - start_date).days
+    if days <= 0:
+        return 0
+    full_weeks, remainder = divmod(days, 7)
+    count = full_weeks * 5
+    first = start_date.weekday()
+    for i in range(remainder):
+        if (first + i) % 7 < 5:
+            count += 1
+    return count
+
+
+def _load_calendar_snapshot(cursor, versions):
+    cursor.execute("""
+        SELECT cycle_start_date, cycle_length
+        FROM substitute_config
+        WHERE tenant_id = ?
+    """, (TENANT_ID,))
+    row = cursor.fetchone()
+    if row and row['cycle_start_date']:
+        cycle_start = datetime.strptime(row['cycle_start_date'], '%Y-%m-%d').date()
+        cycle_length = row['cycle_length'] or 7
+    else:
+        cycle_start, cycle_length = None, 7
+
+    cursor.execute("""
+        SELECT date, cycle_day, day_type, bell_schedule, day_name
+        FROM school_calendar
+        WHERE tenant_id = ?
+    """, (TENANT_ID,))
+    calendar = {r['date']: (r['cycle_day'], r['day_type'],
+                            r['bell_schedule'], r['day_name'])
+                for r in cursor.fetchall()}
+
+    return {
+        'versions': versions,
+        'cycle_start': cycle_start,
+        'cycle_length': cycle_length,
+        'calendar': calendar,
+        'cycle_days': {},
+    }
+
+
+def _get_calendar_snapshot():
+    """Current calendar snapshot, rebuilt only when a watched table changed."""
+    global _calendar_snapshot
+    with get_connection() as conn:
+        versions = get_data_versions(conn, _CALENDAR_TABLES)
+        snapshot = _calendar_snapshot
+        if (snapshot is not None and versions is not None
+                and snapshot['versions'] == versions):
+            return snapshot
+        with _calendar_lock:
+            snapshot = _load_calendar_snapshot(conn.cursor(), versions)
+            _calendar_snapshot = snapshot
+        return snapshot
+
+
+def invalidate_calendar_cache():
+    """Drop the calendar snapshot (in-process writers, tests)."""
+    global _calendar_snapshot
+    _calendar_snapshot = None
+
+
+def _to_date(target_date):
+    if target_date is None:
+        return date.today()
+    if isinstance(target_date, str):
+        return datetime.strptime(target_date, '%Y-%m-%d').date()
+    return target_date
+
+
+def _snapshot_cycle_day(snapshot, target_date):
+    memo = snapshot['cycle_days']
+    cycle_day = memo.get(target_date)
+    if cycle_day is None:
+        days_diff = _weekdays_before(snapshot['cycle_start'], target_date)
+        cycle_day = (days_diff % snapshot['cycle_length']) + 1
+        memo[target_date] = cycle_day
+    return cycle_day
 
 
 def get_cycle_day(target_date=None):
     """
     Calculate which cycle day (1-7) a given date is.
-    Based on cycle_start_date in substitute_config.
+    Based on cycle_start_date in substitute_config: weekdays elapsed since
+    the start, modulo cycle_length.
     """
-    if target_date is None:
-        target_date = date.today()
-    elif isinstance(target_date, str):
-        target_date = datetime.strptime(target_date, '%Y-%m-%d').date()
-    
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT cycle_start_date, cycle_length 
-            FROM substitute_config 
-            WHERE tenant_id = ?
-        """, (TENANT_ID,))
-        row = cursor.fetchone()
-        
-        if not row or not row['cycle_start_date']:
-            return 3  # Default to Day 3 for demo
-        
-        start_date = datetime.strptime(row['cycle_start_date'], '%Y-%m-%d').date()
-        cycle_length = row['cycle_length'] or 7
-        
-        # Count weekdays between start and target
-        days_diff = 0
-        current = start_date
-        while current < target_date:
-            if current.weekday() < 5:  # Monday = 0, Friday = 4
-                days_diff += 1
-            current = datetime.fromordinal(current.toordinal() + 1).date()
-        
-        cycle_day = (days_diff % cycle_length) + 1
-        return cycle_day
+    target_date = _to_date(target_date)
+    snapshot = _get_calendar_snapshot()
+    if snapshot['cycle_start'] is None:
+        return 3  # Default to Day 3 for demo
+    return _snapshot_cycle_day(snapshot, target_date)
+
+
+def resolve_day(target_date=None):
+    """
+    Return (cycle_day, day_type, bell_schedule, day_name) for a date.
+    school_calendar is authoritative; dates outside the seeded calendar
+    fall back to get_cycle_day plus the weekday bell pattern.
+    Canonical resolution shared by duty.my_day and timetables.
+    """
+    target_date = _to_date(target_date)
+    snapshot = _get_calendar_snapshot()
+    cal_row = snapshot['calendar'].get(target_date.isoformat())
+    if cal_row:
+        return cal_row
+
+    if snapshot['cycle_start'] is None:
+        cycle_day = 3  # Default to Day 3 for demo
+    else:
+        cycle_day = _snapshot_cycle_day(snapshot, target_date)
+    weekday = target_date.weekday()
+    day_type = 'academic' if weekday < 5 else 'weekend'
+    if weekday in [0, 2]:
+        bell_schedule = 'type_a'
+    elif weekday in [1, 3]:
+        bell_schedule = 'type_b'
+    elif weekday == 4:
+        bell_schedule = 'type_c'
+    else:
+        bell_schedule = 'none'
+    day_name = f"D{cycle_day}" if cycle_day else None
+    return (cycle_day, day_type, bell_schedule, day_name)
 
 
 def get_weekdays_between(start_date, end_date):
@@ -69,17 +182,20 @@ def get_weekdays_between(start_date, end_date):
 def get_teacher_schedule(staff_id, cycle_day):
     """Get a teacher's teaching periods for a specific cycle day."""
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT t.*, p.period_number, p.period_name, p.start_time, p.end_time,
-                   p.sort_order, v.venue_code, v.venue_name
-            FROM timetable_slot t
-            JOIN period p ON t.period_id = p.id
-            LEFT JOIN venue v ON t.venue_id = v.id
-            WHERE t.staff_id = ? AND t.cycle_day = ? AND t.tenant_id = ?
-            ORDER BY p.sort_order
-        """, (staff_id, cycle_day, TENANT_ID))
-        return [dict(row) for row in cursor.fetchall()]
+        return _load_teacher_schedule(conn.cursor(), staff_id, cycle_day)
+
+
+def _load_teacher_schedule(cursor, staff_id, cycle_day):
+    cursor.execute("""
+        SELECT t.*, p.period_number, p.period_name, p.start_time, p.end_time,
+               p.sort_order, v.venue_code, v.venue_name
+        FROM timetable_slot t
+        JOIN period p ON t.period_id = p.id
+        LEFT JOIN venue v ON t.venue_id = v.id
+        WHERE t.staff_id = ? AND t.cycle_day = ? AND t.tenant_id = ?
+        ORDER BY p.sort_order
+    """, (staff_id, cycle_day, TENANT_ID))
+    return [dict(row) for row in cursor.fetchall()]
 
 
 def get_absent_staff_on_date(target_date):
@@ -90,15 +206,18 @@ def get_absent_staff_on_date(target_date):
         target_date_str = target_date
     
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT DISTINCT staff_id 
-            FROM absence 
-            WHERE absence_date <= ? 
-              AND COALESCE(end_date, absence_date) >= ?
-              AND status IN ('Reported', 'Covered', 'Partial')
-        """, (target_date_str, target_date_str))
-        return [row['staff_id'] for row in cursor.fetchall()]
+        return _load_absent_staff(conn.cursor(), target_date_str)
+
+
+def _load_absent_staff(cursor, target_date_str):
+    cursor.execute("""
+        SELECT DISTINCT staff_id 
+        FROM absence 
+        WHERE absence_date <= ? 
+          AND COALESCE(end_date, absence_date) >= ?
+          AND status IN ('Reported', 'Covered', 'Partial')
+    """, (target_date_str, target_date_str))
+    return [row['staff_id'] for row in cursor.fetchall()]
 
 
 def get_free_teachers_for_period(period_id, cycle_day, exclude_staff_ids=None, target_date=None):
@@ -112,94 +231,17 @@ def get_free_teachers_for_period(period_id, cycle_day, exclude_staff_ids=None, t
     carries reloc_direction + home_venue_id/home_venue_code.
     Both lists sorted by first name (A-Z). Returns (pass1, pass2).
     """
-    exclude_staff_ids = exclude_staff_ids or []
-    
     # Get absent staff for this date
     if target_date is None:
         target_date = date.today()
     absent_staff = get_absent_staff_on_date(target_date)
     
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Get all teachers who CAN substitute
-        cursor.execute("""
-            SELECT id, surname, display_name, first_name 
-            FROM staff 
-            WHERE tenant_id = ? AND is_active = 1 AND can_substitute = 1
-            ORDER BY first_name
-        """, (TENANT_ID,))
-        all_teachers = cursor.fetchall()
-        
-        # Get teachers who ARE teaching this period
-        cursor.execute("""
-            SELECT DISTINCT staff_id 
-            FROM timetable_slot 
-            WHERE tenant_id = ? AND cycle_day = ? AND period_id = ?
-        """, (TENANT_ID, cycle_day, period_id))
-        busy_teachers = {row['staff_id'] for row in cursor.fetchall()}
-        
-        # Get home room assignments (staff_id -> venue_id)
-        cursor.execute("""
-            SELECT staff_id, venue_id FROM staff_venue WHERE tenant_id = ?
-        """, (TENANT_ID,))
-        home_rooms = {row['staff_id']: row['venue_id'] for row in cursor.fetchall()}
-        
-        # Get rooms occupied by OTHER teachers this period
-        cursor.execute("""
-            SELECT DISTINCT venue_id 
-            FROM timetable_slot 
-            WHERE tenant_id = ? AND cycle_day = ? AND period_id = ? AND venue_id IS NOT NULL
-        """, (TENANT_ID, cycle_day, period_id))
-        occupied_rooms = {row['venue_id'] for row in cursor.fetchall()}
-        
-        # Home-room venue codes (for LEARNERS_MOVE destination denormalisation)
-        cursor.execute("""
-            SELECT sv.staff_id, v.venue_code
-            FROM staff_venue sv JOIN venue v ON sv.venue_id = v.id
-            WHERE sv.tenant_id = ?
-        """, (TENANT_ID,))
-        home_codes = {row['staff_id']: row['venue_code'] for row in cursor.fetchall()}
-
-        # Bucket every eligible teacher (R2 gates): pass1 = room-free + floaters,
-        # pass2 = room-blocked (reconsidered as SUB_MOVES last-resort, R3/R3a).
-        pass1 = []
-        pass2 = []
-        for teacher in all_teachers:
-            teacher_id = teacher['id']
-
-            # Skip if teaching
-            if teacher_id in busy_teachers:
-                continue
-
-            # Skip if explicitly excluded
-            if teacher_id in exclude_staff_ids:
-                continue
-
-            # Skip if absent/sick
-            if teacher_id in absent_staff:
-                continue
-
-            t = dict(teacher)
-            home_room = home_rooms.get(teacher_id)
-            t['home_venue_id'] = home_room
-            t['home_venue_code'] = home_codes.get(teacher_id)
-
-            if home_room is None:
-                # Floater: no home room -> SUB_MOVES (R7), Pass 1 rotation.
-                t['reloc_direction'] = 'SUB_MOVES'
-                pass1.append(t)
-            elif home_room in occupied_rooms:
-                # Room-blocked -> Pass 2 pool, SUB_MOVES last-resort (R3).
-                t['reloc_direction'] = 'SUB_MOVES'
-                pass2.append(t)
-            else:
-                # Room-free with home room -> LEARNERS_MOVE (R1).
-                t['reloc_direction'] = 'LEARNERS_MOVE'
-                pass1.append(t)
-
-        return pass1, pass2
-
+    # Teaching / room occupancy / eligibility / home rooms come from the
+    # timetable index: the pools are bit operations, not queries.
+    index = timetable_index.get_index()
+    return index.free_pools(cycle_day, period_id,
+                            exclude_mask=index.mask_of(exclude_staff_ids),
+                            absent_mask=index.mask_of(absent_staff))
 
 
 def get_teachers_assigned_on_date(target_date):
@@ -208,13 +250,30 @@ def get_teachers_assigned_on_date(target_date):
         target_date = target_date.isoformat()
     
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT DISTINCT substitute_id 
-            FROM substitute_request 
-            WHERE request_date = ? AND status IN ('Assigned', 'Confirmed') AND substitute_id IS NOT NULL
-        """, (target_date,))
-        return [row['substitute_id'] for row in cursor.fetchall()]
+        return _load_assigned_on_date(conn.cursor(), target_date)
+
+
+def _load_assigned_on_date(cursor, target_date_str):
+    cursor.execute("""
+        SELECT DISTINCT substitute_id 
+        FROM substitute_request 
+        WHERE request_date = ? AND status IN ('Assigned', 'Confirmed') AND substitute_id IS NOT NULL
+    """, (target_date_str,))
+    return [row['substitute_id'] for row in cursor.fetchall()]
+
+
+def _burden_ratios(free, covered):
+    return {sid: ((covered.get(sid, 0) / f) if f > 0 else float('inf'))
+            for sid, f in free.items()}
+
+
+def _pick_lowest_burden(candidates, ratios):
+    """Lowest burden ratio; tie-break first name A-Z."""
+    return min(
+        candidates,
+        key=lambda t: (ratios.get(t['id'], float('inf')),
+                       (t['first_name'] or '').upper()),
+    )
 
 
 def get_burden_ratios(target_date=None):
@@ -229,47 +288,16 @@ def get_burden_ratios(target_date=None):
     - Denominator: teaching periods x cycle length minus the teacher's
       timetable slots, derived from the DB (nothing hardcoded).
     - free <= 0 ranks last (inf). Unknown ids rank last (inf).
+    Both sides come from the burden ledger (burden_ledger.py): cached
+    denominators and the per-day cover counts of migration 028.
     """
     if target_date is None:
         target_date = date.today()
     if isinstance(target_date, date):
         target_date = target_date.isoformat()
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) AS c FROM period
-            WHERE tenant_id = ? AND is_teaching = 1
-        """, (TENANT_ID,))
-        teaching_periods = cursor.fetchone()['c']
-        cursor.execute("""
-            SELECT cycle_length FROM substitute_config WHERE tenant_id = ?
-        """, (TENANT_ID,))
-        row = cursor.fetchone()
-        cycle_len = row['cycle_length'] if row and row['cycle_length'] else 7
-        slots_per_cycle = teaching_periods * cycle_len
-        cursor.execute("""
-            SELECT s.id, COALESCE(t.c, 0) AS taught
-            FROM staff s
-            LEFT JOIN (
-                SELECT staff_id, COUNT(*) AS c FROM timetable_slot
-                WHERE tenant_id = ? GROUP BY staff_id
-            ) t ON t.staff_id = s.id
-            WHERE s.tenant_id = ? AND s.is_active = 1 AND s.can_substitute = 1
-        """, (TENANT_ID, TENANT_ID))
-        free = {r['id']: slots_per_cycle - r['taught'] for r in cursor.fetchall()}
-        cursor.execute("""
-            SELECT substitute_id, COUNT(*) AS c FROM substitute_request
-            WHERE tenant_id = ?
-              AND status IN ('Assigned', 'Confirmed')
-              AND substitute_id IS NOT NULL
-              AND request_date > date(?, ?)
-              AND request_date <= ?
-            GROUP BY substitute_id
-        """, (TENANT_ID, target_date, '-' + str(BURDEN_WINDOW_DAYS) + ' day',
-              target_date))
-        covered = {r['substitute_id']: r['c'] for r in cursor.fetchall()}
-    return {sid: ((covered.get(sid, 0) / f) if f > 0 else float('inf'))
-            for sid, f in free.items()}
+        free, covered = burden_ledger.load(conn, target_date)
+    return _burden_ratios(free, covered)
 
 
 def get_next_substitute(period_id, cycle_day, already_assigned_today, pointer_surname, target_date=None, pass_num=1):
@@ -294,11 +322,7 @@ def get_next_substitute(period_id, cycle_day, already_assigned_today, pointer_su
         return None, pointer_surname
 
     ratios = get_burden_ratios(target_date)
-    teacher = min(
-        free_teachers,
-        key=lambda t: (ratios.get(t['id'], float('inf')),
-                       (t['first_name'] or '').upper()),
-    )
+    teacher = _pick_lowest_burden(free_teachers, ratios)
     return teacher, pointer_surname
 
 
@@ -420,14 +444,16 @@ def log_event(absence_id, event_type, staff_id=None, details=None, substitute_re
 
 
 def update_pointer(new_pointer):
-    """Update the A-Z rotation pointer."""
+    """Update the A-Z rotation pointer. No write (and no data_version bump
+    for the substitute_config caches) when it is unchanged."""
     with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE substitute_config 
             SET pointer_surname = ?, pointer_updated_at = ?, updated_at = ?
-            WHERE tenant_id = ?
-        """, (new_pointer, datetime.now().isoformat(), datetime.now().isoformat(), TENANT_ID))
+            WHERE tenant_id = ? AND pointer_surname IS NOT ?
+        """, (new_pointer, datetime.now().isoformat(), datetime.now().isoformat(),
+              TENANT_ID, new_pointer))
         conn.commit()
 
 
@@ -463,6 +489,13 @@ def _replace_relocation(cursor, request_id, direction, dest_venue_id, dest_venue
     _write_relocation(cursor, request_id, direction, dest_venue_id, dest_venue_code)
 
 
+def _queue_log(log_rows, absence_id, event_type, staff_id=None, details=None,
+               substitute_request_id=None):
+    """Buffer a substitute_log row (same shape as log_event) for one executemany."""
+    log_rows.append((str(uuid.uuid4()), TENANT_ID, absence_id, substitute_request_id,
+                     event_type, staff_id, details, datetime.now().isoformat()))
+
+
 def process_absence(absence_id):
     """
     Main allocation engine - process a reported absence.
@@ -476,6 +509,15 @@ def process_absence(absence_id):
     3. Log everything for Substitute Overview
     4. Return results for display
     
+    Batch mode: burden denominators are read once per absence; absences,
+    today's assignees and burden numerators once per date; teaching, room
+    occupancy, eligibility and home rooms come from the timetable index.
+    Every period is then allocated in memory with
+    the same Pass 1/Pass 2, burden-ratio and tie-break rules as
+    get_next_substitute, and all substitute_request, assignment_relocation
+    and substitute_log rows land in ONE transaction (nothing is written if
+    allocation fails part-way).
+    
     Returns dict with allocation results.
     """
     results = {
@@ -486,6 +528,7 @@ def process_absence(absence_id):
         'pointer_end': None,
         'success': False
     }
+    log_rows = []
     
     with get_connection() as conn:
         cursor = conn.cursor()
@@ -515,7 +558,7 @@ def process_absence(absence_id):
         }
         
         # Log start
-        log_event(absence_id, 'processing_started')
+        _queue_log(log_rows, absence_id, 'processing_started')
         
         # Determine date range
         start_date = absence['absence_date']
@@ -529,20 +572,34 @@ def process_absence(absence_id):
             'total_days': len(weekdays)
         }
         
-        pointer = get_current_pointer()
+        pointer = results['pointer_start']
         total_covered = 0
         total_periods = 0
         
+        # Absence-wide allocation inputs (constant across dates)
+        index = timetable_index.get_index(conn)
+        free_periods = burden_ledger.free_periods(conn)
+        
+        # E-03 partial-day window: period sort_orders, resolved once.
+        window_sorts = {}
+        if absence['is_full_day'] == 0 and absence['start_period_id'] and absence['end_period_id']:
+            cursor.execute(
+                "SELECT id, sort_order FROM period WHERE id IN (?, ?)",
+                (absence['start_period_id'], absence['end_period_id']))
+            window_sorts = {row['id']: row['sort_order'] for row in cursor.fetchall()}
+        
+        # Days that already have requests (makes process_absence safe for extend)
+        cursor.execute("""
+            SELECT DISTINCT request_date FROM substitute_request 
+            WHERE absence_id = ? AND status IN ('Reported', 'Covered', 'Partial')
+        """, (absence_id,))
+        days_with_requests = {row['request_date'] for row in cursor.fetchall()}
+        
         # Process each day
         for target_date in weekdays:
             target_date_str = target_date.isoformat()
             
-            # Skip days that already have requests (makes process_absence safe for extend)
-            cursor.execute("""
-                SELECT COUNT(*) as cnt FROM substitute_request 
-                WHERE absence_id = ? AND request_date = ? AND status IN ('Reported', 'Covered', 'Partial')
-            """, (absence_id, target_date_str))
-            if cursor.fetchone()['cnt'] > 0:
+            if target_date_str in days_with_requests:
                 continue
             
             day_result = {
@@ -556,10 +613,10 @@ def process_absence(absence_id):
             cycle_day = day_result['cycle_day']
             
             # Get teachers already assigned on this specific date
-            already_assigned_today = get_teachers_assigned_on_date(target_date)
+            already_assigned_today = _load_assigned_on_date(cursor, target_date_str)
             
             # Teacher's teaching schedule for this cycle day (ordered by sort_order)
-            schedule = get_teacher_schedule(absence['staff_id'], cycle_day)
+            schedule = _load_teacher_schedule(cursor, absence['staff_id'], cycle_day)
             
             # === E-03 PARTIAL-DAY WINDOW RESOLUTION ===
             # Window applies ONLY to a single-day partial absence. Multi-day = full
@@ -568,18 +625,10 @@ def process_absence(absence_id):
             window_start_sort = None
             window_end_sort = None
             if (absence['is_full_day'] == 0 and is_single_day
-                    and absence['start_period_id'] and absence['end_period_id']):
-                cursor.execute(
-                    "SELECT sort_order FROM period WHERE id = ?",
-                    (absence['start_period_id'],))
-                _ws = cursor.fetchone()
-                cursor.execute(
-                    "SELECT sort_order FROM period WHERE id = ?",
-                    (absence['end_period_id'],))
-                _we = cursor.fetchone()
-                if _ws and _we:
-                    window_start_sort = _ws['sort_order']
-                    window_end_sort = _we['sort_order']
+                    and absence['start_period_id'] in window_sorts
+                    and absence['end_period_id'] in window_sorts):
+                window_start_sort = window_sorts[absence['start_period_id']]
+                window_end_sort = window_sorts[absence['end_period_id']]
             
             # First teaching slot's sort_order = threshold for "window includes register"
             first_teaching_sort = schedule[0]['sort_order'] if schedule else None
@@ -616,12 +665,11 @@ def process_absence(absence_id):
                     # absent teacher's room. R10: assigned -> one relocation row.
                     _write_relocation(cursor, request_id, 'SUB_MOVES',
                                       absence['venue_id'], absence['venue_code'])
-                    conn.commit()
                     
                     fallback_note = f" ({cover['fallback_level']})" if cover['fallback_level'] == 'grade_head' else ""
-                    log_event(absence_id, 'allocated', cover['staff_id'],
-                             f"[{target_date_str}] Mentor register {absence['mentor_class']} -> {cover['display_name']}{fallback_note}",
-                             request_id)
+                    _queue_log(log_rows, absence_id, 'allocated', cover['staff_id'],
+                               f"[{target_date_str}] Mentor register {absence['mentor_class']} -> {cover['display_name']}{fallback_note}",
+                               request_id)
                     
                     day_result['roll_call'] = {
                         'substitute': cover['display_name'],
@@ -641,11 +689,10 @@ def process_absence(absence_id):
                     """, (request_id, TENANT_ID, absence_id, None,
                           absence['mentor_group_id'], absence['mentor_class'],
                           absence['venue_code'], target_date_str))
-                    conn.commit()
                     
-                    log_event(absence_id, 'no_cover', None,
-                             f"[{target_date_str}] Mentor register {absence['mentor_class']} - no cover (backup & head absent)",
-                             request_id)
+                    _queue_log(log_rows, absence_id, 'no_cover', None,
+                               f"[{target_date_str}] Mentor register {absence['mentor_class']} - no cover (backup & head absent)",
+                               request_id)
                     
                     day_result['roll_call'] = {
                         'substitute': None,
@@ -655,7 +702,13 @@ def process_absence(absence_id):
                         'status': 'no_cover'
                     }
             
-                        # === TEACHING PERIODS ===
+            # Per-date allocation inputs, read once. Burden numerators are
+            # read AFTER the register insert so a register cover counts
+            # toward today's ratios, exactly as the per-period path did.
+            absent_mask = index.mask_of(_load_absent_staff(cursor, target_date_str))
+            covered = burden_ledger.covered_counts(cursor, target_date_str)
+            
+            # === TEACHING PERIODS ===
             for slot in schedule:
                 # E-03: skip periods outside the partial-day window (if active)
                 if (window_start_sort is not None and window_end_sort is not None
@@ -679,10 +732,9 @@ def process_absence(absence_id):
                           slot['class_name'], slot['subject'],
                           slot['venue_id'], slot['venue_code'], target_date_str,
                           slot.get('grade')))
-                    conn.commit()
-                    log_event(absence_id, 'no_cover', None,
-                             f"[{target_date_str}] {slot['period_name']}: period already ended - uncovered (late book-out)",
-                             gap_request_id)
+                    _queue_log(log_rows, absence_id, 'no_cover', None,
+                               f"[{target_date_str}] {slot['period_name']}: period already ended - uncovered (late book-out)",
+                               gap_request_id)
                     total_periods += 1
                     day_result['periods'].append({
                         'period_name': slot['period_name'],
@@ -709,17 +761,17 @@ def process_absence(absence_id):
                 
                 # Two-pass rotation (R3a): Pass 1 = room-free + floaters
                 # (LEARNERS_MOVE / floater SUB_MOVES); Pass 2 = room-blocked
-                # pool, SUB_MOVES last-resort. Same pointer, continuous
-                # advance (R3b).
-                sub_teacher, new_pointer = get_next_substitute(
-                    slot['period_id'], cycle_day, already_assigned_today, pointer,
-                    target_date=target_date, pass_num=1
-                )
-                if not sub_teacher:
-                    sub_teacher, new_pointer = get_next_substitute(
-                        slot['period_id'], cycle_day, already_assigned_today, pointer,
-                        target_date=target_date, pass_num=2
-                    )
+                # pool, SUB_MOVES last-resort. Same ranking as
+                # get_next_substitute, from the in-memory day inputs.
+                pass1, pass2 = index.free_pools(
+                    cycle_day, slot['period_id'],
+                    exclude_mask=index.mask_of(already_assigned_today),
+                    absent_mask=absent_mask)
+                free_teachers = pass1 or pass2
+                sub_teacher = None
+                if free_teachers:
+                    sub_teacher = _pick_lowest_burden(
+                        free_teachers, _burden_ratios(free_periods, covered))
 
                 if sub_teacher:
                     request_id = str(uuid.uuid4())
@@ -742,11 +794,10 @@ def process_absence(absence_id):
                     else:
                         _write_relocation(cursor, request_id, 'SUB_MOVES',
                                           slot['venue_id'], slot['venue_code'])
-                    conn.commit()
                     
-                    log_event(absence_id, 'allocated', sub_teacher['id'],
-                             f"[{target_date_str}] {slot['period_name']}: {slot['class_name']} in {slot['venue_code']}",
-                             request_id)
+                    _queue_log(log_rows, absence_id, 'allocated', sub_teacher['id'],
+                               f"[{target_date_str}] {slot['period_name']}: {slot['class_name']} in {slot['venue_code']}",
+                               request_id)
                     
                     period_result['substitute'] = sub_teacher['display_name']
                     period_result['substitute_id'] = sub_teacher['id']
@@ -754,8 +805,8 @@ def process_absence(absence_id):
                     period_result['status'] = 'assigned'
                     
                     already_assigned_today.append(sub_teacher['id'])
+                    covered[sub_teacher['id']] = covered.get(sub_teacher['id'], 0) + 1
                     total_covered += 1
-                    pointer = new_pointer
                     
                 else:
                     # Create a Pending request so it shows in Substitute Overview
@@ -769,11 +820,10 @@ def process_absence(absence_id):
                           slot['class_name'], slot['subject'],
                           slot['venue_id'], slot['venue_code'], target_date_str,
                           slot.get('grade')))
-                    conn.commit()
                     
-                    log_event(absence_id, 'no_cover', None,
-                             f"[{target_date_str}] {slot['period_name']}: No substitute available",
-                             request_id)
+                    _queue_log(log_rows, absence_id, 'no_cover', None,
+                               f"[{target_date_str}] {slot['period_name']}: No substitute available",
+                               request_id)
                     period_result['status'] = 'no_cover'
                     period_result['request_id'] = request_id
                 
@@ -781,8 +831,17 @@ def process_absence(absence_id):
             
             results['days'].append(day_result)
         
-        # Update pointer
-        update_pointer(pointer)
+        # Update pointer (dormant: burden ratio replaced the A-Z pointer, v161a).
+        # get_next_substitute returns it unchanged, so this only writes if a
+        # future ordering moves it again - an unconditional write would bump
+        # the substitute_config data_version on every absence and drop the
+        # calendar snapshot, free-period and overview caches for nothing.
+        if pointer != results['pointer_start']:
+            cursor.execute("""
+                UPDATE substitute_config 
+                SET pointer_surname = ?, pointer_updated_at = ?, updated_at = ?
+                WHERE tenant_id = ?
+            """, (pointer, datetime.now().isoformat(), datetime.now().isoformat(), TENANT_ID))
         results['pointer_end'] = pointer
         
         # Update absence status
@@ -796,15 +855,21 @@ def process_absence(absence_id):
         cursor.execute("""
             UPDATE absence SET status = ?, updated_at = ? WHERE id = ?
         """, (new_status, datetime.now().isoformat(), absence_id))
-        conn.commit()
         
         results['absence_status'] = new_status
         results['covered_count'] = total_covered
         results['total_count'] = total_periods
         
         # Log completion
-        log_event(absence_id, 'processing_complete', None,
-                 f"Covered {total_covered}/{total_periods} periods over {len(weekdays)} days. Pointer: {results['pointer_start']} -> {pointer}")
+        _queue_log(log_rows, absence_id, 'processing_complete', None,
+                   f"Covered {total_covered}/{total_periods} periods over {len(weekdays)} days. Pointer: {results['pointer_start']} -> {pointer}")
+        
+        cursor.executemany("""
+            INSERT INTO substitute_log 
+            (id, tenant_id, absence_id, substitute_request_id, event_type, staff_id, details, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, log_rows)
+        conn.commit()
         
         results['completed_at'] = datetime.now().isoformat()
         results['success'] = True
@@ -874,47 +939,13 @@ def reassign_declined_request(request_id, declined_by_id):
         # Burden-ratio ordering (Addendum v161a; pointer dormant, unused here).
         ratios = get_burden_ratios(target_date)
         
-        # Get available teachers for this period (free this period, not absent, not the decliner)
-        if req['period_id']:
-            cursor.execute("""
-                SELECT s.id, s.surname, s.display_name, s.first_name
-                FROM staff s
-                WHERE s.tenant_id = ?
-                  AND s.is_active = 1
-                  AND s.can_substitute = 1
-                  AND s.id != ?
-                  AND s.id != ?
-                  AND s.id NOT IN (
-                      SELECT staff_id FROM absence 
-                      WHERE absence_date <= ? AND COALESCE(end_date, absence_date) >= ?
-                        AND status IN ('Reported', 'Covered', 'Partial')
-                  )
-                  AND s.id NOT IN (
-                      SELECT staff_id FROM timetable_slot 
-                      WHERE period_id = ? AND cycle_day = ?
-                  )
-                ORDER BY s.first_name
-            """, (TENANT_ID, req['absent_staff_id'], declined_by_id, target_date, target_date,
-                  req['period_id'], cycle_day))
-        else:
-            # Mentor duty - find nearest available teacher or any available
-            cursor.execute("""
-                SELECT s.id, s.surname, s.display_name, s.first_name
-                FROM staff s
-                WHERE s.tenant_id = ?
-                  AND s.is_active = 1
-                  AND s.can_substitute = 1
-                  AND s.id != ?
-                  AND s.id != ?
-                  AND s.id NOT IN (
-                      SELECT staff_id FROM absence 
-                      WHERE absence_date <= ? AND COALESCE(end_date, absence_date) >= ?
-                        AND status IN ('Reported', 'Covered', 'Partial')
-                  )
-                ORDER BY s.first_name
-            """, (TENANT_ID, req['absent_staff_id'], declined_by_id, target_date, target_date))
-        
-        candidates = [dict(row) for row in cursor.fetchall()]
+        # Available teachers: substitute-eligible, not absent, not the absent
+        # teacher or the decliner, and (for a period) not teaching it. Mentor
+        # duty has no period, so anyone otherwise available qualifies.
+        index = timetable_index.get_index(conn)
+        exclude = index.mask_of(absent_staff) | index.mask_of((req['absent_staff_id'], declined_by_id))
+        candidates = index.substitute_candidates(
+            exclude, cycle_day=cycle_day, period_id=req['period_id'] or None)
         # Burden-ratio order; Pass 1/Pass 2 (0-subs-today first) loops below
         # then pick the lowest-ratio candidate in each pass.
         candidates.sort(key=lambda c: (ratios.get(c['id'], float('inf')),
@@ -944,33 +975,18 @@ def reassign_declined_request(request_id, declined_by_id):
             
             # Re-resolve relocation direction for the NEW sub and REPLACE the
             # 1:1 row (locked design: replace, never accumulate).
-            cursor.execute("""
-                SELECT sv.venue_id, v.venue_code
-                FROM staff_venue sv JOIN venue v ON sv.venue_id = v.id
-                WHERE sv.staff_id = ? AND sv.tenant_id = ?
-            """, (new_sub['id'], TENANT_ID))
-            home = cursor.fetchone()
+            home = index.home_room(new_sub['id'])
             direction = 'SUB_MOVES'
             dest_vid, dest_code = req.get('venue_id'), req.get('venue_name')
             if req['period_id'] and home:
-                cursor.execute("""
-                    SELECT 1 FROM timetable_slot
-                    WHERE tenant_id = ? AND cycle_day = ? AND period_id = ?
-                      AND venue_id = ?
-                """, (TENANT_ID, cycle_day, req['period_id'], home['venue_id']))
-                if not cursor.fetchone():
+                if not index.is_occupied(home[0], cycle_day, req['period_id']):
                     direction = 'LEARNERS_MOVE'
-                    dest_vid, dest_code = home['venue_id'], home['venue_code']
+                    dest_vid, dest_code = home[0], home[1]
             elif not req['period_id']:
                 # Mentor duty: SUB_MOVES to the absent teacher's home room (R6).
-                cursor.execute("""
-                    SELECT sv.venue_id, v.venue_code
-                    FROM staff_venue sv JOIN venue v ON sv.venue_id = v.id
-                    WHERE sv.staff_id = ? AND sv.tenant_id = ?
-                """, (req['absent_staff_id'], TENANT_ID))
-                ab_home = cursor.fetchone()
+                ab_home = index.home_room(req['absent_staff_id'])
                 if ab_home:
-                    dest_vid, dest_code = ab_home['venue_id'], ab_home['venue_code']
+                    dest_vid, dest_code = ab_home[0], ab_home[1]
             _replace_relocation(cursor, request_id, direction, dest_vid, dest_code)
 
             # Log the reassignment
@@ -1028,15 +1044,6 @@ def get_eligible_terrain_staff(exclude_ids=None, target_date=None, relax_weekly=
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        # Get all staff who can do duty
-        cursor.execute("""
-            SELECT id, display_name, first_name, surname
-            FROM staff
-            WHERE tenant_id = ? AND can_do_duty = 1 AND is_active = 1
-            ORDER BY first_name ASC, surname ASC
-        """, (TENANT_ID,))
-        all_staff = [dict(row) for row in cursor.fetchall()]
-        
         # Get staff already assigned terrain this week (original OR replacement)
         cursor.execute("""
             SELECT staff_id AS sid FROM duty_roster
@@ -1068,22 +1075,16 @@ def get_eligible_terrain_staff(exclude_ids=None, target_date=None, relax_weekly=
         assigned_same_day = {row['sid'] for row in cursor.fetchall()}
         
         # Get absent staff
-        absent_staff = set(get_absent_staff_on_date(target_date))
-        
-        # Filter eligible
-        eligible = []
-        for staff in all_staff:
-            if staff['id'] in exclude_ids:
-                continue
-            if staff['id'] in assigned_same_day:
-                continue
-            if not relax_weekly and staff['id'] in assigned_this_week:
-                continue
-            if staff['id'] in absent_staff:
-                continue
-            eligible.append(staff)
+        absent_staff = get_absent_staff_on_date(target_date)
         
-        return eligible
+        # Duty-eligible staff (can_do_duty, active) minus everyone blocked,
+        # in first name / surname order.
+        index = timetable_index.get_index(conn)
+        blocked = (index.mask_of(exclude_ids) | index.mask_of(assigned_same_day)
+                   | index.mask_of(absent_staff))
+        if not relax_weekly:
+            blocked |= index.mask_of(assigned_this_week)
+        return index.duty_candidates(blocked)
 
 
 def reassign_terrain_duty(duty_id, original_staff_id):
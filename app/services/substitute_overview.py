@@ -0,0 +1,150 @@
+"""
+Substitute Overview (mission control) data, batched and shared.
+
+mission_control.html polls /substitute/overview-partial every 5 seconds on
+every open management screen. The partial used to run two queries per
+absence (its substitute_request rows and its duty_roster replacements), so
+2N+3 per poll per viewer on the week tabs. Here it is one query each for
+absences, requests and duties, grouped in Python.
+
+The result is cached per tab, keyed on the date window and the data_version
+counters of every table it reads (migrations 021, 027, 029). All viewers in
+a process share one computation: the first poll after a change rebuilds it
+under a lock, concurrent polls wait for that and reuse it. Without the
+counter table (pre-029 database) nothing is cached.
+
+Cached dicts are shared between requests - templates only read them.
+"""
+
+import threading
+
+from app.services.db import get_connection, get_data_versions
+
+TENANT_ID = "MARAGON"
+
+WATCHED_TABLES = ('absence', 'substitute_request', 'duty_roster', 'mentor_group',
+                  'terrain_area', 'staff', 'period', 'school_calendar',
+                  'substitute_config')
+
+_lock = threading.Lock()
+_entries = {}   # tab -> (key, data)
+_stats = {'hits': 0, 'builds': 0}
+
+# Absences overlapping [start, end], still live. Shared by all three queries.
+_ABSENCE_FILTER = """
+    a.tenant_id = ?
+    AND a.absence_date <= ?
+    AND (COALESCE(a.end_date, a.absence_date) >= ? OR a.is_open_ended = 1)
+    AND a.status NOT IN ('Resolved', 'Cancelled')
+"""
+
+
+def _load(cursor, filter_start, filter_end, filter_dates):
+    window = (TENANT_ID, filter_end.isoformat(), filter_start.isoformat())
+    placeholders = ','.join(['?' for _ in filter_dates])
+
+    cursor.execute("""
+        SELECT a.*, s.display_name as teacher_name, s.surname,
+               mg.group_name as mentor_class
+        FROM absence a
+        JOIN staff s ON a.staff_id = s.id
+        LEFT JOIN mentor_group mg ON mg.mentor_id = s.id
+        WHERE {}
+        ORDER BY a.absence_date ASC, a.reported_at ASC
+    """.format(_ABSENCE_FILTER), window)
+    absences = [dict(row) for row in cursor.fetchall()]
+
+    requests = {}
+    cursor.execute("""
+        SELECT sr.*, p.period_name, p.period_number,
+               sub.display_name as substitute_name, sc.cycle_day
+        FROM substitute_request sr
+        LEFT JOIN period p ON sr.period_id = p.id
+        LEFT JOIN staff sub ON sr.substitute_id = sub.id
+        LEFT JOIN school_calendar sc ON sr.request_date = sc.date AND sc.tenant_id = sr.tenant_id
+        WHERE sr.absence_id IN (SELECT a.id FROM absence a WHERE {})
+          AND sr.request_date IN ({})
+          AND sr.status IN ('Pending', 'Assigned')
+        ORDER BY sr.request_date, sr.is_mentor_duty DESC, p.sort_order
+    """.format(_ABSENCE_FILTER, placeholders), (*window, *filter_dates))
+    for row in cursor.fetchall():
+        requests.setdefault(row['absence_id'], []).append(dict(row))
+
+    # Duty coverage is per absent TEACHER (two absences of one teacher in
+    # the window both show it, as before).
+    duties = {}
+    cursor.execute("""
+        SELECT dr.staff_id, dr.duty_date, dr.duty_type, dr.status as duty_status,
+               dr.replacement_id,
+               ta.area_name,
+               rep.display_name as replacement_name
+        FROM duty_roster dr
+        LEFT JOIN terrain_area ta ON dr.terrain_area_id = ta.id
+        LEFT JOIN staff rep ON dr.replacement_id = rep.id
+        WHERE dr.staff_id IN (SELECT a.staff_id FROM absence a WHERE {})
+          AND dr.duty_date IN ({})
+          AND dr.tenant_id = ?
+          AND dr.replacement_id IS NOT NULL
+        ORDER BY dr.duty_date, dr.duty_type
+    """.format(_ABSENCE_FILTER, placeholders), (*window, *filter_dates, TENANT_ID))
+    for row in cursor.fetchall():
+        duty = dict(row)
+        duties.setdefault(duty.pop('staff_id'), []).append(duty)
+
+    total_periods = covered_periods = pending_periods = 0
+    for absence in absences:
+        absence['requests'] = requests.get(absence['id'], [])
+        absence['duties'] = duties.get(absence['staff_id'], [])
+        for req in absence['requests']:
+            total_periods += 1
+            if req.get('substitute_id'):
+                covered_periods += 1
+            else:
+                pending_periods += 1
+
+    cursor.execute("SELECT * FROM substitute_config WHERE tenant_id = ?", (TENANT_ID,))
+    row = cursor.fetchone()
+    config = dict(row) if row else {}
+
+    return {
+        'absences': absences,
+        'config': config,
+        'stats': {'total': total_periods, 'covered': covered_periods,
+                  'pending': pending_periods, 'absences': len(absences)},
+    }
+
+
+def get_overview(tab, filter_start, filter_end, filter_dates):
+    """
+    {'absences', 'config', 'stats'} for one Substitute Overview tab.
+    Each absence carries 'requests' (Pending/Assigned on filter_dates) and
+    'duties' (replaced duty_roster rows on filter_dates).
+    """
+    with get_connection() as conn:
+        versions = get_data_versions(conn, WATCHED_TABLES)
+        if versions is None:
+            return _load(conn.cursor(), filter_start, filter_end, filter_dates)
+        key = (tuple(filter_dates), filter_start, filter_end, versions)
+        entry = _entries.get(tab)
+        if entry is not None and entry[0] == key:
+            _stats['hits'] += 1
+            return entry[1]
+        with _lock:
+            entry = _entries.get(tab)
+            if entry is not None and entry[0] == key:
+                _stats['hits'] += 1
+                return entry[1]
+            data = _load(conn.cursor(), filter_start, filter_end, filter_dates)
+            _entries[tab] = (key, data)
+            _stats['builds'] += 1
+            return data
+
+
+def invalidate():
+    """Drop all cached tabs (tests, scripts)."""
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    return dict(_stats, entries=len(_entries))
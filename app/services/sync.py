@@ -1,25 +1,44 @@
 """
 Sync reference data from Notion to SQLite.
 Run once at startup, or manually when school data changes.
+
+Fetch: grades, mentor groups, staff and learners are pulled concurrently
+(SYNC_WORKERS threads) over notion.py's pooled session, which retries 429
+and 5xx responses with backoff. Each pull asks only for pages edited since
+that database's watermark (sync_watermark, migration 032), less a few
+minutes of overlap, so a routine run fetches only what changed.
+
+Write: in the calling thread, one source at a time. write_rows diffs the
+pulled records against the stored rows and upserts only new or changed
+ones; a full pull also deactivates active rows Notion no longer returns.
+A source's rows and its new watermark are committed together. A source
+whose fetch failed keeps its old watermark and is pulled again next run.
+
+    python3 -m app.services.sync           incremental
+    python3 -m app.services.sync --full    ignore the watermarks
+
+NOTION_API_BASE points the fetch at a local stand-in for the Notion API.
 """
 
 import os
 import sqlite3
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.services.notion import (
-    get_mentor_groups as notion_get_mentor_groups,
-    get_all_staff as notion_get_all_staff,
-    get_all_grades as notion_get_all_grades,
-)
-from app.services.notion import _query_database, _parse_page
+from app.services.db import DB_PATH
+from app.services.notion import NotionError, query_pages, _parse_page
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'schoolops.db')
 TENANT_ID = "MARAGON"
 
+SYNC_WORKERS = int(os.environ.get('SYNC_WORKERS', '4'))
+# Notion rounds last_edited_time to the minute and its query index can lag a
+# fresh edit slightly: re-read this much before the watermark.
+WATERMARK_OVERLAP_MINUTES = 5
+
 
 def get_db():
     conn = sqlite3.connect(DB_PATH)
@@ -27,139 +46,309 @@ def get_db():
     return conn
 
 
-def sync_mentor_groups():
-    print("Syncing mentor groups...")
-    groups = notion_get_mentor_groups()
-    conn = get_db()
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    
-    for g in groups:
-        cursor.execute('''
-            INSERT OR REPLACE INTO mentor_group 
-            (id, tenant_id, group_name, mentor_id, grade_id, venue_id, synced_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            g['id'], TENANT_ID, g.get('group_name'), g.get('mentor_id'), g.get('grade_id'),
-            g.get('venue_id')[0] if isinstance(g.get('venue_id'), list) and g.get('venue_id') else None, now
-        ))
-    
-    conn.commit()
-    conn.close()
-    print(f"  Synced {len(groups)} mentor groups")
-    return len(groups)
-
-
-def sync_learners():
-    print("Syncing learners...")
-    property_map = {
-        "first_name": "first_name", "surname": "surname", "grade_id": "grade_id",
-        "mentor_group_id": "mentor_group_id", "house_id": "house_id", "is_active": "is_active"
-    }
-    filter_obj = {"property": "is_active", "checkbox": {"equals": True}}
-    db_id = os.environ.get('NOTION_DB_LEARNER', '')
-    results = _query_database(db_id, filter_obj)
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    count = 0
-    
-    for page in results:
-        parsed = _parse_page(page, property_map)
-        for field in ["grade_id", "mentor_group_id", "house_id"]:
-            if parsed.get(field) and isinstance(parsed[field], list):
-                parsed[field] = parsed[field][0] if parsed[field] else None
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO learner
-            (id, tenant_id, first_name, surname, grade_id, mentor_group_id, house_id, is_active, synced_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            parsed['id'], TENANT_ID, parsed.get('first_name'), parsed.get('surname'),
-            parsed.get('grade_id'), parsed.get('mentor_group_id'), parsed.get('house_id'),
-            1 if parsed.get('is_active') else 0, now
-        ))
-        count += 1
-    
-    conn.commit()
-    conn.close()
-    print(f"  Synced {count} learners")
-    return count
+def _first(value):
+    """First id of a relation property (None for an empty relation)."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
 
 
-def sync_staff():
-    print("Syncing staff...")
-    staff_list = notion_get_all_staff(active_only=True)
-    conn = get_db()
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    
-    for s in staff_list:
-        cursor.execute('''
-            INSERT OR REPLACE INTO staff
-            (id, tenant_id, title, first_name, surname, display_name, email, staff_type, can_substitute, can_do_duty, is_active, synced_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            s['id'], TENANT_ID, s.get('title'), s.get('first_name'), s.get('surname'),
-            s.get('display_name'), s.get('email'), s.get('staff_type'),
+def _grade_row(g):
+    return (g.get('grade_name'), g.get('grade_code'), g.get('grade_number'), g.get('sort_order'))
+
+
+def _mentor_group_row(g):
+    venue = g.get('venue_id')
+    return (g.get('group_name'), g.get('mentor_id'), g.get('grade_id'),
+            venue[0] if isinstance(venue, list) and venue else None)
+
+
+def _staff_row(s):
+    return (s.get('title'), s.get('first_name'), s.get('surname'), s.get('display_name'),
+            s.get('email'), s.get('staff_type'),
             1 if s.get('can_substitute') else 0, 1 if s.get('can_do_duty') else 0,
-            1 if s.get('is_active') else 0, now
-        ))
-    
-    conn.commit()
-    conn.close()
-    print(f"  Synced {len(staff_list)} staff members")
-    return len(staff_list)
+            1 if s.get('is_active') else 0)
+
+
+def _learner_row(p):
+    return (p.get('first_name'), p.get('surname'), p.get('grade_id'),
+            p.get('mentor_group_id'), p.get('house_id'), 1 if p.get('is_active') else 0)
+
+
+_ACTIVE_ONLY = {"property": "is_active", "checkbox": {"equals": True}}
+
+# source -> what to pull and how to store it. Written in this order.
+#   filter   applied on full pulls; incremental pulls take every edited page
+#            so a page switched inactive in Notion is seen and deactivated
+#   columns  the synced columns (besides id, tenant_id, synced_at), in the
+#            order row() returns them; local-only columns are left alone
+SOURCES = {
+    'grades': {
+        'label': 'grades',
+        'env': 'NOTION_DB_GRADE',
+        'filter': None,
+        'properties': ["grade_name", "grade_code", "grade_number", "sort_order"],
+        'relations': [],
+        'table': 'grade',
+        'columns': ('grade_name', 'grade_code', 'grade_number', 'sort_order'),
+        'row': _grade_row,
+    },
+    'mentor_groups': {
+        'label': 'mentor groups',
+        'env': 'NOTION_DB_MENTOR_GROUP',
+        'filter': None,
+        'properties': ["group_name", "mentor_id", "grade_id", "venue_id"],
+        'relations': ["mentor_id", "grade_id"],
+        'table': 'mentor_group',
+        'columns': ('group_name', 'mentor_id', 'grade_id', 'venue_id'),
+        'row': _mentor_group_row,
+    },
+    'staff': {
+        'label': 'staff members',
+        'env': 'NOTION_DB_STAFF',
+        'filter': _ACTIVE_ONLY,
+        'properties': ["title", "first_name", "surname", "display_name", "email",
+                       "staff_type", "can_substitute", "can_do_duty", "is_active"],
+        'relations': [],
+        'table': 'staff',
+        'columns': ('title', 'first_name', 'surname', 'display_name', 'email',
+                    'staff_type', 'can_substitute', 'can_do_duty', 'is_active'),
+        'row': _staff_row,
+    },
+    'learners': {
+        'label': 'learners',
+        'env': 'NOTION_DB_LEARNER',
+        'filter': _ACTIVE_ONLY,
+        'properties': ["first_name", "surname", "grade_id", "mentor_group_id",
+                       "house_id", "is_active"],
+        'relations': ["grade_id", "mentor_group_id", "house_id"],
+        'table': 'learner',
+        'columns': ('first_name', 'surname', 'grade_id', 'mentor_group_id',
+                    'house_id', 'is_active'),
+        'row': _learner_row,
+    },
+}
+
+
+# =============================================================================
+# WRITE STAGE
+# =============================================================================
+
+def write_rows(cursor, table, columns, rows, now, full=False):
+    """
+    Diff `rows` [(id, values)] against what `table` holds and write only
+    the difference: new and changed rows in one executemany upsert, so an
+    unchanged row is never rewritten (no index churn, no data_version bump,
+    local-only columns kept). Tables with is_active also get:
+      - a page that is inactive and not held locally is skipped
+      - a held row going 1 -> 0 counts as deactivated
+      - full=True: held active rows that came from Notion (synced_at set)
+        but are missing from a non-empty pull are deactivated
+    Returns {'inserted', 'updated', 'unchanged', 'deactivated'}. The caller
+    commits.
+    """
+    active = columns.index('is_active') if 'is_active' in columns else None
+    cursor.execute("SELECT id, synced_at, {} FROM {} WHERE tenant_id = ?".format(
+        ', '.join(columns), table), (TENANT_ID,))
+    stored = {r[0]: (r[1], tuple(r[2:])) for r in cursor.fetchall()}
+
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deactivated': 0}
+    changed = []
+    for row_id, values in rows:
+        held = stored.get(row_id)
+        if held is None:
+            if active is not None and not values[active]:
+                continue
+            counts['inserted'] += 1
+        elif held[1] == values:
+            counts['unchanged'] += 1
+            continue
+        elif active is not None and held[1][active] and not values[active]:
+            counts['deactivated'] += 1
+        else:
+            counts['updated'] += 1
+        changed.append((row_id, TENANT_ID) + tuple(values) + (now,))
+
+    if changed:
+        cursor.executemany("""
+            INSERT INTO {table} (id, tenant_id, {cols}, synced_at)
+            VALUES (?, ?, {marks}, ?)
+            ON CONFLICT(id) DO UPDATE SET tenant_id = excluded.tenant_id, {sets},
+                synced_at = excluded.synced_at
+        """.format(table=table, cols=', '.join(columns),
+                   marks=', '.join('?' for _ in columns),
+                   sets=', '.join(f"{c} = excluded.{c}" for c in columns)), changed)
+
+    if full and active is not None and rows:
+        seen = {row_id for row_id, _ in rows}
+        gone = [(now, row_id) for row_id, (synced_at, values) in stored.items()
+                if synced_at and values[active] and row_id not in seen]
+        if gone:
+            cursor.executemany(
+                "UPDATE {} SET is_active = 0, synced_at = ? WHERE id = ?".format(table), gone)
+            counts['deactivated'] += len(gone)
+    return counts
+
 
+# =============================================================================
+# WATERMARKS
+# =============================================================================
 
-def sync_grades():
-    print("Syncing grades...")
-    grades = notion_get_all_grades()
+def _load_watermarks(cursor):
+    """source -> (database_id, last_edited_time), or None before migration 032."""
+    try:
+        cursor.execute("""
+            SELECT source, database_id, last_edited_time FROM sync_watermark
+            WHERE tenant_id = ?
+        """, (TENANT_ID,))
+    except sqlite3.OperationalError:
+        return None
+    return {r['source']: (r['database_id'], r['last_edited_time']) for r in cursor.fetchall()}
+
+
+def _save_watermark(cursor, source, database_id, last_edited_time, pages, now):
+    cursor.execute("""
+        INSERT OR REPLACE INTO sync_watermark
+        (tenant_id, source, database_id, last_edited_time, synced_at, pages)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (TENANT_ID, source, database_id, last_edited_time, now, pages))
+
+
+def _since(watermark):
+    """Notion timestamp WATERMARK_OVERLAP_MINUTES before the watermark."""
+    edited = datetime.fromisoformat(watermark.replace('Z', '+00:00'))
+    return (edited - timedelta(minutes=WATERMARK_OVERLAP_MINUTES)).isoformat()
+
+
+def _edited_filter(base, since):
+    if since is None:
+        return base
+    edited = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+    return {"and": [base, edited]} if base else edited
+
+
+# =============================================================================
+# SYNC
+# =============================================================================
+
+def _fetch(database_id, filter_obj):
+    started = time.perf_counter()
+    pages = query_pages(database_id, filter_obj)
+    return pages, time.perf_counter() - started
+
+
+def _parse(spec, page):
+    parsed = _parse_page(page, {name: name for name in spec['properties']})
+    for field in spec['relations']:
+        parsed[field] = _first(parsed.get(field))
+    return parsed
+
+
+def sync_sources(sources, full=False):
+    """
+    Pull `sources` (keys of SOURCES) concurrently and write them.
+    Returns source -> write_rows counts plus 'fetched', or None where the
+    fetch failed.
+    """
     conn = get_db()
     cursor = conn.cursor()
-    now = datetime.now().isoformat()
-    
-    for g in grades:
-        cursor.execute('''
-            INSERT OR REPLACE INTO grade
-            (id, tenant_id, grade_name, grade_code, grade_number, sort_order, synced_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            g['id'], TENANT_ID, g.get('grade_name'), g.get('grade_code'),
-            g.get('grade_number'), g.get('sort_order'), now
-        ))
-    
-    conn.commit()
+    watermarks = _load_watermarks(cursor)
+    if watermarks is None:
+        print("  sync_watermark missing (migration 032) - full pull, watermarks not kept")
+
+    plans = {}
+    for source in sources:
+        spec = SOURCES[source]
+        database_id = os.environ.get(spec['env'], '')
+        mark = (watermarks or {}).get(source)
+        since = None
+        if not full and mark and mark[0] == database_id and mark[1]:
+            since = _since(mark[1])
+        plans[source] = (database_id, since, mark[1] if mark and mark[0] == database_id else None)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(SYNC_WORKERS, len(plans)))) as pool:
+        futures = {
+            source: pool.submit(_fetch, database_id, _edited_filter(
+                SOURCES[source]['filter'] if since is None else None, since))
+            for source, (database_id, since, _) in plans.items()
+        }
+        for source in sources:
+            spec = SOURCES[source]
+            database_id, since, previous = plans[source]
+            print(f"Syncing {spec['label']}...")
+            try:
+                pages, seconds = futures[source].result()
+            except NotionError as e:
+                print(f"  FAILED, kept previous watermark: {e}")
+                results[source] = None
+                continue
+
+            now = datetime.now().isoformat()
+            rows = []
+            for page in pages:
+                record = _parse(spec, page)
+                rows.append((record['id'], spec['row'](record)))
+            counts = write_rows(cursor, spec['table'], spec['columns'], rows, now,
+                                full=since is None)
+            newest = max([p['last_edited_time'] for p in pages if p.get('last_edited_time')]
+                         + ([previous] if previous else []), default=None)
+            if watermarks is not None:
+                _save_watermark(cursor, source, database_id, newest, len(pages), now)
+            conn.commit()
+            results[source] = dict(counts, fetched=len(pages))
+            scope = f"edited since {since}" if since else "full"
+            print(f"  Synced {len(pages)} {spec['label']} ({scope}, fetched in {seconds:.1f}s): "
+                  + ", ".join(f"{counts[k]} {k}" for k in
+                              ('inserted', 'updated', 'unchanged', 'deactivated')))
+
     conn.close()
-    print(f"  Synced {len(grades)} grades")
-    return len(grades)
+    return results
+
+
+def sync_mentor_groups(full=False):
+    return sync_sources(['mentor_groups'], full)['mentor_groups']
+
+
+def sync_learners(full=False):
+    return sync_sources(['learners'], full)['learners']
 
 
-def sync_all():
+def sync_staff(full=False):
+    return sync_sources(['staff'], full)['staff']
+
+
+def sync_grades(full=False):
+    return sync_sources(['grades'], full)['grades']
+
+
+def sync_all(full=False):
     print("=" * 50)
     print("SYNCING REFERENCE DATA: Notion -> SQLite")
     print("=" * 50)
-    
+
     conn = get_db()
     with open(os.path.join(os.path.dirname(__file__), 'schema.sql'), 'r') as f:
         conn.executescript(f.read())
     conn.close()
-    
-    results = {
-        'grades': sync_grades(),
-        'mentor_groups': sync_mentor_groups(),
-        'staff': sync_staff(),
-        'learners': sync_learners(),
-    }
-    
+
+    started = time.perf_counter()
+    results = sync_sources(list(SOURCES), full)
+
     print("=" * 50)
-    print("SYNC COMPLETE")
+    print(f"SYNC COMPLETE in {time.perf_counter() - started:.1f}s")
     for k, v in results.items():
-        print(f"  {k}: {v}")
+        if v is None:
+            print(f"  {k}: FAILED")
+        else:
+            print(f"  {k}: {v['fetched']} fetched, {v['inserted']} inserted, "
+                  f"{v['updated']} updated, {v['deactivated']} deactivated")
     print("=" * 50)
     return results
 
 
 if __name__ == "__main__":
-    sync_all()
+    import argparse
+    ap = argparse.ArgumentParser(description="Sync reference data from Notion.")
+    ap.add_argument('--full', action='store_true', help="ignore watermarks, pull every page")
+    sync_all(full=ap.parse_args().full)
@@ -0,0 +1,237 @@
+"""
+Timetable index - who teaches where, when, as bitsets.
+
+The substitute engine, decline reassignment, terrain eligibility and the
+emergency smart-location lookup all ask the same questions: which staff
+are teaching in (cycle_day, period), which rooms are in use, who may
+substitute / do duty, and where each teacher's home room is. Each call
+used to answer them with fresh SQL. This module answers them from one
+in-memory TimetableIndex built from staff, staff_venue, venue, period and
+timetable_slot.
+
+Every staff member and venue gets a bit position, so the per-slot sets are
+plain ints:
+  busy[(cycle_day, period_id)]          staff teaching that slot
+  occupied[(cycle_day, period_id)]      venues in use that slot
+  room_blocked[(cycle_day, period_id)]  staff whose home room is in use
+and the Free / Pass 1 / Pass 2 pools are a handful of &, | and ~.
+
+The index is keyed on the data_version counters of those five tables
+(migration 027), so any write from any process rebuilds it on next use,
+exactly like the calendar snapshot in substitute_engine. Absences are NOT
+indexed - they change all day - callers pass the absent set in.
+"""
+
+import threading
+
+from app.services.db import get_connection, get_data_versions
+
+TENANT_ID = "MARAGON"
+
+WATCHED_TABLES = ('timetable_slot', 'staff_venue', 'venue', 'period', 'staff')
+
+_lock = threading.Lock()
+_index = None
+
+
+class TimetableIndex:
+    __slots__ = (
+        'versions',
+        'staff_bit',        # staff_id -> bit position
+        'substitutes',      # [(bit, row dict)] can_substitute, by first name
+        'duty_staff',       # [(bit, row dict)] can_do_duty, by first/surname
+        'substitute_mask',
+        'duty_mask',
+        'busy',             # (cycle_day, period_id) -> staff mask
+        'occupied',         # (cycle_day, period_id) -> venue mask
+        'room_blocked',     # (cycle_day, period_id) -> staff mask
+        'venue_bit',        # venue_id -> bit position
+        'venues',           # venue_id -> (venue_code, venue_name)
+        'home_venue',       # staff_id -> venue_id
+        'teaching',         # (staff_id, cycle_day, period_number) -> venue_id or None
+    )
+
+    def __init__(self, versions):
+        self.versions = versions
+        self.staff_bit = {}
+        self.substitutes = []
+        self.duty_staff = []
+        self.substitute_mask = 0
+        self.duty_mask = 0
+        self.busy = {}
+        self.occupied = {}
+        self.room_blocked = {}
+        self.venue_bit = {}
+        self.venues = {}
+        self.home_venue = {}
+        self.teaching = {}
+
+    # --- building ---
+
+    def _bit(self, staff_id):
+        bit = self.staff_bit.get(staff_id)
+        if bit is None:
+            bit = self.staff_bit[staff_id] = len(self.staff_bit)
+        return bit
+
+    def _venue(self, venue_id):
+        bit = self.venue_bit.get(venue_id)
+        if bit is None:
+            bit = self.venue_bit[venue_id] = len(self.venue_bit)
+        return bit
+
+    def load(self, cursor):
+        cursor.execute("""
+            SELECT id, surname, display_name, first_name
+            FROM staff
+            WHERE tenant_id = ? AND is_active = 1 AND can_substitute = 1
+            ORDER BY first_name
+        """, (TENANT_ID,))
+        for row in cursor.fetchall():
+            bit = self._bit(row['id'])
+            self.substitutes.append((bit, dict(row)))
+            self.substitute_mask |= 1 << bit
+
+        cursor.execute("""
+            SELECT id, display_name, first_name, surname
+            FROM staff
+            WHERE tenant_id = ? AND can_do_duty = 1 AND is_active = 1
+            ORDER BY first_name ASC, surname ASC
+        """, (TENANT_ID,))
+        for row in cursor.fetchall():
+            bit = self._bit(row['id'])
+            self.duty_staff.append((bit, dict(row)))
+            self.duty_mask |= 1 << bit
+
+        cursor.execute("SELECT id, venue_code, venue_name FROM venue")
+        for row in cursor.fetchall():
+            self._venue(row['id'])
+            self.venues[row['id']] = (row['venue_code'], row['venue_name'])
+
+        cursor.execute("SELECT staff_id, venue_id FROM staff_venue WHERE tenant_id = ?",
+                       (TENANT_ID,))
+        self.home_venue = {row['staff_id']: row['venue_id'] for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT t.staff_id, t.cycle_day, t.period_id, t.venue_id, p.period_number
+            FROM timetable_slot t
+            LEFT JOIN period p ON p.id = t.period_id
+            WHERE t.tenant_id = ?
+        """, (TENANT_ID,))
+        for row in cursor.fetchall():
+            key = (row['cycle_day'], row['period_id'])
+            self.busy[key] = self.busy.get(key, 0) | (1 << self._bit(row['staff_id']))
+            if row['venue_id'] is not None:
+                self.occupied[key] = self.occupied.get(key, 0) | (1 << self._venue(row['venue_id']))
+            if row['period_number'] is not None:
+                self.teaching.setdefault(
+                    (row['staff_id'], row['cycle_day'], row['period_number']), row['venue_id'])
+
+        # Staff per home venue, then "home room in use" per slot.
+        home_staff = {}
+        for staff_id, venue_id in self.home_venue.items():
+            vbit = self._venue(venue_id)
+            home_staff[vbit] = home_staff.get(vbit, 0) | (1 << self._bit(staff_id))
+        for key, venues in self.occupied.items():
+            blocked = 0
+            for vbit, staff_mask in home_staff.items():
+                if venues >> vbit & 1:
+                    blocked |= staff_mask
+            self.room_blocked[key] = blocked
+        return self
+
+    # --- queries ---
+
+    def mask_of(self, staff_ids):
+        """Bitmask for a collection of staff ids (unknown ids ignored)."""
+        mask = 0
+        for staff_id in staff_ids or ():
+            bit = self.staff_bit.get(staff_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def is_busy(self, staff_id, cycle_day, period_id):
+        bit = self.staff_bit.get(staff_id)
+        return bit is not None and bool(self.busy.get((cycle_day, period_id), 0) >> bit & 1)
+
+    def is_occupied(self, venue_id, cycle_day, period_id):
+        bit = self.venue_bit.get(venue_id)
+        return bit is not None and bool(self.occupied.get((cycle_day, period_id), 0) >> bit & 1)
+
+    def home_room(self, staff_id):
+        """(venue_id, venue_code, venue_name) or None."""
+        venue_id = self.home_venue.get(staff_id)
+        if venue_id is None or venue_id not in self.venues:
+            return None
+        code, name = self.venues[venue_id]
+        return venue_id, code, name
+
+    def teaching_venue(self, staff_id, cycle_day, period_number):
+        """(venue_id, venue_code, venue_name) the teacher is timetabled in,
+        or None if free / the slot has no venue."""
+        venue_id = self.teaching.get((staff_id, cycle_day, period_number))
+        if venue_id is None or venue_id not in self.venues:
+            return None
+        code, name = self.venues[venue_id]
+        return venue_id, code, name
+
+    def free_pools(self, cycle_day, period_id, exclude_mask=0, absent_mask=0):
+        """
+        (pass1, pass2) substitute dicts for one slot, first-name order:
+          pass1  room-free (LEARNERS_MOVE) + floaters (SUB_MOVES, R7)
+          pass2  home room in use by another class (SUB_MOVES last-resort, R3)
+        Teaching, excluded and absent staff are in neither.
+        """
+        key = (cycle_day, period_id)
+        available = self.substitute_mask & ~(self.busy.get(key, 0) | exclude_mask | absent_mask)
+        blocked = available & self.room_blocked.get(key, 0)
+        pass1, pass2 = [], []
+        for bit, row in self.substitutes:
+            if not available >> bit & 1:
+                continue
+            t = dict(row)
+            home = self.home_venue.get(t['id'])
+            t['home_venue_id'] = home
+            t['home_venue_code'] = self.venues.get(home, (None, None))[0] if home else None
+            if blocked >> bit & 1:
+                t['reloc_direction'] = 'SUB_MOVES'
+                pass2.append(t)
+            else:
+                t['reloc_direction'] = 'SUB_MOVES' if home is None else 'LEARNERS_MOVE'
+                pass1.append(t)
+        return pass1, pass2
+
+    def substitute_candidates(self, exclude_mask=0, cycle_day=None, period_id=None):
+        """Substitute-eligible staff not in exclude_mask (and, given a slot,
+        not teaching it), as row dicts in first-name order."""
+        skip = exclude_mask
+        if period_id is not None:
+            skip |= self.busy.get((cycle_day, period_id), 0)
+        return [dict(row) for bit, row in self.substitutes if not skip >> bit & 1]
+
+    def duty_candidates(self, exclude_mask=0):
+        """Duty-eligible staff not in exclude_mask, first name then surname."""
+        return [dict(row) for bit, row in self.duty_staff if not exclude_mask >> bit & 1]
+
+
+def get_index(conn=None):
+    """Current TimetableIndex, rebuilt only when a watched table changed."""
+    global _index
+    if conn is None:
+        with get_connection() as conn:
+            return get_index(conn)
+    versions = get_data_versions(conn, WATCHED_TABLES)
+    index = _index
+    if index is not None and versions is not None and index.versions == versions:
+        return index
+    with _lock:
+        index = TimetableIndex(versions).load(conn.cursor())
+        _index = index
+    return index
+
+
+def invalidate():
+    """Drop the index (in-process writers, tests)."""
+    global _index
+    _index = None
@@ -0,0 +1,218 @@
+"""
+Content-addressed, reference-counted store for uploaded files.
+
+notices.new_notice and schedules.upload used to read() the whole upload (up
+to 10 MB) into the worker before even looking at its magic bytes, then
+wrote it out again under a fresh UUID name, so the same poster posted twice
+sat on disk twice. Uploads now go through two steps:
+
+  stage(stream, sniff, max_bytes, tmp_dir)
+      copies the upload to a temp file in CHUNK_SIZE pieces, sniffing the
+      type from the first bytes, hashing as it goes and stopping as soon as
+      the size cap is passed. Peak memory is one chunk.
+
+  store(staged, area, directory)
+      takes a reference on <sha256>.<ext> in the upload_blob table
+      (migration 035) and moves the temp file into place only if that name
+      is not already there. Returns the bare filename for the row.
+
+A route that fails after store() gives its reference back with
+release(area, directory, name); the file is removed when the count reaches
+zero, together with its resized copies (image_derivatives).
+
+discard(staged) drops a staged upload that is not going to be stored.
+Soft-deleted notices and sources keep their references.
+
+The ref count change and the file move/unlink happen under one BEGIN
+IMMEDIATE transaction, so two workers storing and releasing the same
+content cannot unlink a file the other has just referenced. Rows written
+before this store (UUID names) are served as before and are not counted.
+
+CLI:
+    python3 -m app.services.upload_store            # per-area summary
+    python3 -m app.services.upload_store --sweep    # remove stale temp files
+"""
+
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app.services import image_derivatives
+from app.services.db import get_connection
+
+CHUNK_SIZE = 64 * 1024
+HEAD_BYTES = 16                  # enough for every magic check the routes make
+TEMP_PREFIX = ".upload-"
+STALE_TEMP_SECONDS = 3600
+
+
+def stage(stream, sniff, max_bytes, tmp_dir):
+    """Stream an upload to a temp file in tmp_dir (same disk as the final
+    directory, so store() is a rename).
+
+    sniff(head) returns the canonical extension for the first HEAD_BYTES or
+    None; max_bytes is an int or a dict of extension -> cap.
+
+    Returns (staged, None) with staged = {'ext', 'sha256', 'size', 'tmp_path'},
+    or (None, reason) with reason 'empty' | 'unsupported'. On 'too_large' the
+    first element is {'ext': ext} so the caller can word the message.
+    """
+    head = b""
+    while len(head) < HEAD_BYTES:
+        chunk = stream.read(HEAD_BYTES - len(head))
+        if not chunk:
+            break
+        head += chunk
+    if not head:
+        return None, 'empty'
+    ext = sniff(head)
+    if ext is None:
+        return None, 'unsupported'
+    cap = max_bytes[ext] if isinstance(max_bytes, dict) else max_bytes
+
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, TEMP_PREFIX + uuid.uuid4().hex)
+    digest = hashlib.sha256(head)
+    size = len(head)
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(head)
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > cap:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        _unlink(tmp_path)
+        raise
+    if size > cap:
+        _unlink(tmp_path)
+        return {'ext': ext}, 'too_large'
+    return {'ext': ext, 'sha256': digest.hexdigest(), 'size': size,
+            'tmp_path': tmp_path}, None
+
+
+def store(staged, area, directory):
+    """Reference the staged content under area and return its bare filename.
+    The temp file is consumed either way."""
+    name = "%s.%s" % (staged['sha256'], staged['ext'])
+    final_path = os.path.join(directory, name)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        with get_connection() as conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO upload_blob "
+                    "(area, file_name, sha256, bytes, ref_count, created_at) "
+                    "VALUES (?, ?, ?, ?, 1, ?) "
+                    "ON CONFLICT(area, file_name) DO UPDATE SET "
+                    " ref_count = ref_count + 1",
+                    (area, name, staged['sha256'], staged['size'],
+                     datetime.now(timezone.utc).isoformat()))
+                if os.path.exists(final_path):
+                    _unlink(staged['tmp_path'])
+                else:
+                    _move(staged['tmp_path'], final_path)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        _unlink(staged['tmp_path'])
+    return name
+
+
+def release(area, directory, name):
+    """Give back one reference; the file goes when none are left. Best-effort."""
+    try:
+        with get_connection() as conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE upload_blob SET ref_count = ref_count - 1 "
+                "WHERE area = ? AND file_name = ? AND ref_count > 0",
+                (area, name))
+            cur.execute(
+                "DELETE FROM upload_blob "
+                "WHERE area = ? AND file_name = ? AND ref_count <= 0",
+                (area, name))
+            if cur.rowcount:
+                _unlink(os.path.join(directory, name))
+                image_derivatives.remove_for(directory, name)
+            conn.commit()
+    except Exception as e:
+        print("Upload store release error (%s/%s): %s" % (area, name, e))
+
+
+def discard(staged):
+    """Drop a staged upload that will not be stored."""
+    if staged and staged.get('tmp_path'):
+        _unlink(staged['tmp_path'])
+
+
+def _move(src, dst):
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # tmp_dir on another filesystem: copy next to dst, then rename.
+        part = dst + ".part"
+        shutil.copyfile(src, part)
+        os.replace(part, dst)
+        _unlink(src)
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def sweep(tmp_dirs):
+    """Remove temp files left by crashed workers. Returns the count removed."""
+    cutoff = time.time() - STALE_TEMP_SECONDS
+    removed = 0
+    for tmp_dir in tmp_dirs:
+        if not os.path.isdir(tmp_dir):
+            continue
+        for entry in os.scandir(tmp_dir):
+            if entry.name.startswith(TEMP_PREFIX) and entry.stat().st_mtime < cutoff:
+                _unlink(entry.path)
+                removed += 1
+    return removed
+
+
+def stats():
+    """Per-area file count, stored bytes and bytes saved by de-duplication."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT area, COUNT(*) AS files, SUM(bytes) AS stored_bytes, "
+            "       SUM(ref_count) AS refs, "
+            "       SUM(bytes * (ref_count - 1)) AS saved_bytes "
+            "FROM upload_blob GROUP BY area ORDER BY area").fetchall()
+    return [dict(r) for r in rows]
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Inspect the upload store.")
+    ap.add_argument('--sweep', action='store_true', help="remove stale temp files")
+    args = ap.parse_args()
+    if args.sweep:
+        from app.routes.notices import NOTICE_ROOT
+        from app.routes.schedules import SCHEDULE_ROOT
+        print("Removed %d stale temp files" % sweep((NOTICE_ROOT, SCHEDULE_ROOT)))
+    for row in stats():
+        print("%-14s %5d files %10d bytes  %5d refs  %10d bytes saved"
+              % (row['area'], row['files'], row['stored_bytes'], row['refs'],
+                 row['saved_bytes']))
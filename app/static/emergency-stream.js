@@ -0,0 +1,30 @@
+// Emergency alert stream (SSE). Fires 'emergency-changed' on <body> when an
+// alert is triggered, responded to or resolved; htmx elements listen with
+// hx-trigger="emergency-changed from:body". While the stream is down,
+// window.emergencyStreamLive is false and their polling fallback runs.
+(function () {
+    if (window.emergencyStream || !window.EventSource) return;
+    window.emergencyStreamLive = false;
+    var connectedBefore = false;
+    var source = new EventSource('/emergency/stream');
+    window.emergencyStream = source;
+
+    source.addEventListener('open', function () {
+        window.emergencyStreamLive = true;
+    });
+    source.addEventListener('error', function () {
+        window.emergencyStreamLive = false;
+    });
+    source.addEventListener('alert', function (e) {
+        var data = {};
+        try { data = JSON.parse(e.data); } catch (err) {}
+        // The first 'state' event matches what the page just rendered; a
+        // 'state' after a reconnect may carry changes missed while down.
+        if (data.kind === 'state' && !connectedBefore) {
+            connectedBefore = true;
+            return;
+        }
+        connectedBefore = true;
+        document.body.dispatchEvent(new CustomEvent('emergency-changed', { detail: data }));
+    });
+})();
@@ -0,0 +1,152 @@
+"""
+Whole-file vs page-range schedule extraction, against a local stand-in for
+the messages endpoint.
+
+Builds PDFs of --pages pages (each padded with --kb-per-page KB of content
+stream, standing in for scanned grids) and extracts each twice:
+  - whole:  one extract_rows call with the full file, and
+  - ranges: extract_page_ranges, one call per PAGES_PER_CALL pages (needs
+            pypdf; without it this is the whole-file call again).
+Both go through schedules._merge_extractions, as run_extraction does.
+
+The stand-in counts the pages of the PDF it receives, sleeps --latency plus
+--per-page seconds for each, and answers two rows per page (the first row of
+a range repeats the previous page's last row, as a date across a page break
+does). Pages listed in --fail answer 500. Reported per run: wall time, calls,
+request bytes sent, rows merged (expected: 2 per page) and the error.
+
+    python3 scripts/bench_extract_ranges.py
+    python3 scripts/bench_extract_ranges.py --pages 4 12 24 --per-page 4 --fail 7
+
+Everything runs on 127.0.0.1 in a temp dir; no key or model is involved.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SLUG = 'assessment-timetable'
+
+
+def make_pdf(pages, kb_per_page):
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject
+    writer = PdfWriter()
+    for _ in range(pages):
+        page = writer.add_blank_page(842, 595)
+        stream = DecodedStreamObject()
+        stream.set_data(b"%" + os.urandom(kb_per_page * 512).hex().encode() + b"\n")
+        page.replace_contents(stream)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _rows(page):
+    return ["2026-08-%02d\tSubject %d-%d\t\t\t\t%d\t\t\t\t" % (page, page, k, 8 + k)
+            for k in (1, 2)]
+
+
+def make_handler(latency, per_page, fail, stats):
+    import base64
+    from pypdf import PdfReader
+    lock = threading.Lock()
+
+    class StandIn(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *a):
+            pass
+
+        def _send(self, code, body):
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length))
+            with lock:
+                stats['calls'] += 1
+                stats['bytes'] += length
+            doc, prompt = body['messages'][0]['content']
+            sent = len(PdfReader(io.BytesIO(base64.b64decode(doc['source']['data']))).pages)
+            m = re.search(r"pages (\d+) to (\d+)", prompt['text'])
+            first = int(m.group(1)) if m else 1
+            last = first + sent - 1
+            time.sleep(latency + per_page * sent)
+            if fail & set(range(first, last + 1)):
+                self._send(500, b'{"type":"error"}')
+                return
+            rows = [_rows(first - 1)[-1]] if first > 1 else []
+            for page in range(first, last + 1):
+                rows += _rows(page)
+            self._send(200, json.dumps(
+                {"content": [{"type": "text", "text": "\n".join(rows)}]}).encode())
+
+    return StandIn
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Whole-file vs page-range extraction timing.")
+    ap.add_argument('--pages', type=int, nargs='+', default=[2, 6, 12, 24])
+    ap.add_argument('--kb-per-page', type=int, default=200)
+    ap.add_argument('--latency', type=float, default=0.5, help="seconds per call")
+    ap.add_argument('--per-page', type=float, default=2.0, help="seconds per page read")
+    ap.add_argument('--fail', type=int, nargs='*', default=[], help="pages that answer 500")
+    args = ap.parse_args()
+
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        raise SystemExit("needs pypdf (pip install pypdf)")
+
+    with tempfile.TemporaryDirectory() as work:
+        stats = {'calls': 0, 'bytes': 0}
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(
+            args.latency, args.per_page, set(args.fail), stats))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ.update(
+            DATABASE_PATH=os.path.join(work, 'bench.db'), ANTHROPIC_API_KEY='standin',
+            EXTRACT_API_URL='http://127.0.0.1:%d/v1/messages' % server.server_port)
+        sys.path.insert(0, REPO)
+        with contextlib.redirect_stdout(io.StringIO()):   # migration chatter
+            from app.services import extract
+            from app.routes.schedules import _merge_extractions
+
+        print("%.1f s + %.1f s/page per call, %d pages per range call, %d at once, "
+              "%d KB/page, failing pages %s"
+              % (args.latency, args.per_page, extract.PAGES_PER_CALL,
+                 extract.EXTRACT_WORKERS, args.kb_per_page, args.fail or 'none'))
+        print("%5s %-6s %8s %6s %10s %6s  %s"
+              % ('pages', 'mode', 'wall s', 'calls', 'sent KB', 'rows', 'error'))
+        for pages in args.pages:
+            raw = make_pdf(pages, args.kb_per_page)
+            runs = [
+                ('whole', lambda: [(None,) + extract.extract_rows(raw, 'pdf', SLUG)]),
+                ('ranges', lambda: extract.extract_page_ranges(raw, 'pdf', SLUG)),
+            ]
+            for mode, run in runs:
+                stats.update(calls=0, bytes=0)
+                started = time.perf_counter()
+                rows, _, err = _merge_extractions(run())
+                wall = time.perf_counter() - started
+                print("%5d %-6s %8.1f %6d %10.0f %3d/%-2d  %s"
+                      % (pages, mode, wall, stats['calls'], stats['bytes'] / 1024.0,
+                         len(rows), 2 * pages, err or ''))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
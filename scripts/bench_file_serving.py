@@ -0,0 +1,222 @@
+"""
+Worker occupancy under concurrent PDF downloads, per FILE_SERVE_MODE.
+
+Runs a minimal app that answers /file through app.services.file_serving
+(the same call notices/schedules.serve_file make after their checks) under
+gunicorn sync workers, behind a small stand-in front proxy that:
+  - follows X-Accel-Redirect itself, reading the file from disk, and
+  - otherwise relays the upstream body unbuffered (Render's proxy, or nginx
+    with proxy_buffering off), with a 64 KB upstream socket buffer.
+The proxy writes to each client at --rate-mb MB/s to stand in for phones on
+school Wi-Fi. Meanwhile a probe requests /ping every 100 ms through the
+same proxy: its latency is what every other page sees while downloads run.
+
+    python3 scripts/bench_file_serving.py
+    python3 scripts/bench_file_serving.py --size-mb 10 --clients 8 --workers 2
+
+Needs gunicorn (requirements.txt). Everything runs on 127.0.0.1 in a temp dir.
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK = 64 * 1024
+
+# --- the app under test (imported by gunicorn as scripts.bench_file_serving:app)
+if os.environ.get("BENCH_FILE"):
+    sys.path.insert(0, REPO)
+    from flask import Flask
+    from app.services import file_serving
+
+    app = Flask(__name__)
+
+    @app.route('/file')
+    def bench_file():
+        return file_serving.send(os.environ["BENCH_FILE"], 'application/pdf')
+
+    @app.route('/ping')
+    def bench_ping():
+        return 'ok'
+
+
+# --- stand-in front proxy --------------------------------------------------
+
+def make_proxy(upstream_port, accel_root, accel_prefix, rate):
+    delay = CHUNK / rate
+
+    class Proxy(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *a):
+            pass
+
+        def _relay(self, status, headers, chunks):
+            self.send_response(status)
+            for k, v in headers:
+                if k.lower() not in ('x-accel-redirect', 'connection', 'transfer-encoding'):
+                    self.send_header(k, v)
+            self.end_headers()
+            for chunk in chunks:
+                self.wfile.write(chunk)
+                time.sleep(delay)
+
+        def do_GET(self):
+            conn = http.client.HTTPConnection('127.0.0.1', upstream_port)
+            conn.sock = socket.create_connection(('127.0.0.1', upstream_port))
+            conn.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, CHUNK)
+            conn.request('GET', self.path, headers={'Accept': '*/*'})
+            resp = conn.getresponse()
+            accel = resp.getheader('X-Accel-Redirect')
+            if accel:
+                resp.read()
+                conn.close()
+                path = os.path.join(accel_root, accel[len(accel_prefix):].lstrip('/'))
+                headers = [(k, v) for k, v in resp.getheaders() if k.lower() != 'content-length']
+                headers.append(('Content-Length', str(os.path.getsize(path))))
+                with open(path, 'rb') as f:
+                    self._relay(200, headers, iter(lambda: f.read(CHUNK), b""))
+                return
+            self._relay(resp.status, resp.getheaders(),
+                        iter(lambda: resp.read(CHUNK), b""))
+            conn.close()
+
+    return Proxy
+
+
+def wait_port(port, timeout=20):
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def fetch(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    conn.request('GET', path)
+    resp = conn.getresponse()
+    n = len(resp.read())
+    conn.close()
+    return resp.status, n
+
+
+def run_mode(mode, args, work):
+    bench_file = os.path.join(work, 'doc', 'a' * 64 + '.pdf')
+    app_port, proxy_port = free_port(), free_port()
+    log_path = os.path.join(work, 'access-%s.log' % mode)
+    env = dict(os.environ, BENCH_FILE=bench_file, FILE_SERVE_MODE=mode,
+               FILE_ACCEL_ROOT=work, FILE_ACCEL_PREFIX='/_files',
+               DATABASE_PATH=os.path.join(work, 'bench.db'),
+               PYTHONPATH=os.pathsep.join([REPO] + sys.path))
+    gunicorn = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-k', 'sync',
+         '-b', '127.0.0.1:%d' % app_port, '--access-logfile', log_path,
+         '--access-logformat', '%(U)s %(L)s', '--timeout', '300',
+         'scripts.bench_file_serving:app'],
+        cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server = ThreadingHTTPServer(
+        ('127.0.0.1', proxy_port),
+        make_proxy(app_port, work, '/_files', args.rate_mb * 1024 * 1024))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        if not wait_port(app_port):
+            raise SystemExit("gunicorn did not start (is it installed?)")
+        fetch(proxy_port, '/ping')
+
+        done = threading.Event()
+        probes, downloads = [], []
+
+        def probe():
+            while not done.is_set():
+                t = time.perf_counter()
+                fetch(proxy_port, '/ping')
+                probes.append(time.perf_counter() - t)
+                time.sleep(0.1)
+
+        def download():
+            t = time.perf_counter()
+            status, n = fetch(proxy_port, '/file')
+            downloads.append((time.perf_counter() - t, status, n))
+
+        started = time.perf_counter()
+        prober = threading.Thread(target=probe)
+        prober.start()
+        clients = [threading.Thread(target=download) for _ in range(args.clients)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        wall = time.perf_counter() - started
+        done.set()
+        prober.join()
+    finally:
+        server.shutdown()
+        gunicorn.terminate()
+        gunicorn.wait()
+
+    busy = 0.0
+    with open(log_path) as f:
+        for line in f:
+            path, seconds = line.split()
+            if path == '/file':
+                busy += float(seconds)
+    ok = all(status == 200 and n == args.size_mb * 1024 * 1024 for _, status, n in downloads)
+    return {
+        'mode': mode,
+        'wall': wall,
+        'download_max': max(d[0] for d in downloads),
+        'worker_busy': busy,
+        'occupancy': busy / (wall * args.workers),
+        'probe_p50': statistics.median(probes) * 1000,
+        'probe_max': max(probes) * 1000,
+        'ok': ok,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Worker occupancy per FILE_SERVE_MODE.")
+    ap.add_argument('--size-mb', type=int, default=8)
+    ap.add_argument('--clients', type=int, default=6)
+    ap.add_argument('--rate-mb', type=float, default=2.0, help="per-client MB/s")
+    ap.add_argument('--workers', type=int, default=2)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as work:
+        os.makedirs(os.path.join(work, 'doc'))
+        with open(os.path.join(work, 'doc', 'a' * 64 + '.pdf'), 'wb') as f:
+            f.write(b'%PDF-1.4\n' + os.urandom(args.size_mb * 1024 * 1024 - 9))
+        print("%d x %d MB at %.1f MB/s each, %d sync workers"
+              % (args.clients, args.size_mb, args.rate_mb, args.workers))
+        print("%-8s %8s %10s %12s %10s %11s %11s  %s"
+              % ('mode', 'wall s', 'slowest s', 'worker-s', 'occupancy',
+                 'ping p50 ms', 'ping max ms', 'bytes ok'))
+        for mode in ('direct', 'x-accel'):
+            r = run_mode(mode, args, work)
+            print("%-8s %8.1f %10.1f %12.2f %9.0f%% %11.0f %11.0f  %s"
+                  % (r['mode'], r['wall'], r['download_max'], r['worker_busy'],
+                     r['occupancy'] * 100, r['probe_p50'], r['probe_max'], r['ok']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Local stand-in for the Anthropic messages endpoint, for exercising
+app.services.extract and the 'schedule.extract' job without a key or cost.
+
+Serves POST /v1/messages: checks the request has the shape extract_rows
+sends (a document or image block, then the prompt), sleeps --latency
+seconds and answers with canned assessment-timetable TSV. A request with
+x-api-key "bad" gets a line _parse_rows rejects, and --status answers
+every request with that HTTP status instead, so the fail-closed paths can
+be driven too. GET /stats returns the request count.
+
+    python3 scripts/extract_standin.py --port 8766 --latency 20 &
+    EXTRACT_API_URL=http://127.0.0.1:8766/v1/messages ANTHROPIC_API_KEY=standin \\
+    DATABASE_PATH=/tmp/extract-standin.db python3 run.py
+
+then upload a PDF on /schedules/upload for the assessment-timetable programme.
+Listens on 127.0.0.1 only.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TSV = (
+    "2026-08-03\tMathematics\t\t\t\t8\t\t\t\t\n"
+    "2026-08-03\tEnglish HL\t\t\t\t9\t\t\t\t\n"
+    "2026-08-04\tLife Sciences\t\t\t\t10\t\t\t\t\n"
+)
+
+
+def make_handler(latency, status):
+    stats = {'requests': 0}
+    lock = threading.Lock()
+
+    class StandIn(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *a):
+            pass
+
+        def _send(self, code, body):
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, json.dumps(stats).encode())
+            else:
+                self._send(404, b'{"type":"error"}')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            with lock:
+                stats['requests'] += 1
+            if self.path != '/v1/messages':
+                self._send(404, b'{"type":"error"}')
+                return
+            content = body['messages'][0]['content']
+            if content[0]['type'] not in ('document', 'image') or content[1]['type'] != 'text':
+                self._send(400, b'{"type":"error","error":{"type":"invalid_request_error"}}')
+                return
+            time.sleep(latency)
+            if status != 200:
+                self._send(status, b'{"type":"error"}')
+                return
+            text = TSV if self.headers.get('x-api-key') != 'bad' else 'garbage line'
+            self._send(200, json.dumps(
+                {"content": [{"type": "text", "text": text}]}).encode())
+
+    return StandIn
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local messages endpoint stand-in for extraction.")
+    ap.add_argument('--port', type=int, default=8766)
+    ap.add_argument('--latency', type=float, default=20.0, help="seconds per request")
+    ap.add_argument('--status', type=int, default=200, help="answer every request with this status")
+    args = ap.parse_args()
+    print("Messages stand-in on http://127.0.0.1:%d/v1/messages (%.1f s latency)"
+          % (args.port, args.latency))
+    ThreadingHTTPServer(('127.0.0.1', args.port),
+                        make_handler(args.latency, args.status)).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Local stand-in for the Notion API, for timing app.services.sync without
+touching the real workspace.
+
+Serves POST /v1/databases/<db>/query for four synthetic databases (grade,
+mg, staff, learner: 1,372 pages) with the same page/property shapes the
+sync mappers read, cursor paging (page_size, start_cursor) and the two
+filters sync sends: last_edited_time on_or_after and checkbox equals
+(combined with "and"). Every request sleeps --latency seconds, and the
+first query against each database answers 429 with Retry-After so the
+retry path runs once. GET /stats returns the request and 429 counts.
+
+    python3 scripts/notion_standin.py --port 8765 --latency 0.05 &
+    NOTION_API_BASE=http://127.0.0.1:8765/v1 NOTION_API_KEY=standin \\
+    NOTION_DB_GRADE=grade NOTION_DB_MENTOR_GROUP=mg \\
+    NOTION_DB_STAFF=staff NOTION_DB_LEARNER=learner \\
+    DATABASE_PATH=/tmp/sync-bench.db python3 -m app.services.sync --full
+
+Run sync again without --full for an incremental pull against the stored
+watermarks. Listens on 127.0.0.1 only.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COUNTS = {'grade': 12, 'mg': 40, 'staff': 120, 'learner': 1200}
+
+
+def _title(v):
+    return {"type": "title", "title": [{"plain_text": v}]}
+
+
+def _text(v):
+    return {"type": "rich_text", "rich_text": [{"plain_text": v}]}
+
+
+def _num(v):
+    return {"type": "number", "number": v}
+
+
+def _checkbox(v):
+    return {"type": "checkbox", "checkbox": v}
+
+
+def _relation(*ids):
+    return {"type": "relation", "relation": [{"id": i} for i in ids]}
+
+
+def _edited(i):
+    return "2026-09-%02dT%02d:%02d:00.000Z" % (1 + i % 28, 8 + i % 10, i % 60)
+
+
+def make_databases():
+    grade = [{"id": "g%d" % i, "last_edited_time": _edited(i), "properties": {
+        "grade_name": _title("Grade %d" % i), "grade_code": _text("G%d" % i),
+        "grade_number": _num(i), "sort_order": _num(i)}}
+        for i in range(COUNTS['grade'])]
+    mg = [{"id": "m%d" % i, "last_edited_time": _edited(i), "properties": {
+        "group_name": _title("MG%d" % i), "mentor_id": _relation("s%d" % i),
+        "grade_id": _relation("g%d" % (i % COUNTS['grade'])), "venue_id": _relation()}}
+        for i in range(COUNTS['mg'])]
+    staff = [{"id": "s%d" % i, "last_edited_time": _edited(i), "properties": {
+        "title": _text("Mr"), "first_name": _text("F%d" % i), "surname": _title("S%d" % i),
+        "display_name": _text("F%d S%d" % (i, i)),
+        "email": {"type": "email", "email": "s%d@example.org" % i},
+        "staff_type": {"type": "select", "select": {"name": "Teacher"}},
+        "can_substitute": _checkbox(True), "can_do_duty": _checkbox(True),
+        "is_active": _checkbox(i % 20 != 0)}}
+        for i in range(COUNTS['staff'])]
+    learner = [{"id": "l%d" % i, "last_edited_time": _edited(i), "properties": {
+        "first_name": _text("L%d" % i), "surname": _title("LS%d" % i),
+        "grade_id": _relation("g%d" % (i % COUNTS['grade'])),
+        "mentor_group_id": _relation("m%d" % (i % COUNTS['mg'])),
+        "house_id": _relation(), "is_active": _checkbox(True)}}
+        for i in range(COUNTS['learner'])]
+    return {'grade': grade, 'mg': mg, 'staff': staff, 'learner': learner}
+
+
+def _matches(page, flt):
+    if not flt:
+        return True
+    if 'and' in flt:
+        return all(_matches(page, f) for f in flt['and'])
+    if flt.get('timestamp') == 'last_edited_time':
+        since = flt['last_edited_time']['on_or_after'].replace('+00:00', '.000Z')
+        return page['last_edited_time'] >= since
+    return page['properties'][flt['property']]['checkbox'] == flt['checkbox']['equals']
+
+
+def make_handler(databases, latency, throttle_first):
+    stats = {'requests': 0, '429': 0}
+    throttled = set()
+    lock = threading.Lock()
+
+    class StandIn(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *a):
+            pass
+
+        def _send(self, status, body, headers=()):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, json.dumps(stats).encode())
+            else:
+                self._send(404, b'{"object":"error","status":404}')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            parts = self.path.strip('/').split('/')   # v1/databases/<db>/query
+            db = parts[2] if len(parts) == 4 and parts[1] == 'databases' else None
+            with lock:
+                stats['requests'] += 1
+                first = throttle_first and db not in throttled
+                throttled.add(db)
+                if first:
+                    stats['429'] += 1
+            time.sleep(latency)
+            if db not in databases:
+                self._send(404, b'{"object":"error","status":404}')
+                return
+            if first:
+                self._send(429, b'{"object":"error","status":429}', [('Retry-After', '0.2')])
+                return
+            rows = [p for p in databases[db] if _matches(p, body.get('filter'))]
+            start = int(body.get('start_cursor') or 0)
+            size = body.get('page_size', 100)
+            more = start + size < len(rows)
+            self._send(200, json.dumps({
+                "results": rows[start:start + size],
+                "has_more": more,
+                "next_cursor": str(start + size) if more else None,
+            }).encode())
+
+    return StandIn
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local Notion API stand-in for sync timing.")
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--latency', type=float, default=0.05, help="seconds per request")
+    ap.add_argument('--no-429', action='store_true', help="never answer 429")
+    args = ap.parse_args()
+    handler = make_handler(make_databases(), args.latency, not args.no_429)
+    print("Notion stand-in on http://127.0.0.1:%d/v1 (%d pages, %.0f ms latency)"
+          % (args.port, sum(COUNTS.values()), args.latency * 1000))
+    ThreadingHTTPServer(('127.0.0.1', args.port), handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()